@@ -0,0 +1,192 @@
+"""
+Approximate nearest-neighbour search for SimpleVectorStore (pure NumPy, no pickle)
+
+An IVF (inverted file) index: rows are clustered around n_lists centroids with
+spherical k-means, and a query only scores the rows in its nprobe closest lists.
+nprobe is the recall/latency knob - more lists scanned means higher recall.
+
+The index is stored next to the vectors as <stem>.ivf.npz and is ignored if it was
+built for a different version of the vectors. Build it with:
+  python ann_index.py build vectors.json
+and check recall against exact search with:
+  python ann_index.py eval vectors.json --nprobe 1 4 8 16
+"""
+import argparse
+import os
+import time
+import numpy as np
+from typing import Optional, Tuple
+from vector_format import built_for, load_npz, read_index, save_npz
+
+ANN_FORMAT_VERSION = 1
+DEFAULT_NPROBE = 8
+# Below this many vectors exact search is fast enough and always exact
+DEFAULT_MIN_VECTORS = 20000
+_BLOCK_ROWS = 65536
+
+
+def ann_path(vectors_file: str) -> str:
+    """Path of the IVF index that belongs to a vectors file"""
+    return os.path.splitext(vectors_file)[0] + ".ivf.npz"
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Closest centroid for every row, scored in blocks so mmap'd matrices stay out of RAM"""
+    assignments = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], _BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _kmeans(sample: np.ndarray, n_lists: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means on normalized rows; returns normalized centroids"""
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=n_lists)
+
+        # Re-seed empty lists with random rows so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file ANN index over the rows of a normalized float32 matrix"""
+
+    def __init__(self, centroids: np.ndarray, row_ids: np.ndarray, offsets: np.ndarray,
+                 count: int, created_at: str = "unknown"):
+        self.centroids = centroids
+        self.row_ids = row_ids      # row ids grouped by list
+        self.offsets = offsets      # list i owns row_ids[offsets[i]:offsets[i + 1]]
+        self.count = count
+        self.created_at = created_at
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, n_lists: Optional[int] = None, iterations: int = 10,
+              sample_size: Optional[int] = None, seed: int = 0, created_at: str = "unknown") -> "IVFIndex":
+        """Cluster the rows of matrix into n_lists inverted lists (default ~4 * sqrt(rows))"""
+        count = matrix.shape[0]
+        if count == 0:
+            raise ValueError("Cannot build an ANN index over an empty matrix")
+
+        n_lists = max(1, min(n_lists or int(4 * np.sqrt(count)), count))
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample; ~256 rows per list is plenty for stable centroids
+        sample_size = min(count, sample_size or max(256 * n_lists, 10000))
+        sample_rows = np.sort(rng.choice(count, sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        centroids = _kmeans(sample, n_lists, iterations, rng)
+
+        assignments = _assign(matrix, centroids)
+        row_ids = np.argsort(assignments, kind="stable").astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+
+        return cls(centroids, row_ids, offsets, count, created_at)
+
+    def search(self, matrix: np.ndarray, query_vec: np.ndarray, k: int,
+               nprobe: int = DEFAULT_NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, scores) of the approximate top-k rows, best first"""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query_vec
+        if nprobe < self.n_lists:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.n_lists)
+
+        candidates = np.concatenate([self.row_ids[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Sorted row ids keep reads from a memory-mapped matrix sequential
+        candidates.sort()
+        scores = np.asarray(matrix[candidates], dtype=np.float32) @ query_vec
+
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(-scores[top])]
+        return candidates[top].astype(np.int64), scores[top]
+
+    def save(self, path: str):
+        save_npz(path, ANN_FORMAT_VERSION, self.created_at, centroids=self.centroids, row_ids=self.row_ids,
+                 offsets=self.offsets, count=np.array(self.count))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        data = load_npz(path, ANN_FORMAT_VERSION, "ANN index")
+        return cls(data["centroids"], data["row_ids"], data["offsets"], int(data["count"]), data["created_at"])
+
+    def matches(self, header: dict, matrix: np.ndarray) -> bool:
+        """True if this index was built for the given vectors"""
+        return self.centroids.shape[1] == matrix.shape[1] and built_for(self, header, matrix.shape[0])
+
+
+def build_ann_index(vectors_file: str, n_lists: Optional[int] = None) -> Optional[IVFIndex]:
+    """Build and save the IVF index for a vectors file; returns None if there are no vectors"""
+
+    header, matrix = read_index(vectors_file, load_records=False)
+    if matrix is None:
+        return None
+
+    index = IVFIndex.build(matrix, n_lists=n_lists, created_at=str(header.get("created_at", "unknown")))
+    index.save(ann_path(vectors_file))
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Approximate nearest-neighbour index tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the IVF index for a vectors file")
+    build.add_argument("vectors_file", nargs="?", default="vectors.json")
+    build.add_argument("--lists", type=int, help="Number of inverted lists (default ~4 * sqrt(rows))")
+
+    evaluate = subparsers.add_parser("eval", help="Measure recall@k and latency against exact search")
+    evaluate.add_argument("vectors_file", nargs="?", default="vectors.json")
+    evaluate.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    evaluate.add_argument("--k", type=int, default=5)
+    evaluate.add_argument("--queries", type=int, default=200)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.time()
+        index = build_ann_index(args.vectors_file, args.lists)
+        if index is None:
+            print(f"❌ No vectors in {args.vectors_file}")
+        else:
+            print(f"✅ Built IVF index with {index.n_lists} lists over {index.count} vectors "
+                  f"in {time.time() - started:.1f}s -> {ann_path(args.vectors_file)}")
+
+    elif args.command == "eval":
+        header, matrix = read_index(args.vectors_file, load_records=False)
+        index = IVFIndex.load(ann_path(args.vectors_file))
+        if matrix is None or not index.matches(header, matrix):
+            raise SystemExit("❌ ANN index is missing or stale, run 'python ann_index.py build' first")
+
+        # Use stored rows as queries; exact top-k is the ground truth
+        rng = np.random.default_rng(0)
+        queries = np.asarray(matrix[rng.choice(matrix.shape[0], min(args.queries, matrix.shape[0]), replace=False)])
+        exact = [set(np.argsort(-(matrix @ q))[:args.k]) for q in queries]
+
+        print(f"📊 {index.count} vectors, {index.n_lists} lists, k={args.k}")
+        for nprobe in args.nprobe:
+            started = time.perf_counter()
+            found = [index.search(matrix, q, args.k, nprobe)[0] for q in queries]
+            elapsed = (time.perf_counter() - started) / len(queries) * 1000
+            recall = np.mean([len(truth.intersection(ids)) / args.k for truth, ids in zip(exact, found)])
+            print(f"  nprobe={nprobe:<4} recall@{args.k}={recall:.3f}  {elapsed:.2f} ms/query")
@@ -0,0 +1,146 @@
+"""
+Semantic cache of final answers
+
+Paraphrased questions ("how many PTO days", "vacation days per year?") embed to nearly
+the same vector, so an answer is reused when a new query's embedding has cosine
+similarity >= threshold with a previously answered one. Entries expire after a TTL, the
+least recently used entry is evicted when the cache is full, and everything is dropped
+when the index changes (its created_at), since old answers may be out of date. Answers
+to scoped questions (in:benefits) are only reused for questions with the same scope.
+"""
+import os
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+DEFAULT_MAX_SIZE = 1000
+DEFAULT_TTL = 24 * 3600.0
+# Close paraphrases score ~0.95+ with OpenAI embeddings; unrelated questions rarely pass 0.9
+DEFAULT_THRESHOLD = 0.95
+
+
+class SemanticAnswerCache:
+    """Answers keyed by normalized query embedding, looked up by cosine similarity"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: Optional[float] = DEFAULT_TTL,
+                 threshold: float = DEFAULT_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.index_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._vectors = None                # (max_size, dims) rows; a slot per entry
+        self._entries = OrderedDict()       # slot -> (created_at, query, answer, scope), LRU order
+        self._free = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SemanticAnswerCache":
+        """Build a cache from ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL and ANSWER_CACHE_THRESHOLD"""
+        ttl = os.environ.get("ANSWER_CACHE_TTL")
+        return cls(
+            max_size=int(os.environ.get("ANSWER_CACHE_SIZE", DEFAULT_MAX_SIZE)),
+            ttl=float(ttl) if ttl else DEFAULT_TTL,
+            threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _check_version(self, index_version: str):
+        """Drop every answer once the index they were generated from is replaced"""
+        if index_version != self.index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._free = list(range(self.max_size - 1, -1, -1))
+            self.index_version = index_version
+
+    def get(self, query_vec: np.ndarray, index_version: str, scope: str = "") -> Optional[Tuple[str, str, float]]:
+        """Return (cached query, answer, similarity) for the closest earlier question with the same scope, or None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            self._check_version(index_version)
+            # An expired near-duplicate must not hide a live entry that is also similar enough
+            self._evict_expired()
+            slots = np.fromiter((slot for slot, entry in self._entries.items() if entry[3] == scope), dtype=np.int64)
+            if not len(slots):
+                self.misses += 1
+                return None
+
+            scores = self._vectors[slots] @ query_vec
+            best = int(np.argmax(scores))
+            slot, score = int(slots[best]), float(scores[best])
+
+            _, query, answer, _ = self._entries[slot]
+            if score < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return query, answer, score
+
+    def put(self, query_vec: np.ndarray, query: str, answer: str, index_version: str, scope: str = ""):
+        """Remember the answer to a question (asked within scope, if any)"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._check_version(index_version)
+            if self._vectors is None or self._vectors.shape[1] != len(query_vec):
+                self._vectors = np.zeros((self.max_size, len(query_vec)), dtype=np.float32)
+                self._entries.clear()
+                self._free = list(range(self.max_size - 1, -1, -1))
+
+            self._evict_expired()
+            if not self._free:
+                oldest, _ = self._entries.popitem(last=False)
+                self._free.append(oldest)
+                self.evictions += 1
+
+            slot = self._free.pop()
+            self._vectors[slot] = query_vec
+            self._entries[slot] = (time.time(), query, answer, scope)
+
+    def _drop(self, slot: int):
+        del self._entries[slot]
+        self._free.append(slot)
+
+    def _evict_expired(self):
+        if self.ttl is None:
+            return
+        for slot in [slot for slot, (created_at, *_) in self._entries.items() if self._expired(created_at)]:
+            self._drop(slot)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._free = list(range(self.max_size - 1, -1, -1))
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
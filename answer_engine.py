@@ -0,0 +1,459 @@
+"""
+Shared answer engine for the Slack bot, query.py and status_api.py
+
+The prompt, LLM chain, embeddings client and vector store are built once per process
+and reused for every question. The OpenAI clients share pooled keep-alive HTTP
+connections, so questions after the first skip the TCP/TLS handshake. Answers to
+paraphrases of earlier questions come from a semantic answer cache (answer_cache.py),
+and identical questions asked at the same time share one computation (singleflight.py).
+
+LangChain and the OpenAI SDK take seconds to import, so they are only imported when the
+engine is built; importing this module stays cheap (see warmup.py).
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+from index_reloader import ReloadingVectorStore
+from vector_search import SimpleVectorStore
+from sharded_index import open_store
+from embedding_cache import QueryEmbeddingCache, normalize_query
+from metadata_filter import SearchFilter, parse_scope
+from embedding_providers import get_embeddings
+from answer_cache import SemanticAnswerCache
+from singleflight import AsyncSingleFlight, SingleFlight
+from context_builder import ContextBuilder
+import metrics
+
+load_dotenv()
+
+ANSWER_MODEL = "gpt-4"
+DEFAULT_K = 5
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_SECONDS = 300.0
+# GPT-4 calls in flight at once while answering a batch of questions
+DEFAULT_BATCH_CONCURRENCY = 4
+# GPT-4 answers can take a while; connecting should not
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+PROMPT_TEMPLATE = """Use the following context to answer the question. If you cannot answer based on the context, say so.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+NO_RESULTS_ANSWER = "I don't have information to answer that question."
+# Tags listed when an in: scope matches no documents
+SCOPE_TAGS_SHOWN = 40
+
+
+def unmatched_scope_answer(tags: List[str]) -> str:
+    """Reply to a question whose in: scope selects no documents"""
+    if not tags:
+        return "No documents match that in: scope."
+    shown = ", ".join(f"in:{tag}" for tag in tags[:SCOPE_TAGS_SHOWN])
+    more = f" (and {len(tags) - SCOPE_TAGS_SHOWN} more)" if len(tags) > SCOPE_TAGS_SHOWN else ""
+    return f"No documents match that in: scope. Scopes you can use: {shown}{more}"
+
+
+def _http_limits() -> httpx.Limits:
+    """Connection pool limits from OPENAI_MAX_CONNECTIONS and OPENAI_KEEPALIVE_SECONDS"""
+    max_connections = int(os.environ.get("OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=float(os.environ.get("OPENAI_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS)),
+    )
+
+
+class AnswerEngine:
+    """Retrieval + GPT-4 answering with long-lived, pooled clients"""
+
+    def __init__(self, vectors_file: str = "vectors.json", k: int = DEFAULT_K, hot_reload: bool = True):
+        if not os.path.exists(vectors_file):
+            raise FileNotFoundError("Vector index not found. Please add documents to data/ folder and restart the bot.")
+
+        # Heavy imports, deferred until an engine is actually needed
+        from langchain_openai import ChatOpenAI
+        from langchain.prompts import PromptTemplate
+        from langchain.chains import LLMChain
+
+        self.k = k
+        limits = _http_limits()
+        self.http_client = httpx.Client(limits=limits, timeout=HTTP_TIMEOUT)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT)
+
+        self.embeddings_model = get_embeddings(http_client=self.http_client, http_async_client=self.http_async_client)
+        self.query_cache = QueryEmbeddingCache.from_env()
+        self.answer_cache = SemanticAnswerCache.from_env()
+        self.flights = SingleFlight()
+        self.async_flights = AsyncSingleFlight()
+        self.store = ReloadingVectorStore(
+            vectors_file,
+            store_factory=lambda path: open_store(
+                path, query_cache=self.query_cache, embeddings_model=self.embeddings_model
+            ),
+        )
+        if hot_reload:
+            self.store.start()
+
+        self.context_builder = ContextBuilder.from_env(model=ANSWER_MODEL)
+        self.prompt = PromptTemplate(template=PROMPT_TEMPLATE, input_variables=["context", "question"])
+        self.llm = ChatOpenAI(
+            model=ANSWER_MODEL,
+            temperature=0,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+        self.chain = LLMChain(llm=self.llm, prompt=self.prompt)
+
+    @staticmethod
+    def _index_version(store: SimpleVectorStore) -> str:
+        """Cached answers are only valid for the index they were generated from"""
+        return str((store.data or {}).get("created_at", "unknown"))
+
+    @staticmethod
+    def _scope_key(scope: Optional[SearchFilter]) -> str:
+        """A scope changes the context, so scoped answers are only shared within the same scope"""
+        return scope.key if scope is not None else ""
+
+    def _cached(self, store: SimpleVectorStore, query_vec: np.ndarray, scope: Optional[SearchFilter] = None) -> Optional[str]:
+        hit = self.answer_cache.get(query_vec, self._index_version(store), self._scope_key(scope))
+        metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss" if hit is None else "hit")
+        if hit is None:
+            return None
+        cached_query, answer, score = hit
+        print(f"♻️ Answer cache hit ({score:.3f} similar to: {cached_query!r})")
+        return answer
+
+    def _remember(self, store: SimpleVectorStore, query_vec: Optional[np.ndarray], query: str, answer: str,
+                  scope: Optional[SearchFilter] = None):
+        # Lexical fast-path answers have no query embedding to key the semantic cache on
+        if query_vec is not None and answer and answer != NO_RESULTS_ANSWER:
+            self.answer_cache.put(query_vec, query, answer, self._index_version(store), self._scope_key(scope))
+
+    @staticmethod
+    def _unmatched_scope(store: SimpleVectorStore, scope: Optional[SearchFilter]) -> Optional[str]:
+        """The reply for an in: scope that selects no documents, else None"""
+        if scope is None:
+            return None
+        tags = store.unmatched_scope_tags(scope)
+        return unmatched_scope_answer(tags) if tags is not None else None
+
+    def _retrieve(self, store: SimpleVectorStore, query: str,
+                  scope: Optional[SearchFilter] = None) -> Tuple[Optional[str], Optional[np.ndarray], Optional[str]]:
+        """
+        Everything before the LLM call, shared by the sync, async and streaming paths
+        Returns (answer, None, None) when no LLM call is needed (the scope matches nothing,
+        a cached answer, no results), else (None, query vector or None, context).
+        """
+        unmatched = self._unmatched_scope(store, scope)
+        if unmatched is not None:
+            return unmatched, None, None
+
+        query_vec, (results, lexical_ids) = None, store.lexical_probe(query, self.k, scope)
+        if results is None:
+            query_vec = store.embed_query(query)
+            cached = self._cached(store, query_vec, scope)
+            if cached is not None:
+                return cached, None, None
+            results = store.hybrid_search_by_vector(query, query_vec, self.k, scope, lexical_ids)
+        if not results:
+            return NO_RESULTS_ANSWER, None, None
+        return None, query_vec, self._build_context(results)
+
+    def _build_context(self, results) -> str:
+        with metrics.stage("context_assembly"):
+            return self.context_builder.build(results)
+
+    def _complete(self, store: SimpleVectorStore, query: str, query_vec: Optional[np.ndarray], context: str,
+                  scope: Optional[SearchFilter] = None) -> str:
+        with metrics.stage("llm"):
+            answer = self.chain.run(context=context, question=query)
+        self._remember(store, query_vec, query, answer, scope)
+        return answer
+
+    def _answer(self, store: SimpleVectorStore, query: str, scope: Optional[SearchFilter] = None) -> str:
+        answer, query_vec, context = self._retrieve(store, query, scope)
+        if answer is not None:
+            return answer
+        return self._complete(store, query, query_vec, context, scope)
+
+    def _generate(self, store: SimpleVectorStore, query: str, query_vec: Optional[np.ndarray], results,
+                  scope: Optional[SearchFilter] = None) -> str:
+        """The LLM's answer from already retrieved results"""
+        if not results:
+            return NO_RESULTS_ANSWER
+        return self._complete(store, query, query_vec, self._build_context(results), scope)
+
+    async def _aanswer(self, store: SimpleVectorStore, query: str, scope: Optional[SearchFilter] = None) -> str:
+        # BM25 and search (with shards, a round trip to every shard) must not block the event loop
+        answer, query_vec, context = await asyncio.to_thread(self._retrieve, store, query, scope)
+        if answer is not None:
+            return answer
+        with metrics.stage("llm"):
+            answer = await self.chain.arun(context=context, question=query)
+        self._remember(store, query_vec, query, answer, scope)
+        return answer
+
+    def _stream(self, store: SimpleVectorStore, query: str, scope: Optional[SearchFilter] = None) -> Iterator[str]:
+        answer, query_vec, context = self._retrieve(store, query, scope)
+        if answer is not None:
+            yield answer
+            return
+
+        prompt = self.prompt.format(context=context, question=query)
+        parts = []
+        started = time.perf_counter()
+        for chunk in self.llm.stream(prompt):
+            if chunk.content:
+                if not parts:
+                    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_first_token")
+                parts.append(chunk.content)
+                yield chunk.content
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+        self._remember(store, query_vec, query, "".join(parts), scope)
+
+    async def _astream(self, store: SimpleVectorStore, query: str,
+                       scope: Optional[SearchFilter] = None) -> AsyncIterator[str]:
+        answer, query_vec, context = await asyncio.to_thread(self._retrieve, store, query, scope)
+        if answer is not None:
+            yield answer
+            return
+
+        prompt = self.prompt.format(context=context, question=query)
+        parts = []
+        started = time.perf_counter()
+        async for chunk in self.llm.astream(prompt):
+            if chunk.content:
+                if not parts:
+                    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_first_token")
+                parts.append(chunk.content)
+                yield chunk.content
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+        self._remember(store, query_vec, query, "".join(parts), scope)
+
+    def _retrieve_batch(self, store: SimpleVectorStore, queries: List[str], scopes: List[Optional[SearchFilter]]):
+        """
+        Retrieval for many questions: returns (query vectors, results, ready answers) lists
+        Ready answers come from the answer cache or reply to an in: scope that matches nothing.
+        Questions not answered lexically are embedded in one request and searched together
+        (one search per distinct in: scope).
+        """
+        unmatched = {scope: self._unmatched_scope(store, scope) for scope in set(scopes)}
+        cached = [unmatched[scope] for scope in scopes]
+        probes = [store.lexical_probe(query, self.k, scope) if cached[i] is None else ([], None)
+                  for i, (query, scope) in enumerate(zip(queries, scopes))]
+        results = [hits for hits, _ in probes]
+        vectors = [None] * len(queries)
+        pending = [i for i, hits in enumerate(results) if hits is None]
+        if not pending:
+            return vectors, results, cached
+
+        query_matrix = store.embed_queries([queries[i] for i in pending])
+        by_scope = {}
+        for row, i in enumerate(pending):
+            vectors[i] = query_matrix[row]
+            cached[i] = self._cached(store, query_matrix[row], scopes[i])
+            if cached[i] is None:
+                by_scope.setdefault(scopes[i], []).append(row)
+
+        for scope, rows in by_scope.items():
+            searched = store.hybrid_search_batch([queries[pending[row]] for row in rows], query_matrix[rows], self.k, scope,
+                                                 [probes[pending[row]][1] for row in rows])
+            for row, hits in zip(rows, searched):
+                results[pending[row]] = hits
+        return vectors, results, cached
+
+    def answer_batch(self, queries: List[str],
+                     max_concurrency: int = None) -> Iterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """
+        Answer many questions, yielding (position, answer, error) as each one completes
+        Embedding and search are batched; at most max_concurrency LLM calls run at once
+        (BATCH_MAX_CONCURRENCY by default).
+        """
+        store = self._ready_store()
+        if store is None:
+            for i in range(len(queries)):
+                yield i, NO_RESULTS_ANSWER, None
+            return
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get("BATCH_MAX_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY))
+
+        parsed = [parse_scope(query) for query in queries]
+        questions, scopes = [question for question, _ in parsed], [scope for _, scope in parsed]
+        try:
+            vectors, results, cached = self._retrieve_batch(store, questions, scopes)
+        except Exception as e:
+            for i in range(len(queries)):
+                yield i, None, e
+            return
+
+        for i, answer in enumerate(cached):
+            if answer is not None:
+                yield i, answer, None
+
+        # Repeated questions in the batch share one LLM call
+        positions = {}
+        for i, answer in enumerate(cached):
+            if answer is None:
+                positions.setdefault(self._flight_key(store, questions[i], scopes[i]), []).append(i)
+
+        def generate(key, i: int) -> str:
+            # ...and so do identical questions being answered elsewhere in this process
+            return self.flights.do(key, lambda: self._generate(store, questions[i], vectors[i], results[i], scopes[i]))
+
+        pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="answer-batch")
+        try:
+            futures = {pool.submit(generate, key, same[0]): same for key, same in positions.items()}
+            for future in as_completed(futures):
+                try:
+                    answer, error = future.result(), None
+                except Exception as e:
+                    answer, error = None, e
+                for i in futures[future]:
+                    yield i, answer, error
+        finally:
+            # Don't start the remaining LLM calls if the caller stopped listening
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _flight_key(self, store: SimpleVectorStore, query: str,
+                    scope: Optional[SearchFilter] = None) -> Tuple[str, str, str]:
+        """Identical questions against the same index (and scope) share one in-flight computation"""
+        return self._index_version(store), self._scope_key(scope), normalize_query(query)
+
+    def _ready_store(self) -> Optional[SimpleVectorStore]:
+        # Pin one index version for the whole request, even if a reload lands meanwhile
+        store = self.store.current()
+        return store if store.is_ready else None
+
+    def answer(self, query: str) -> str:
+        """Answer a question from the knowledge base; in:<scope> terms restrict which documents are searched"""
+        store = self._ready_store()
+        if store is None:
+            return NO_RESULTS_ANSWER
+        query, scope = parse_scope(query)
+        return self.flights.do(self._flight_key(store, query, scope), lambda: self._answer(store, query, scope))
+
+    async def aanswer(self, query: str) -> str:
+        """Async answer: retrieval runs in a worker thread, the LLM call is awaited on the shared async HTTP pool"""
+        store = self._ready_store()
+        if store is None:
+            return NO_RESULTS_ANSWER
+        query, scope = parse_scope(query)
+        return await self.async_flights.do(self._flight_key(store, query, scope), lambda: self._aanswer(store, query, scope))
+
+    def stream(self, query: str) -> Iterator[str]:
+        """Answer a question, yielding the LLM's text as it is generated"""
+        store = self._ready_store()
+        if store is None:
+            yield NO_RESULTS_ANSWER
+            return
+
+        # Followers of an identical in-flight question get the leader's whole answer at once
+        query, scope = parse_scope(query)
+        key = self._flight_key(store, query, scope)
+        call, leader = self.flights.join(key)
+        if not leader:
+            yield call.wait()
+            return
+
+        parts = []
+        try:
+            for chunk in self._stream(store, query, scope):
+                parts.append(chunk)
+                yield chunk
+        except BaseException as e:
+            self.flights.complete(key, call, error=e if isinstance(e, Exception) else RuntimeError("Answer stream closed"))
+            raise
+        self.flights.complete(key, call, result="".join(parts))
+
+    async def astream(self, query: str) -> AsyncIterator[str]:
+        """Async stream: retrieval runs in a worker thread, text chunks come from the shared async HTTP pool"""
+        store = self._ready_store()
+        if store is None:
+            yield NO_RESULTS_ANSWER
+            return
+
+        query, scope = parse_scope(query)
+        key = self._flight_key(store, query, scope)
+        call, leader = self.async_flights.join(key)
+        if not leader:
+            yield await call.wait()
+            return
+
+        parts = []
+        try:
+            async for chunk in self._astream(store, query, scope):
+                parts.append(chunk)
+                yield chunk
+        except BaseException as e:
+            self.async_flights.complete(key, call, error=e if isinstance(e, Exception) else RuntimeError("Answer stream closed"))
+            raise
+        self.async_flights.complete(key, call, result="".join(parts))
+
+    def get_stats(self) -> dict:
+        stats = self.store.get_stats()
+        stats["answer_cache"] = self.answer_cache.get_stats()
+        flights, async_flights = self.flights.get_stats(), self.async_flights.get_stats()
+        stats["coalescing"] = {
+            "in_flight": flights["in_flight"] + async_flights["in_flight"],
+            "executed": flights["executed"] + async_flights["executed"],
+            "calls_saved": flights["coalesced"] + async_flights["coalesced"],
+        }
+        return stats
+
+    def _close_store(self):
+        self.store.stop()
+        self.store.current().close()
+        self.http_client.close()
+
+    def close(self):
+        """Stop watching for new indexes and close the pooled connections (from a coroutine, await aclose())"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("AnswerEngine.close() cannot close the async client inside a running event loop; "
+                               "await aclose() instead")
+        self._close_store()
+        asyncio.run(self.http_async_client.aclose())
+
+    async def aclose(self):
+        """close() for async callers; the async client's connections belong to the running event loop"""
+        self._close_store()
+        await self.http_async_client.aclose()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AnswerEngine:
+    """The process-wide answer engine, built on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                print("🔄 Loading AI components...")
+                _engine = AnswerEngine()
+                print("✅ AI components loaded!")
+    return _engine
+
+
+def is_loaded() -> bool:
+    return _engine is not None
+
+
+def answer_question(query: str) -> str:
+    """Answer a question with the shared engine"""
+    return get_engine().answer(query)
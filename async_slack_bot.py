@@ -0,0 +1,303 @@
+"""
+Asyncio mode of the Slack bot
+
+Same behaviour as slack_bot.py, built on slack_bolt's AsyncApp and the async Socket Mode
+handler. Query embeddings and GPT-4 calls are awaited instead of holding a worker thread,
+at most SLACK_MAX_CONCURRENCY questions are answered at once, and when all slots are busy
+users are told they are queued (up to SLACK_MAX_QUEUE waiting, after which they are asked
+to retry) instead of the bot silently stalling.
+
+Run it with:
+  python async_slack_bot.py
+"""
+import asyncio
+import os
+import subprocess
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+from dotenv import load_dotenv
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_streaming import astream_to_message, stream_answers_enabled
+from warmup import warm_up
+import metrics
+
+load_dotenv()
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_QUEUE = 100
+
+# Initialize Slack app
+app = AsyncApp(token=os.environ.get("SLACK_BOT_TOKEN"))
+
+
+class QueueFullError(Exception):
+    """Raised when more questions are waiting than the backpressure queue allows"""
+
+
+class RequestQueue:
+    """Bounded concurrency for question answering with a bounded, FIFO waiting line"""
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_queued: int = DEFAULT_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls) -> "RequestQueue":
+        """Build a queue from SLACK_MAX_CONCURRENCY and SLACK_MAX_QUEUE"""
+        return cls(
+            max_concurrency=int(os.environ.get("SLACK_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            max_queued=int(os.environ.get("SLACK_MAX_QUEUE", DEFAULT_MAX_QUEUE)),
+        )
+
+    @asynccontextmanager
+    async def slot(self, on_queued: Callable[[int], Awaitable[None]]):
+        """Hold one answering slot; on_queued(position) is awaited first if the caller has to wait"""
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queued:
+                self.rejected += 1
+                raise QueueFullError(f"{self.waiting} questions already waiting")
+            self.waiting += 1
+            try:
+                await on_queued(self.waiting)
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queued": self.max_queued,
+        }
+
+
+request_queue = RequestQueue.from_env()
+
+# Shared answer engine (answer_engine.AnswerEngine), loaded once at startup
+engine = None
+bot_user_id = None
+
+
+def load_components():
+    """Build the answer engine (blocking, run before serving), with the same timed steps as the warm-up"""
+    global engine
+    from answer_engine import get_engine
+
+    warm_up.run()
+    engine = get_engine()
+
+
+def _loaded_engine():
+    if engine is None:
+        raise FileNotFoundError("Vector index not loaded")
+    return engine
+
+
+def _queued_notice(notify: Callable[[str], Awaitable[None]]):
+    async def on_queued(position: int):
+        await notify(f"⏳ Lots of questions right now - you're #{position} in line, I'll answer shortly!")
+    return on_queued
+
+
+async def answer_queued(query: str, notify: Callable[[str], Awaitable[None]]) -> str:
+    """Answer within the concurrency limit, telling the user if they have to wait"""
+    async with request_queue.slot(_queued_notice(notify)):
+        await notify("🔍 Searching our knowledge base...")
+        return await _loaded_engine().aanswer(query)
+
+
+async def stream_queued(query: str, notify: Callable[[str], Awaitable[None]], post: Callable[[str], Awaitable],
+                        placeholder: str = "🔍 Searching our knowledge base...", prefix: str = "💡 ") -> str:
+    """Like answer_queued, but streams the answer into the message created by post(placeholder)"""
+    async with request_queue.slot(_queued_notice(notify)):
+        message = await post(placeholder)
+        return await astream_to_message(
+            app.client, message["channel"], message["ts"], _loaded_engine().astream(query), prefix=prefix
+        )
+
+
+async def get_bot_user_id() -> str:
+    """The bot's own user id (looked up once instead of on every message)"""
+    global bot_user_id
+    if bot_user_id is None:
+        bot_user_id = (await app.client.auth_test())["user_id"]
+    return bot_user_id
+
+
+async def post_timed(send: Callable[[str], Awaitable], text: str):
+    """Send a Slack message, timed as the slack_post stage"""
+    with metrics.stage("slack_post"):
+        return await send(text)
+
+
+async def reply_with_answer(user_query: str, say, context: str):
+    """Shared reply flow for DMs and mentions"""
+    metrics.QUESTIONS.inc(source="slack")
+    started = time.perf_counter()
+    try:
+        if stream_answers_enabled():
+            # The placeholder message is edited in place as the answer is generated
+            await stream_queued(user_query, say, lambda text: post_timed(say, text))
+        else:
+            answer = await answer_queued(user_query, say)
+            await post_timed(say, f"💡 {answer}")
+        metrics.QUESTION_SECONDS.observe(time.perf_counter() - started, source="slack")
+
+    except QueueFullError:
+        await say("😅 I'm getting a lot of questions right now. Please try again in a minute!")
+    except FileNotFoundError:
+        await say("📁 I don't have any documents to search yet. Please ask an admin to add some company documents!")
+    except Exception as e:
+        print(f"Error handling {context}: {e}")
+        metrics.ERRORS.inc(component="slack_bot")
+        await say("😅 I'm having some technical difficulties. Please try again in a moment!")
+
+
+# Message handler for DMs only (not mentions)
+@app.message(".*")
+async def handle_message(message, say):
+    """Handle direct messages to the bot (not mentions)"""
+    user_query = message.get("text", "")
+
+    # Skip if this is a mention (handled by app_mention event)
+    if f"<@{await get_bot_user_id()}>" in user_query:
+        return
+
+    if not user_query.strip():
+        await say("👋 Hi! I'm Primr Assistant. Ask me anything about our company documents!")
+        return
+
+    await reply_with_answer(user_query, say, "message")
+
+
+# App mention handler (when someone @mentions the bot)
+@app.event("app_mention")
+async def handle_app_mention(event, say):
+    """Handle when the bot is mentioned"""
+    user_query = event["text"].replace(f"<@{await get_bot_user_id()}>", "").strip()
+
+    if not user_query:
+        await say("👋 Hi! I'm Primr Assistant. Ask me anything about our company documents!")
+        return
+
+    await reply_with_answer(user_query, say, "mention")
+
+
+# Slash command handler
+@app.command("/ask-primr")
+async def handle_ask_command(ack, respond, command):
+    """Handle /ask-primr slash command"""
+    await ack()
+
+    user_query = command["text"].strip()
+    if not user_query:
+        await respond("Please provide a question! Example: `/ask-primr What is our vacation policy?` "
+                      "(add `in:benefits` to search only matching documents)")
+        return
+
+    metrics.QUESTIONS.inc(source="slack")
+    started = time.perf_counter()
+    try:
+        prefix = f"💡 **Answer to:** {user_query}\n\n"
+
+        async def post(text: str):
+            return await post_timed(
+                lambda message: app.client.chat_postMessage(channel=command["channel_id"], text=message), text
+            )
+
+        if stream_answers_enabled():
+            await stream_queued(user_query, respond, post, placeholder=f"{prefix}🔍 ...", prefix=prefix)
+        else:
+            answer = await answer_queued(user_query, respond)
+            # Send follow-up with the answer
+            await post(f"{prefix}{answer}")
+        metrics.QUESTION_SECONDS.observe(time.perf_counter() - started, source="slack")
+
+    except QueueFullError:
+        await respond("😅 I'm getting a lot of questions right now. Please try again in a minute!")
+    except FileNotFoundError:
+        await respond("📁 I don't have any documents to search yet. Please ask an admin to add some company documents!")
+    except Exception as e:
+        print(f"Error handling slash command: {e}")
+        metrics.ERRORS.inc(component="slack_bot")
+        await respond("😅 Sorry, I encountered an error. Please try again!")
+
+
+# Health check command
+@app.command("/primr-status")
+async def handle_status_command(ack, respond):
+    """Check bot status, including how busy the answer queue is"""
+    await ack()
+
+    if engine is None:
+        await respond(warm_up.describe())
+        return
+
+    stats = request_queue.get_stats()
+    await respond(
+        f"🟢 Bot is running and ready to answer questions! "
+        f"({stats['active']}/{stats['max_concurrency']} answering, {stats['waiting']} queued, "
+        f"warmed up in {warm_up.seconds or 0:.1f}s)"
+    )
+
+
+async def main():
+    print("🚀 Starting Primr Slack Assistant (async mode)...")
+
+    # Check for required environment variables
+    missing_vars = [var for var in ("SLACK_BOT_TOKEN", "SLACK_APP_TOKEN", "OPENAI_API_KEY") if not os.environ.get(var)]
+    if missing_vars:
+        print(f"❌ Missing required environment variables: {', '.join(missing_vars)}")
+        print("📖 See SLACK_SETUP.md for configuration instructions")
+        exit(1)
+
+    # Check for vector index
+    if not os.path.exists("vectors.json"):
+        print("⚠️  Vector index not found. Auto-building from available documents...")
+        try:
+            subprocess.run(["python", "enhanced_ingest.py"], check=True)
+            print("✅ Vector index built successfully!")
+        except subprocess.CalledProcessError:
+            print("❌ Failed to build vector index. Please run 'python enhanced_ingest.py' manually")
+            exit(1)
+
+    await asyncio.to_thread(load_components)
+
+    metrics_port = os.environ.get("METRICS_PORT")
+    if metrics_port:
+        metrics.start_http_server(int(metrics_port))
+        print(f"📈 Metrics at http://localhost:{metrics_port}/metrics")
+
+    print("✅ All systems ready!")
+    print(f"🤖 Answering up to {request_queue.max_concurrency} questions at once "
+          f"({request_queue.max_queued} more can wait in line)")
+
+    try:
+        handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
+        await handler.start_async()
+    except Exception as e:
+        print(f"❌ Failed to start bot: {e}")
+        print("📖 Check SLACK_SETUP.md for troubleshooting")
+    finally:
+        await engine.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
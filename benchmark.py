@@ -0,0 +1,403 @@
+"""
+Offline benchmark for ingestion and search (no network, no OpenAI key)
+
+Generates a synthetic corpus and ingests it with a deterministic local embedder through
+the same EmbeddingPipeline -> IndexWriter / BM25Builder path as enhanced_ingest.py. Then,
+in a fresh process so the numbers aren't skewed by the corpus generator, it measures:
+- SimpleVectorStore load time and resident memory
+- similarity_search latency (p50/p95/p99) and the per-stage breakdown from metrics.py
+
+Results are written as JSON so runs can be compared across commits:
+  python benchmark.py --sizes 1000,10000,100000 --output bench.json
+  python benchmark.py --sizes 1000000 --dims 1536 --output bench-1m.json
+  python benchmark.py --sizes 1000,10000,100000 --baseline bench.json
+
+The embedder hashes each text into a random unit vector, so search latency and memory
+are realistic but relevance is not - use test_integration.py for answer quality.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+BENCHMARK_VERSION = 1
+DEFAULT_SIZES = "1000,10000,100000"
+DEFAULT_DIMENSIONS = 256
+DEFAULT_QUERIES = 200
+DEFAULT_WARMUP = 20
+DEFAULT_WINDOW = 4096
+DEFAULT_SEED = 42
+VOCABULARY_SIZE = 20000
+WORDS_PER_CHUNK = (60, 160)
+CHUNKS_PER_DOCUMENT = 20
+SEARCH_STAGES = ("query_embedding", "lexical_search", "vector_scoring")
+# (metric path, higher is better) compared against a --baseline report
+COMPARED_METRICS = (
+    ("ingest.chunks_per_second", True),
+    ("load.seconds", False),
+    ("load.rss_mb", False),
+    ("search.p50_ms", False),
+    ("search.p99_ms", False),
+)
+
+
+class HashEmbeddings:
+    """Deterministic local stand-in for OpenAIEmbeddings: each text hashes to a fixed random unit vector"""
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+        self.model = f"bench-hash-{dimensions}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        return np.vstack([self._vector(text) for text in texts])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text).tolist()
+
+
+def make_embedder(name: str, dimensions: int):
+    """"hash" (random vectors, isolates the index's own cost) or "local" (the EMBEDDING_PROVIDER=local embedder)"""
+    if name == "local":
+        from embedding_providers import LocalHashingEmbeddings
+
+        return LocalHashingEmbeddings(dimensions)
+    return HashEmbeddings(dimensions)
+
+
+def vocabulary(seed: int = DEFAULT_SEED) -> List[str]:
+    """Pseudo-words of 3-10 letters; the same seed always gives the same vocabulary"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    lengths = rng.integers(3, 11, size=VOCABULARY_SIZE)
+    return ["".join(rng.choice(letters, size=length)) for length in lengths]
+
+
+def synthetic_chunks(count: int, seed: int = DEFAULT_SEED, block: int = DEFAULT_WINDOW) -> Iterator[Tuple[str, dict]]:
+    """count (text, metadata) chunks with Zipf-distributed words, generated block by block"""
+    words = np.array(vocabulary(seed))
+    rng = np.random.default_rng(seed + 1)
+    for start in range(0, count, block):
+        size = min(block, count - start)
+        lengths = rng.integers(WORDS_PER_CHUNK[0], WORDS_PER_CHUNK[1] + 1, size=size)
+        ids = np.minimum(rng.zipf(1.2, size=int(lengths.sum())) - 1, VOCABULARY_SIZE - 1)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        for i in range(size):
+            row = start + i
+            text = " ".join(words[ids[offsets[i]:offsets[i + 1]]])
+            yield text, {"source": f"data/doc_{row // CHUNKS_PER_DOCUMENT:07d}.md", "chunk_index": row}
+
+
+def synthetic_queries(count: int, seed: int = DEFAULT_SEED) -> List[str]:
+    """Questions of 2-8 words drawn from the corpus vocabulary"""
+    words = vocabulary(seed)
+    rng = np.random.default_rng(seed + 2)
+    return [
+        " ".join(words[i] for i in rng.integers(0, min(2000, len(words)), size=rng.integers(2, 9)))
+        for _ in range(count)
+    ]
+
+
+def _rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _mb(size: int) -> float:
+    return round(size / (1024 * 1024), 1)
+
+
+def _directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run_ingest(vectors_file: str, count: int, dimensions: int, seed: int, window: int, embedder: str = "hash") -> dict:
+    """Embed and write a synthetic corpus like enhanced_ingest.build_index; returns timings"""
+    from ann_index import DEFAULT_MIN_VECTORS, build_ann_index
+    from bm25_index import BM25Builder, bm25_path
+    from embedding_pipeline import EmbeddingPipeline
+    from vector_format import IndexWriter
+
+    embedder = make_embedder(embedder, dimensions)
+    pipeline = EmbeddingPipeline.from_env(embedder, model_name=embedder.model)
+    bm25 = BM25Builder()
+    timings = {"generate": 0.0, "embed": 0.0, "write": 0.0, "bm25": 0.0}
+
+    started = time.perf_counter()
+    with IndexWriter(vectors_file, embedding_model=embedder.model,
+                     quantization=os.getenv("VECTOR_QUANTIZATION") or None) as writer:
+        chunks = synthetic_chunks(count, seed, window)
+        while True:
+            step = time.perf_counter()
+            batch = [chunk for _, chunk in zip(range(window), chunks)]
+            timings["generate"] += time.perf_counter() - step
+            if not batch:
+                break
+            texts = [text for text, _ in batch]
+
+            step = time.perf_counter()
+            embeddings = pipeline.embed(texts)
+            timings["embed"] += time.perf_counter() - step
+
+            step = time.perf_counter()
+            writer.add(embeddings, texts, [metadata for _, metadata in batch])
+            timings["write"] += time.perf_counter() - step
+
+            step = time.perf_counter()
+            bm25.add(texts)
+            timings["bm25"] += time.perf_counter() - step
+
+        step = time.perf_counter()
+        bm25.build(created_at=writer.created_at).save(bm25_path(vectors_file))
+        timings["bm25"] += time.perf_counter() - step
+
+        step = time.perf_counter()
+        writer.close()
+        timings["write"] += time.perf_counter() - step
+    # Generating the synthetic text is not part of ingestion
+    seconds = time.perf_counter() - started - timings["generate"]
+
+    ann_seconds = None
+    if count >= int(os.getenv("ANN_MIN_VECTORS", DEFAULT_MIN_VECTORS)):
+        step = time.perf_counter()
+        build_ann_index(vectors_file)
+        ann_seconds = round(time.perf_counter() - step, 3)
+
+    return {
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(count / seconds, 1),
+        "embed_seconds": round(timings["embed"], 3),
+        "write_seconds": round(timings["write"], 3),
+        "bm25_seconds": round(timings["bm25"], 3),
+        "ann_build_seconds": ann_seconds,
+        "index_mb": _mb(_directory_bytes(os.path.dirname(os.path.abspath(vectors_file)))),
+    }
+
+
+def measure_search(vectors_file: str, dimensions: int, queries: List[str], warmup: int, k: int,
+                   retrieval_mode: str = None, search_mode: str = None, embedder: str = "hash") -> dict:
+    """Load the index and time searches; meant to run in a fresh process"""
+    import metrics
+    from embedding_cache import QueryEmbeddingCache
+    from vector_search import SimpleVectorStore
+
+    rss_before = _rss_bytes()
+    started = time.perf_counter()
+    # No query cache: every search pays for its embedding, as a new question would
+    store = SimpleVectorStore(vectors_file, query_cache=QueryEmbeddingCache(max_size=0),
+                              embeddings_model=make_embedder(embedder, dimensions),
+                              retrieval_mode=retrieval_mode, search_mode=search_mode)
+    load_seconds = time.perf_counter() - started
+    if store.matrix is None:
+        raise RuntimeError(f"Could not load {vectors_file}")
+    rss_loaded = _rss_bytes()
+
+    started = time.perf_counter()
+    store.similarity_search(queries[0], k)
+    first_search_ms = (time.perf_counter() - started) * 1000
+
+    for query in queries[1:warmup + 1]:
+        store.similarity_search(query, k)
+    stages_before = {stage: metrics.STAGE_SECONDS.snapshot(stage=stage) for stage in SEARCH_STAGES}
+
+    latencies = []
+    for query in queries[warmup + 1:]:
+        started = time.perf_counter()
+        store.similarity_search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies = np.array(latencies)
+
+    stages = {}
+    for stage in SEARCH_STAGES:
+        after = metrics.STAGE_SECONDS.snapshot(stage=stage)
+        calls = after["count"] - stages_before[stage]["count"]
+        stages[stage] = {
+            "calls": calls,
+            "mean_ms": round((after["sum"] - stages_before[stage]["sum"]) / calls * 1000, 3) if calls else 0.0,
+        }
+
+    stats = store.get_stats()
+    return {
+        "load": {
+            "seconds": round(load_seconds, 4),
+            "rss_mb": _mb(rss_loaded - rss_before),
+            "total_rss_mb": _mb(rss_loaded),
+        },
+        "search": {
+            "queries": len(latencies),
+            "k": k,
+            "first_ms": round(first_search_ms, 3),
+            "mean_ms": round(float(latencies.mean()), 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "queries_per_second": round(1000 / float(latencies.mean()), 1),
+            "rss_after_mb": _mb(_rss_bytes()),
+            "search_mode": stats["search_mode"],
+            "retrieval_mode": stats["retrieval_mode"],
+            "lexical_fast_paths": stats["lexical_fast_paths"],
+            "stages": stages,
+        },
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(sizes: List[int], dimensions: int = DEFAULT_DIMENSIONS, queries: int = DEFAULT_QUERIES,
+                  warmup: int = DEFAULT_WARMUP, k: int = 5, seed: int = DEFAULT_SEED, window: int = DEFAULT_WINDOW,
+                  retrieval_mode: str = None, search_mode: str = None, embedder: str = "hash",
+                  workdir: str = None, keep: bool = False) -> dict:
+    """Ingest and search a synthetic corpus of each size; returns the JSON report"""
+    report = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "dimensions": dimensions,
+            "embedder": embedder,
+            "queries": queries,
+            "warmup": warmup,
+            "k": k,
+            "seed": seed,
+            "window": window,
+            "retrieval_mode": retrieval_mode or os.environ.get("RETRIEVAL_MODE", "hybrid"),
+            "search_mode": search_mode or os.environ.get("VECTOR_SEARCH_MODE", "auto"),
+        },
+        "results": [],
+    }
+    question_list = synthetic_queries(queries + warmup + 1, seed)
+    root = workdir or tempfile.mkdtemp(prefix="primr-bench-")
+
+    try:
+        for count in sizes:
+            directory = os.path.join(root, f"corpus-{count}")
+            os.makedirs(directory, exist_ok=True)
+            vectors_file = os.path.join(directory, "vectors.json")
+
+            print(f"📝 Ingesting {count:,} synthetic chunks ({dimensions} dims)...")
+            ingest = run_ingest(vectors_file, count, dimensions, seed, window, embedder)
+            print(f"   {ingest['chunks_per_second']:,.0f} chunks/s, {ingest['index_mb']} MB on disk")
+
+            print(f"🔍 Loading and searching {count:,} chunks in a fresh process...")
+            # spawn: the child starts without the parent's memory, so its RSS is the store's alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                measured = pool.submit(measure_search, vectors_file, dimensions, question_list, warmup, k,
+                                       retrieval_mode, search_mode, embedder).result()
+            print(f"   load {measured['load']['seconds'] * 1000:.1f} ms (+{measured['load']['rss_mb']} MB RSS), "
+                  f"search p50 {measured['search']['p50_ms']:.2f} ms, p99 {measured['search']['p99_ms']:.2f} ms")
+
+            report["results"].append({"chunks": count, "ingest": ingest, **measured})
+            if not keep:
+                shutil.rmtree(directory, ignore_errors=True)
+    finally:
+        if not keep and workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return report
+
+
+def _lookup(result: dict, path: str):
+    value = result
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare(report: dict, baseline: dict) -> List[Dict]:
+    """Per-size changes of the headline metrics against a baseline report"""
+    previous = {result["chunks"]: result for result in baseline.get("results", [])}
+    rows = []
+    for result in report["results"]:
+        old = previous.get(result["chunks"])
+        if old is None:
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            new_value, old_value = _lookup(result, path), _lookup(old, path)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            rows.append({
+                "chunks": result["chunks"],
+                "metric": path,
+                "baseline": old_value,
+                "current": new_value,
+                "change": round(change, 4),
+                "better": change >= 0 if higher_is_better else change <= 0,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ingestion and search benchmark")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated corpus sizes in chunks (up to 1000000)")
+    parser.add_argument("--dims", type=int, default=DEFAULT_DIMENSIONS, help="Embedding dimensions (ada-002 uses 1536)")
+    parser.add_argument("--embedder", choices=["hash", "local"], default="hash",
+                        help="hash: random vectors (index cost only); local: the EMBEDDING_PROVIDER=local embedder")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="Timed searches per corpus size")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Chunks per ingestion window")
+    parser.add_argument("--retrieval-mode", choices=["hybrid", "dense", "lexical"])
+    parser.add_argument("--search-mode", choices=["auto", "exact", "ann"])
+    parser.add_argument("--workdir", help="Where to write the corpora (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated indexes")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        [int(size) for size in args.sizes.split(",") if size.strip()],
+        dimensions=args.dims, queries=args.queries, warmup=args.warmup, k=args.k, seed=args.seed,
+        window=args.window, retrieval_mode=args.retrieval_mode, search_mode=args.search_mode, embedder=args.embedder,
+        workdir=args.workdir, keep=args.keep,
+    )
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+        print(f"\n📊 Compared with {args.baseline}:")
+        for row in report["comparison"]:
+            print(f"  {'✅' if row['better'] else '⚠️ '} {row['chunks']:>9,} {row['metric']:<26} "
+                  f"{row['baseline']:>10} -> {row['current']:<10} ({row['change']:+.1%})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
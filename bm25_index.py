@@ -0,0 +1,234 @@
+"""
+Lexical (BM25) search for SimpleVectorStore (pure NumPy, no pickle)
+
+An inverted index over the chunk texts, built by enhanced_ingest.py alongside the
+vectors. Tool names, acronyms and policy IDs are often matched better lexically than by
+embeddings, and a lexical lookup needs no embeddings API call.
+
+The index is stored next to the vectors as <stem>.bm25.npz and is ignored if it was
+built for a different version of the vectors. Rebuild it from an existing index with:
+  python bm25_index.py build vectors.json
+and try a query with:
+  python bm25_index.py search vectors.json "vpn setup"
+"""
+import argparse
+import math
+import os
+import re
+import time
+import numpy as np
+from array import array
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+from metadata_filter import range_mask
+from vector_format import built_for, load_npz, save_npz
+
+BM25_FORMAT_VERSION = 1
+K1 = 1.2
+B = 0.75
+# Fast path: short keyword queries whose best match contains every term and clearly
+# beats the runner-up are answered lexically without embedding the query
+LEXICAL_MAX_TERMS = 4
+DEFAULT_CONFIDENCE_RATIO = 1.5
+MAX_TOKEN_CHARS = 40
+
+_TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a about an and are as at be by can do does for from has have how i if in is it its me my of on or our
+should that the their there this to us was we what when where which who why will with you your
+""".split())
+
+
+def bm25_path(vectors_file: str) -> str:
+    """Path of the BM25 index that belongs to a vectors file"""
+    return os.path.splitext(vectors_file)[0] + ".bm25.npz"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords"""
+    return [
+        token for token in _TOKEN.findall(text.lower())
+        if token not in STOPWORDS and len(token) <= MAX_TOKEN_CHARS
+    ]
+
+
+class BM25Builder:
+    """Accumulates postings document by document, so ingestion can stream into it"""
+
+    def __init__(self):
+        self._postings = {}             # term -> (array of doc ids, array of term frequencies)
+        self._lengths = array("i")
+
+    @property
+    def count(self) -> int:
+        return len(self._lengths)
+
+    def add(self, texts: Iterable[str]):
+        for text in texts:
+            doc = len(self._lengths)
+            counts = Counter(tokenize(text))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("i"), array("H"))
+                postings[0].append(doc)
+                postings[1].append(min(tf, 65535))
+
+    def build(self, created_at: str = "unknown") -> "BM25Index":
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[term][0]) for term in terms])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            docs, freqs = self._postings[term]
+            doc_ids[offsets[i]:offsets[i + 1]] = np.frombuffer(docs, dtype=np.int32)
+            tfs[offsets[i]:offsets[i + 1]] = np.frombuffer(freqs, dtype=np.uint16)
+        return BM25Index(np.array(terms, dtype=str), offsets, doc_ids, tfs,
+                         np.frombuffer(self._lengths, dtype=np.int32).copy(), created_at)
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring over the rows of a vector index"""
+
+    def __init__(self, vocab: np.ndarray, offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, created_at: str = "unknown"):
+        self.vocab = vocab              # sorted terms
+        self.offsets = offsets          # term i owns doc_ids/tfs[offsets[i]:offsets[i + 1]]
+        self.doc_ids = doc_ids          # ascending within each term
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.created_at = created_at
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self._term_ids = {term: i for i, term in enumerate(vocab.tolist())}
+
+    @property
+    def count(self) -> int:
+        return len(self.doc_lengths)
+
+    def _postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        i = self._term_ids.get(term)
+        if i is None:
+            return None
+        return self.doc_ids[self.offsets[i]:self.offsets[i + 1]], self.tfs[self.offsets[i]:self.offsets[i + 1]]
+
+    def search(self, query: str, k: int, ranges: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, BM25 scores) of the top-k matching rows, best first (only rows inside ranges if given)"""
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            docs, tfs = postings
+            idf = math.log(1 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = K1 * (1 - B + B * self.doc_lengths[docs] / max(self.avg_length, 1e-9))
+            scores[docs] += idf * tf * (K1 + 1) / (tf + norm)
+        if ranges is not None:
+            scores[~range_mask(ranges, self.count)] = 0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]] if k < len(matched) else matched
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top.astype(np.int64), scores[top]
+
+    def contains_all(self, row: int, terms: Iterable[str]) -> bool:
+        """True if row contains every one of terms"""
+        for term in terms:
+            postings = self._postings(term)
+            if postings is None:
+                return False
+            docs = postings[0]
+            position = np.searchsorted(docs, row)
+            if position >= len(docs) or docs[position] != row:
+                return False
+        return True
+
+    def is_confident(self, query: str, ids: np.ndarray, scores: np.ndarray,
+                     ratio: float = DEFAULT_CONFIDENCE_RATIO) -> bool:
+        """True if a short keyword query has an unambiguous lexical best match"""
+        terms = set(tokenize(query))
+        if not terms or len(terms) > LEXICAL_MAX_TERMS or len(ids) == 0:
+            return False
+        if not self.contains_all(int(ids[0]), terms):
+            return False
+        return len(scores) == 1 or scores[0] >= ratio * scores[1]
+
+    def save(self, path: str):
+        save_npz(path, BM25_FORMAT_VERSION, self.created_at, vocab=self.vocab, offsets=self.offsets,
+                 doc_ids=self.doc_ids, tfs=self.tfs, doc_lengths=self.doc_lengths)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        data = load_npz(path, BM25_FORMAT_VERSION, "BM25 index")
+        return cls(data["vocab"], data["offsets"], data["doc_ids"], data["tfs"], data["doc_lengths"], data["created_at"])
+
+    def matches(self, header: dict, count: int) -> bool:
+        """True if this index was built for the given vectors"""
+        return built_for(self, header, count)
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked row-id lists: score(row) = sum of 1 / (rrf_k + rank); returns (row ids, scores) best first"""
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist()):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return (np.array([row for row, _ in best], dtype=np.int64),
+            np.array([score for _, score in best], dtype=np.float32))
+
+
+def build_bm25_index(vectors_file: str) -> Optional[BM25Index]:
+    """Build and save the BM25 index for a vectors file; returns None if there are no records"""
+    from vector_format import iter_records, read_index
+
+    header, matrix = read_index(vectors_file, load_records=False)
+    if matrix is None:
+        return None
+
+    builder = BM25Builder()
+    builder.add(text for text, _ in iter_records(vectors_file, header))
+    index = builder.build(created_at=str(header.get("created_at", "unknown")))
+    index.save(bm25_path(vectors_file))
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BM25 lexical index tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the BM25 index for a vectors file")
+    build.add_argument("vectors_file", nargs="?", default="vectors.json")
+
+    search = subparsers.add_parser("search", help="Run a lexical query against the index")
+    search.add_argument("vectors_file", nargs="?", default="vectors.json")
+    search.add_argument("query")
+    search.add_argument("--k", type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.time()
+        index = build_bm25_index(args.vectors_file)
+        if index is None:
+            print(f"❌ No vectors in {args.vectors_file}")
+        else:
+            print(f"✅ Built BM25 index with {len(index.vocab)} terms over {index.count} chunks "
+                  f"in {time.time() - started:.1f}s -> {bm25_path(args.vectors_file)}")
+
+    elif args.command == "search":
+        from vector_format import RecordReader, read_index
+
+        header, _ = read_index(args.vectors_file, load_records=False)
+        index = BM25Index.load(bm25_path(args.vectors_file))
+        records = RecordReader(args.vectors_file, header)
+        ids, scores = index.search(args.query, args.k)
+        print(f"🔍 {len(ids)} matches (confident: {index.is_confident(args.query, ids, scores)})")
+        for row, score in zip(ids, scores):
+            text, metadata = records[int(row)]
+            print(f"  {score:6.2f}  {metadata.get('source', '?')}: {text[:80]!r}")
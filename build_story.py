@@ -3,6 +3,7 @@ import json
 from dotenv import load_dotenv
 from langchain_openai import OpenAIEmbeddings
 from langchain.schema import Document
+from embedding_pipeline import EmbeddingPipeline
 
 load_dotenv()
 
@@ -22,15 +23,20 @@ for chunk_data in chunks_data:
 # 3. Create embeddings
 embedder = OpenAIEmbeddings(model="text-embedding-ada-002")
 
-# 4. Generate embeddings for each chunk and store as JSON
+# 4. Generate embeddings in token-bounded concurrent batches and store as JSON
+pipeline = EmbeddingPipeline.from_env(
+    embedder,
+    progress=lambda done, total: print(f"🔢 Embedded {done}/{total} chunks")
+)
+embeddings = pipeline.embed([chunk.page_content for chunk in chunks])
+
 vector_data = []
-for i, chunk in enumerate(chunks):
-    embedding = embedder.embed_query(chunk.page_content)
+for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
     vector_data.append({
         "id": i,
         "content": chunk.page_content,
         "metadata": chunk.metadata,
-        "embedding": embedding
+        "embedding": embedding.tolist()
     })
 
 # 5. Save vector data as JSON
@@ -0,0 +1,67 @@
+"""
+Shared pytest setup: tests run offline, embedding with the local CPU-only provider
+
+Run them with:
+  python -m pytest -q
+"""
+import os
+
+# Set before any module under test is imported: enhanced_ingest.py records the model at import time
+os.environ["EMBEDDING_PROVIDER"] = "local"
+os.environ["WARM_UP"] = "false"
+
+import pytest
+
+# test_integration.py is a script that drives the real pipeline (OpenAI included) in this folder
+collect_ignore = ["test_integration.py"]
+
+DOCUMENTS = {
+    "data/hr/health-benefits.md": [
+        "Primr offers medical, dental and vision coverage from the first day of employment.",
+        "Parental leave is sixteen weeks at full pay for every new parent, including adoptive parents.",
+        "The wellness stipend covers gym memberships, meditation apps and fitness classes up to 50 dollars a month.",
+        "Open enrollment for health benefits happens every November through the benefits portal.",
+    ],
+    "data/hr/expenses.md": [
+        "Managers approve expenses under 500 dollars; anything larger also needs finance approval.",
+        "Submit receipts in Expensify within thirty days of the purchase.",
+        "Travel is booked through Navan and economy class is the default for flights under six hours.",
+    ],
+    "data/it/vpn-setup.md": [
+        "Install the WireGuard client and import the primr.conf profile from the IT portal.",
+        "The VPN is required for the staging database, the admin dashboard and the build servers.",
+        "If the VPN handshake fails, rotate your key with the itctl rotate-key command.",
+    ],
+    "data/faq.txt": [
+        "Office hours are nine to five, but most teams work flexible hours across time zones.",
+        "The all-hands meeting is on the first Monday of every month at noon Pacific.",
+    ],
+}
+
+
+def write_documents(root, documents=DOCUMENTS, repeat: int = 4):
+    """Write each document as paragraphs; repeat numbered copies so files split into several chunks"""
+    for path, paragraphs in documents.items():
+        full = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(f"{paragraph} (section {i})" for i in range(repeat) for paragraph in paragraphs))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A scratch project folder with data/ filled in, as the current directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("INGEST_WORKERS", "1")
+    monkeypatch.setenv("INDEX_SHARDS", "1")
+    write_documents(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def index(workdir):
+    """workdir with a freshly ingested index"""
+    import enhanced_ingest
+
+    enhanced_ingest.main()
+    return workdir
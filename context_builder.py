@@ -0,0 +1,188 @@
+"""
+Token-budgeted prompt context from search results
+
+Chunks are split with CHUNK_OVERLAP characters of overlap, so neighbouring hits from the
+same file repeat text. Before the results go into the prompt, ContextBuilder:
+- merges adjacent/overlapping chunks from the same source into one passage
+- drops passages that are near-duplicates of a better-scoring one
+- packs the best passages, highest score first, into CONTEXT_TOKEN_BUDGET tokens
+  (counted with tiktoken), truncating the last one that only partly fits
+"""
+import os
+import re
+from typing import List, Tuple
+
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_DUPLICATE_THRESHOLD = 0.8
+# Shortest shared text that counts as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 1000
+# Don't bother adding a truncated passage smaller than this
+MIN_PASSAGE_TOKENS = 50
+SHINGLE_WORDS = 5
+
+_WORD = re.compile(r"\w+")
+
+
+def _overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of first that is a prefix of second (0 if under MIN_OVERLAP_CHARS)"""
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = first.find(probe, max(0, len(first) - MAX_OVERLAP_CHARS))
+    while start != -1:
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start = first.find(probe, start + 1)
+    return 0
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+class Passage:
+    """One or more merged chunks from the same source"""
+
+    def __init__(self, text: str, metadata: dict, score: float):
+        self.text = text
+        self.metadata = metadata
+        self.score = score
+        self.source = metadata.get("source")
+        index = metadata.get("chunk_index")
+        self.first_chunk = self.last_chunk = index
+
+    def merge(self, other: "Passage") -> bool:
+        """Absorb other if it directly follows or overlaps this passage; returns True on success"""
+        if self.source is None or other.source != self.source:
+            return False
+
+        if self.last_chunk is not None and other.first_chunk is not None:
+            if other.first_chunk == self.last_chunk + 1:
+                first, second = self, other
+            elif self.first_chunk == other.last_chunk + 1:
+                first, second = other, self
+            else:
+                return False
+            overlap = _overlap(first.text, second.text)
+            joiner = "" if overlap else "\n"
+        else:
+            # No chunk positions (older indexes): merge only on a real text overlap
+            overlap = _overlap(self.text, other.text)
+            first, second = self, other
+            if not overlap:
+                overlap = _overlap(other.text, self.text)
+                first, second = other, self
+            if not overlap:
+                return False
+            joiner = ""
+
+        self.text = first.text + joiner + second.text[overlap:]
+        self.first_chunk, self.last_chunk = first.first_chunk, second.last_chunk
+        self.score = max(self.score, other.score)
+        return True
+
+
+class ContextBuilder:
+    """Builds the prompt context for a question within a token budget"""
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 duplicate_threshold: float = DEFAULT_DUPLICATE_THRESHOLD, model: str = "gpt-4"):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.model = model
+        self._encoding = None
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "ContextBuilder":
+        """Build from CONTEXT_TOKEN_BUDGET and CONTEXT_DUPLICATE_THRESHOLD"""
+        return cls(
+            token_budget=int(os.environ.get("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+            duplicate_threshold=float(os.environ.get("CONTEXT_DUPLICATE_THRESHOLD", DEFAULT_DUPLICATE_THRESHOLD)),
+            **kwargs,
+        )
+
+    def _get_encoding(self):
+        if self._encoding is None:
+            try:
+                import tiktoken
+
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # tiktoken downloads its encodings on first use; estimate if that fails
+                print(f"⚠️ tiktoken unavailable ({e.__class__.__name__}), estimating tokens from length")
+                self._encoding = False
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is False:
+            return len(text) // 3 + 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The first max_tokens tokens of text"""
+        encoding = self._get_encoding()
+        if encoding is False:
+            # count_tokens estimates len // 3 + 1
+            return text[:max(0, max_tokens - 1) * 3]
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def passages(self, results: List[Tuple[str, dict, float]]) -> List[Passage]:
+        """Merge overlapping chunks and drop near-duplicates; best passage first"""
+        merged: List[Passage] = []
+        for text, metadata, score in sorted(results, key=lambda r: -r[2]):
+            passage = Passage(text, metadata or {}, score)
+            # A new chunk can bridge two passages, so keep merging until nothing changes
+            while True:
+                target = next((p for p in merged if p.merge(passage)), None)
+                if target is None:
+                    break
+                merged.remove(target)
+                passage = target
+            merged.append(passage)
+
+        merged.sort(key=lambda p: -p.score)
+        kept, kept_shingles = [], []
+        for passage in merged:
+            shingles = _shingles(passage.text)
+            if any(len(shingles & other) / max(1, min(len(shingles), len(other))) >= self.duplicate_threshold
+                   for other in kept_shingles):
+                continue
+            kept.append(passage)
+            kept_shingles.append(shingles)
+        return kept
+
+    def select(self, results: List[Tuple[str, dict, float]]) -> List[Passage]:
+        """The passages that fit the token budget, best first"""
+        selected, remaining = [], self.token_budget
+        for passage in self.passages(results):
+            # The "Document N:" header and separator count against the budget too
+            header = f"\n\nDocument {len(selected) + 1}:\n"
+            tokens = self.count_tokens(header + passage.text)
+            if tokens > remaining:
+                available = remaining - self.count_tokens(header)
+                if available < MIN_PASSAGE_TOKENS:
+                    break
+                # A cut inside a word or character can re-encode to more tokens; cut shorter until it fits
+                text = passage.text
+                for cap in range(available, MIN_PASSAGE_TOKENS - 1, -1):
+                    passage.text = self.truncate(text, cap)
+                    tokens = self.count_tokens(header + passage.text)
+                    if tokens <= remaining:
+                        break
+                else:
+                    break
+            selected.append(passage)
+            remaining -= tokens
+        return selected
+
+    def build(self, results: List[Tuple[str, dict, float]]) -> str:
+        """Prompt context: numbered documents, best first, within the token budget"""
+        return "\n\n".join(f"Document {i+1}:\n{passage.text}" for i, passage in enumerate(self.select(results)))
@@ -0,0 +1,154 @@
+"""
+Query embedding cache for SimpleVectorStore
+
+Keeps recently embedded questions in a bounded in-process LRU (with optional TTL),
+and optionally in a small SQLite file so cached embeddings survive restarts of
+slack_bot.py and query.py. The file is bounded by the same size and TTL (newest rows
+are kept). Vectors are stored as raw float32 bytes (no pickle).
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Optional
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a question so trivially different phrasings share a cache entry"""
+    return _WHITESPACE.sub(" ", text).strip().strip("?!.").strip().casefold()
+
+
+def cache_key(model: str, text: str) -> str:
+    """Cache key for a query: embedding model name + normalized query text"""
+    return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings with optional TTL and disk tier"""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, persist_path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()  # key -> (created_at, vector)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if persist_path:
+            try:
+                self._db = sqlite3.connect(persist_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings "
+                    "(key TEXT PRIMARY KEY, created_at REAL NOT NULL, vector BLOB NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS query_embeddings_created_at ON query_embeddings (created_at)"
+                )
+                self._prune()
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Query embedding cache disk tier disabled ({persist_path}): {e}")
+                self._db = None
+
+    @classmethod
+    def from_env(cls) -> "QueryEmbeddingCache":
+        """Build a cache from QUERY_CACHE_SIZE, QUERY_CACHE_TTL and QUERY_CACHE_PATH"""
+        ttl = os.environ.get("QUERY_CACHE_TTL")
+        return cls(
+            max_size=int(os.environ.get("QUERY_CACHE_SIZE", "1024")),
+            ttl=float(ttl) if ttl else None,
+            persist_path=os.environ.get("QUERY_CACHE_PATH") or None,
+        )
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query, or None on a miss"""
+        key = cache_key(model, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created_at, vector FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    vector = np.frombuffer(row[1], dtype=np.float32)
+                    self._remember(key, row[0], vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector: np.ndarray):
+        """Store the embedding for a query"""
+        key = cache_key(model, text)
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, vector)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (key, created_at, vector) VALUES (?, ?, ?)",
+                        (key, created_at, vector.tobytes()),
+                    )
+                    self._prune()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Failed to persist query embedding: {e}")
+
+    def _prune(self):
+        """Bound the disk tier like the LRU: drop rows past the TTL, then all but the newest max_size"""
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE key IN "
+            "(SELECT key FROM query_embeddings ORDER BY created_at DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+    def _remember(self, key: str, created_at: float, vector: np.ndarray):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all in-memory entries (the disk tier is kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
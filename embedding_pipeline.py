@@ -0,0 +1,219 @@
+"""
+Batch embedding stage for ingestion
+
+Drives the embeddings API the way it likes to be driven:
+- token-aware batching (tiktoken) so each request stays under a token budget
+- a bounded pool of concurrent requests
+- exponential backoff with jitter on 429 / 5xx / connection errors
+- a SQLite checkpoint of finished embeddings (raw float32, no pickle), so a run that
+  dies part-way resumes where it stopped instead of starting from zero
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+DEFAULT_BATCH_TOKENS = 100000   # OpenAI allows up to 300k tokens per embeddings request
+DEFAULT_BATCH_SIZE = 1000       # and up to 2048 inputs
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 6
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits, server errors and network failures"""
+    try:
+        import openai
+
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+            return True
+    except ImportError:
+        pass
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, if it said so"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingCheckpoint:
+    """Finished embeddings keyed by (model, chunk key), stored in SQLite"""
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, key))"
+        )
+        self._db.commit()
+
+    def load(self, keys: List[str]) -> dict:
+        """Embeddings already finished for any of keys"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                    [self.model, *batch],
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def save(self, keys: List[str], vectors: np.ndarray):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                [(self.model, key, vector.tobytes()) for key, vector in zip(keys, vectors)],
+            )
+            self._db.commit()
+
+    def remove(self):
+        """Delete the checkpoint once its embeddings are safely in the index"""
+        with self._lock:
+            self._db.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class EmbeddingPipeline:
+    """Embeds large lists of texts with batching, concurrency, retries and checkpoints"""
+
+    def __init__(self, embeddings_model, model_name: str = None,
+                 max_batch_tokens: int = DEFAULT_BATCH_TOKENS, max_batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_concurrency: int = DEFAULT_CONCURRENCY, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = 1.0, max_delay: float = 60.0, checkpoint_path: Optional[str] = None,
+                 progress: Optional[Callable[[int, int], None]] = None):
+        self.embeddings_model = embeddings_model
+        self.model_name = model_name or getattr(embeddings_model, "model", None) or type(embeddings_model).__name__
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint = EmbeddingCheckpoint(checkpoint_path, self.model_name) if checkpoint_path else None
+        self.progress = progress
+        self.requests = 0
+        self.retries = 0
+        self._encoding = None
+
+    @classmethod
+    def from_env(cls, embeddings_model, **kwargs) -> "EmbeddingPipeline":
+        """Build a pipeline from EMBED_BATCH_TOKENS, EMBED_BATCH_SIZE, EMBED_CONCURRENCY and EMBED_MAX_RETRIES"""
+        return cls(
+            embeddings_model,
+            max_batch_tokens=int(os.environ.get("EMBED_BATCH_TOKENS", DEFAULT_BATCH_TOKENS)),
+            max_batch_size=int(os.environ.get("EMBED_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+            max_concurrency=int(os.environ.get("EMBED_CONCURRENCY", DEFAULT_CONCURRENCY)),
+            max_retries=int(os.environ.get("EMBED_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+            **kwargs,
+        )
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            try:
+                import tiktoken
+
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model_name)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # tiktoken downloads its encodings on first use; estimate if that fails
+                print(f"⚠️ tiktoken unavailable ({e.__class__.__name__}), estimating tokens from length")
+                self._encoding = False
+        if self._encoding is False:
+            return len(text) // 3 + 1
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def batches(self, indices: List[int], texts: List[str]) -> List[List[int]]:
+        """Group text indices into batches under both the token and the input-count limit"""
+        batches, current, current_tokens = [], [], 0
+        for i in indices:
+            tokens = self.count_tokens(texts[i])
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_with_retry(self, texts: List[str]) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.requests += 1
+                return np.asarray(self.embeddings_model.embed_documents(texts), dtype=np.float32)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                delay = _retry_after(e) or min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random())
+                print(f"⚠️ Embedding request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: List[str], keys: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Embed texts and return a (len(texts), dims) float32 matrix in input order
+        keys identify texts in the checkpoint (e.g. content hashes); defaults to the texts
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        keys = keys or list(texts)
+        results = [None] * len(texts)
+
+        if self.checkpoint is not None:
+            done = self.checkpoint.load(list(set(keys)))
+            for i, key in enumerate(keys):
+                results[i] = done.get(key)
+            if done:
+                print(f"♻️ Resuming: {sum(r is not None for r in results)} embeddings found in checkpoint")
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        finished = len(texts) - len(pending)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {
+                pool.submit(self._embed_with_retry, [texts[i] for i in batch]): batch
+                for batch in self.batches(pending, texts)
+            }
+            error = None
+            for future in as_completed(futures):
+                batch = futures[future]
+                if future.cancelled():
+                    continue
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    # Stop queued batches, but keep checkpointing the ones already in flight
+                    if error is None:
+                        error = e
+                        for other in futures:
+                            other.cancel()
+                    continue
+                if self.checkpoint is not None:
+                    self.checkpoint.save([keys[i] for i in batch], vectors)
+                for i, vector in zip(batch, vectors):
+                    results[i] = vector
+                finished += len(batch)
+                if self.progress:
+                    self.progress(finished, len(texts))
+
+        if error is not None:
+            raise error
+        return np.vstack(results)
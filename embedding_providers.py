@@ -0,0 +1,129 @@
+"""
+Pluggable embedding providers for ingestion and search
+
+EMBEDDING_PROVIDER picks how texts are embedded:
+- "openai" (default): OpenAI text-embedding-ada-002 over the network
+- "local": LocalHashingEmbeddings, a CPU-only hashing projection of words and word pairs.
+  No network and no model download; a query embeds in microseconds. It matches words
+  rather than meaning, so it is a fallback for when OpenAI is slow or down, not a
+  replacement for real embeddings.
+
+The provider's name is recorded as embedding_model in the index header, and
+SimpleVectorStore refuses to search an index built by a different provider, since
+query and document vectors from different models are not comparable.
+Switching providers means re-running enhanced_ingest.py (it re-embeds everything).
+"""
+import hashlib
+import os
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+from bm25_index import tokenize
+
+OPENAI_MODEL = "text-embedding-ada-002"
+DEFAULT_PROVIDER = "openai"
+PROVIDERS = ("openai", "local")
+DEFAULT_LOCAL_DIMENSIONS = 512
+LOCAL_HASH_VERSION = 1
+
+
+class EmbeddingMismatchError(ValueError):
+    """Raised when an index was embedded by a different provider than the one embedding queries"""
+
+
+def configured_provider() -> str:
+    """The provider selected by EMBEDDING_PROVIDER"""
+    provider = os.environ.get("EMBEDDING_PROVIDER", DEFAULT_PROVIDER).strip().lower()
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER {provider!r} (expected one of: {', '.join(PROVIDERS)})")
+    return provider
+
+
+def _local_dimensions() -> int:
+    return int(os.environ.get("LOCAL_EMBEDDING_DIMENSIONS", DEFAULT_LOCAL_DIMENSIONS))
+
+
+@lru_cache(maxsize=1 << 18)
+def _feature(token: str, dimensions: int) -> Tuple[int, float]:
+    """Stable (bucket, sign) of a token; Python's hash() changes between processes"""
+    digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dimensions, 1.0 if (digest >> 63) & 1 else -1.0
+
+
+class LocalHashingEmbeddings:
+    """
+    Feature-hashed bag of words and adjacent word pairs, log-scaled and L2-normalized
+    Signed hashing keeps collisions from biasing scores; the same text always maps to
+    the same vector in any process, so indexes built with it can be searched anywhere.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_LOCAL_DIMENSIONS):
+        self.dimensions = dimensions
+        self.model = f"local-hash-v{LOCAL_HASH_VERSION}-{dimensions}"
+
+    def _embed(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]:
+            bucket, sign = _feature(token, self.dimensions)
+            vector[bucket] += sign
+        # Sublinear term frequency, so one repeated word can't dominate a chunk
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+def embedding_model_name(provider: str = None) -> str:
+    """The embedding_model recorded in indexes built with a provider (EMBEDDING_PROVIDER by default)"""
+    provider = provider or configured_provider()
+    if provider == "local":
+        return LocalHashingEmbeddings(_local_dimensions()).model
+    return OPENAI_MODEL
+
+
+def get_embeddings(provider: str = None, **openai_kwargs):
+    """Embeddings client for a provider (EMBEDDING_PROVIDER by default); openai_kwargs go to OpenAIEmbeddings"""
+    provider = provider or configured_provider()
+    if provider == "local":
+        return LocalHashingEmbeddings(_local_dimensions())
+
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=OPENAI_MODEL, **openai_kwargs)
+
+
+def embeddings_name(embeddings) -> str:
+    """Name of the model behind an embeddings client"""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def indexed_model(header: dict) -> str:
+    """Name of the model an index header was embedded with"""
+    indexed = header.get("embedding_model")
+    if indexed in (None, "unknown"):
+        # Older indexes don't say; they were all built with OpenAI
+        return OPENAI_MODEL
+    return indexed
+
+
+def check_compatible(header: dict, embeddings):
+    """Raise EmbeddingMismatchError unless queries embedded by embeddings can be searched against header's index"""
+    indexed = indexed_model(header)
+    query_model = embeddings_name(embeddings)
+    if indexed != query_model:
+        raise EmbeddingMismatchError(
+            f"Index was embedded with {indexed!r} but queries would be embedded with {query_model!r}; "
+            f"set EMBEDDING_PROVIDER to match the index or re-run enhanced_ingest.py"
+        )
@@ -1,19 +1,444 @@
 import os
+import sys
 import json
 import time
+import hashlib
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import islice
 from dotenv import load_dotenv
 from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import CharacterTextSplitter
-import glob
+from embedding_providers import embedding_model_name, get_embeddings
 
 load_dotenv()
 
+# Recorded in the index; EMBEDDING_PROVIDER=local embeds on the CPU instead of with OpenAI
+EMBEDDING_MODEL = embedding_model_name()
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+MANIFEST_FILE = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+CHECKPOINT_FILE = "embedding_checkpoint.sqlite"
+# Chunks whose texts and embeddings are held in memory at once
+DEFAULT_WINDOW = 4096
+DATA_EXTENSIONS = (".md", ".txt")
+# Shard files the index is also partitioned into for scatter-gather search (1 = unsharded)
+DEFAULT_SHARDS = 1
+
 def log_status(message, status="info"):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] {status.upper()}: {message}")
 
-def main():
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it into place so readers never see a partial file"""
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def file_hash(path):
+    """SHA-256 of a file's bytes, used to skip files that did not change"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def content_hash(text):
+    """SHA-256 of a chunk's text, used to reuse its embedding"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class PreviousIndex:
+    """
+    The manifest and vector index left by the last run, so unchanged chunks can reuse
+    their embeddings. Only row numbers and hashes are kept in memory; texts are read
+    from the records file and vectors from the memory-mapped matrix when needed.
+    """
+
+    def __init__(self, files, header, matrix):
+        from vector_format import RecordReader, iter_records
+
+        self.files = files
+        self.header = header
+        self.matrix = matrix
+        self.records = RecordReader("vectors.json", header) if "records_file" in header else None
+        self.rows_by_source = {}
+        self.row_by_hash = {}
+        for row, (text, meta) in enumerate(iter_records("vectors.json", header)):
+            self.rows_by_source.setdefault(meta.get("source"), []).append(row)
+            self.row_by_hash.setdefault(meta.get("content_hash") or content_hash(text), row)
+
+    @classmethod
+    def load(cls, full_rebuild=False):
+        """Returns None if there is nothing reusable"""
+        if full_rebuild or not os.path.exists(MANIFEST_FILE) or not os.path.exists("vectors.json"):
+            return None
+
+        try:
+            from vector_format import read_index
+
+            with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            header, matrix = read_index("vectors.json", load_records=False)
+        except Exception as e:
+            log_status(f"Previous index not reusable, re-embedding everything: {e}", "warning")
+            return None
+
+        settings = (manifest.get("version"), manifest.get("embedding_model"), manifest.get("chunk_size"), manifest.get("chunk_overlap"))
+        if settings != (MANIFEST_VERSION, EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP) or header.get("embedding_model") != EMBEDDING_MODEL:
+            log_status("Embedding model or chunking settings changed, re-embedding everything", "warning")
+            return None
+        if matrix is None:
+            return None
+
+        return cls(manifest.get("files", {}), header, matrix)
+
+    @property
+    def count(self):
+        return self.matrix.shape[0]
+
+    def unchanged(self, path, sha256):
+        previous = self.files.get(path)
+        return bool(previous) and previous["sha256"] == sha256 and len(previous["chunks"]) == len(self.rows_by_source.get(path, []))
+
+    def record(self, row):
+        """(text, metadata) of a previous row"""
+        if self.records is not None:
+            return self.records[row]
+        metadata = self.header.get("metadata", [])
+        return self.header["texts"][row], dict(metadata[row]) if row < len(metadata) else {}
+
+def discover_files(root="data"):
+    """All .md and .txt files under root, recursively, in a stable sorted order"""
+    paths = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in filenames:
+            if filename.lower().endswith(DATA_EXTENSIONS):
+                paths.append(os.path.join(directory, filename).replace(os.sep, "/"))
+    return sorted(paths)
+
+def load_and_split(path):
+    """
+    Load, decode and chunk one file; runs in a worker process
+    Returns (path, [(page_content, metadata)], worker pid, error message or None)
+    """
+    try:
+        loader = TextLoader(path, encoding="utf-8")
+        splitter = CharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        chunks = splitter.split_documents(loader.load())
+        return path, [(chunk.page_content, chunk.metadata) for chunk in chunks], os.getpid(), None
+    except Exception as e:
+        return path, [], os.getpid(), str(e)
+
+def iter_loaded(paths, workers):
+    """
+    Yield load_and_split results in the order of paths, fanning the work out over a
+    process pool. Only a few files per worker are in flight at once, so finished but
+    unconsumed chunks stay bounded.
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield load_and_split(path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(paths)
+        in_flight = deque(pool.submit(load_and_split, path) for path in islice(remaining, workers * 4))
+        while in_flight:
+            result = in_flight.popleft().result()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                in_flight.append(pool.submit(load_and_split, next_path))
+            yield result
+
+def iter_chunks(data_paths, file_hashes, previous, manifest_files, stats):
+    """
+    Yield (page_content, metadata, previous row or None) for every chunk, file by file
+    Unchanged files are replayed from the previous index; new or changed files are
+    loaded and split in parallel worker processes, reusing the embedding of any chunk
+    whose text is unchanged. Output order never depends on the number of workers.
+    """
+    processed_at = datetime.now().isoformat()
+    to_load = [path for path in data_paths if previous is None or not previous.unchanged(path, file_hashes[path])]
+    workers = min(int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1)), max(len(to_load), 1))
+    if to_load:
+        log_status(f"Loading and splitting {len(to_load)} files with {workers} worker(s)...")
+    loaded = iter_loaded(to_load, workers)
+    per_worker = {}
+
+    for path in data_paths:
+        sha256 = file_hashes[path]
+
+        # Unchanged file: take its chunks straight from the previous index
+        if previous is not None and previous.unchanged(path, sha256):
+            manifest_files[path] = previous.files[path]
+            for row in previous.rows_by_source[path]:
+                text, metadata = previous.record(row)
+                yield text, metadata, row
+            continue
+
+        # New or changed file: loaded and split by a worker
+        loaded_path, chunks, worker, error = next(loaded)
+        assert loaded_path == path
+        worker_stats = per_worker.setdefault(worker, {"files": 0, "chunks": 0})
+        worker_stats["files"] += 1
+        worker_stats["chunks"] += len(chunks)
+        if error is not None:
+            log_status(f"Failed to load {path}: {error}", "error")
+            stats["files_failed"] += 1
+            continue
+
+        hashes = []
+        for page_content, chunk_metadata in chunks:
+            chunk_hash = content_hash(page_content)
+            hashes.append(chunk_hash)
+            row = previous.row_by_hash.get(chunk_hash) if previous is not None else None
+            metadata = {**chunk_metadata, "content_hash": chunk_hash, "processed_at": processed_at}
+            if row is not None:
+                previous_metadata = previous.record(row)[1]
+                if previous_metadata.get("source") == path:
+                    metadata["processed_at"] = previous_metadata.get("processed_at", processed_at)
+            yield page_content, metadata, row
+
+        manifest_files[path] = {"sha256": sha256, "chunks": hashes}
+        stats["files_changed"] += 1
+        log_status(f"Loaded: {path} ({len(chunks)} chunks) [worker {worker}: "
+                   f"{worker_stats['files']} files, {worker_stats['chunks']} chunks]")
+
+    for worker, worker_stats in sorted(per_worker.items()):
+        log_status(f"Worker {worker} done: {worker_stats['files']} files, {worker_stats['chunks']} chunks")
+
+def windows(iterable, size):
+    """Group an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        window = list(islice(iterator, size))
+        if not window:
+            return
+        yield window
+
+class ChunksWriter:
+    """Appends chunk records to chunks.json as a JSON array, published by rename on close"""
+
+    def __init__(self, path="chunks.json"):
+        self.path = path
+        self.tmp = f"{path}.tmp"
+        self.file = open(self.tmp, "w", encoding="utf-8")
+        self.file.write("[")
+        self.count = 0
+
+    def write(self, chunk_data):
+        self.file.write(",\n" if self.count else "\n")
+        self.file.write(json.dumps(chunk_data, indent=2, ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        self.file.write("\n]\n")
+        self.file.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+def ensure_bm25_index(previous):
+    """Build the BM25 index for an up-to-date vector index that predates it"""
+    from bm25_index import BM25Index, bm25_path, build_bm25_index
+
+    path = bm25_path("vectors.json")
+    try:
+        if BM25Index.load(path).matches(previous.header, previous.count):
+            return
+    except (OSError, ValueError, KeyError):
+        pass
+    log_status("Building BM25 index for the existing vectors...")
+    build_bm25_index("vectors.json")
+
+def ensure_filter_index(previous):
+    """Build the per-source filter index for an up-to-date vector index that predates it"""
+    from metadata_filter import FilterIndex, build_filter_index, filter_path
+
+    try:
+        if FilterIndex.load(filter_path("vectors.json")).matches(previous.header, previous.count):
+            return
+    except (OSError, ValueError, KeyError):
+        pass
+    log_status("Building metadata filter index for the existing vectors...")
+    build_filter_index("vectors.json")
+
+def ensure_ann_index(previous):
+    """Build the ANN index for an up-to-date vector index that is large enough but has none (or a stale one)"""
+    from ann_index import DEFAULT_MIN_VECTORS, IVFIndex, ann_path, build_ann_index
+    from vector_format import built_for
+
+    if previous.count < int(os.getenv("ANN_MIN_VECTORS", DEFAULT_MIN_VECTORS)):
+        return
+    try:
+        if built_for(IVFIndex.load(ann_path("vectors.json")), previous.header, previous.count):
+            return
+    except (OSError, ValueError, KeyError):
+        pass
+    log_status(f"Building ANN index for {previous.count} vectors...")
+    ann = build_ann_index("vectors.json")
+    log_status(f"ANN index built with {ann.n_lists} lists")
+
+def ensure_shards(previous):
+    """Bring the shard set in line with INDEX_SHARDS for an up-to-date vector index"""
+    from sharded_index import build_shards, manifest_matches, read_manifest, remove_shards
+
+    shards = int(os.getenv("INDEX_SHARDS", DEFAULT_SHARDS))
+    manifest = read_manifest("vectors.json")
+    if shards <= 1:
+        if manifest is not None:
+            remove_shards("vectors.json")
+        return
+    if manifest_matches(manifest, "vectors.json") and len(manifest["shards"]) == shards:
+        return
+    log_status(f"Partitioning {previous.count} vectors into {shards} shards...")
+    build_shards("vectors.json", shards)
+
+def build_index(data_paths, file_hashes, previous, openai_key):
+    """
+    Stream load -> split -> embed -> write over windows of chunks, so texts and embeddings
+    are held INGEST_WINDOW chunks at a time. Per-chunk bookkeeping (manifest hashes, BM25
+    postings, per-source row ranges) is kept for the whole run. Returns ingestion stats.
+    """
+    from vector_format import IndexWriter
+    from ann_index import DEFAULT_MIN_VECTORS, build_ann_index
+    from bm25_index import BM25Builder, bm25_path
+    from metadata_filter import FilterBuilder, filter_path
+    from embedding_pipeline import EmbeddingPipeline
+    from sharded_index import ShardWriter, remove_shards
+
+    window_size = int(os.getenv("INGEST_WINDOW", DEFAULT_WINDOW))
+    stats = {"total_chunks": 0, "files_changed": 0, "files_failed": 0, "embeddings_reused": 0, "embeddings_created": 0,
+             "index_version": None}
+    manifest_files = {}
+    pipeline = None
+
+    chunks_writer = ChunksWriter("chunks.json")
+    # Lexical index built alongside the vectors for hybrid search
+    bm25 = BM25Builder()
+    # Row ranges per source, so searches can be restricted to some documents
+    filters = FilterBuilder()
+    writer = IndexWriter(
+        "vectors.json",
+        embedding_model=EMBEDDING_MODEL,
+        quantization=os.getenv("VECTOR_QUANTIZATION") or None
+    )
+    shards = int(os.getenv("INDEX_SHARDS", DEFAULT_SHARDS))
+    # The full index stays the source of truth for incremental runs; shards are derived from it
+    shard_writer = ShardWriter(
+        "vectors.json", shards, EMBEDDING_MODEL, writer.created_at, writer.version, writer.quantization
+    ) if shards > 1 else None
+
+    try:
+        chunks = iter_chunks(data_paths, file_hashes, previous, manifest_files, stats)
+        for window in windows(chunks, window_size):
+            texts = [text for text, _, _ in window]
+            metadatas = [metadata for _, metadata, _ in window]
+            reused = [i for i, (_, _, row) in enumerate(window) if row is not None]
+            to_embed = [i for i, (_, _, row) in enumerate(window) if row is None]
+
+            for text, metadata in zip(texts, metadatas):
+                metadata["chunk_index"] = stats["total_chunks"]
+                chunks_writer.write({
+                    "id": stats["total_chunks"],
+                    "page_content": text,
+                    "metadata": metadata
+                })
+                stats["total_chunks"] += 1
+
+            embeddings = None
+            if to_embed:
+                if pipeline is None:
+                    # Set environment variable explicitly to ensure it's not masked
+                    if openai_key:
+                        os.environ["OPENAI_API_KEY"] = openai_key
+
+                    # Create embeddings model without passing key (let it use env var)
+                    embeddings_model = get_embeddings()
+
+                    # Token-bounded concurrent batches; finished batches are checkpointed
+                    # so a failed run can resume
+                    pipeline = EmbeddingPipeline.from_env(
+                        embeddings_model,
+                        model_name=EMBEDDING_MODEL,
+                        checkpoint_path=CHECKPOINT_FILE
+                    )
+                new_embeddings = pipeline.embed(
+                    [texts[i] for i in to_embed],
+                    keys=[metadatas[i]["content_hash"] for i in to_embed]
+                )
+                embeddings = np.empty((len(window), new_embeddings.shape[1]), dtype=np.float32)
+                embeddings[to_embed] = new_embeddings
+
+            if reused:
+                rows = previous.matrix[[window[i][2] for i in reused]]
+                if embeddings is None:
+                    embeddings = np.empty((len(window), rows.shape[1]), dtype=np.float32)
+                embeddings[reused] = rows
+
+            writer.add(embeddings, texts, metadatas)
+            bm25.add(texts)
+            filters.add(metadatas)
+            if shard_writer is not None:
+                shard_writer.add(embeddings, texts, metadatas)
+            stats["embeddings_reused"] += len(reused)
+            stats["embeddings_created"] += len(to_embed)
+            log_status(f"Indexed {stats['total_chunks']} chunks "
+                       f"({stats['embeddings_reused']} reused, {stats['embeddings_created']} embedded)")
+
+        if not stats["total_chunks"]:
+            raise ValueError("No documents were successfully loaded")
+
+        # Save embeddings as a float32 matrix (vectors.npy) with records (vectors.records.jsonl)
+        # and a small JSON header (vectors.json) - no pickle
+        log_status("Publishing chunks.json and vectors.json + vectors.npy...")
+        chunks_writer.close()
+        # Saved before the header is published, so a reader never pairs new vectors with an old BM25 index
+        bm25.build(created_at=writer.created_at).save(bm25_path("vectors.json"))
+        filters.build(created_at=writer.created_at).save(filter_path("vectors.json"))
+        if shard_writer is not None:
+            log_status(f"Publishing {shards} shards...")
+            shard_writer.close()
+        stats["index_version"] = writer.close()["index_version"]
+    except BaseException:
+        chunks_writer.abort()
+        writer.abort()
+        if shard_writer is not None:
+            shard_writer.abort()
+        raise
+
+    if shard_writer is None:
+        remove_shards("vectors.json")
+
+    if pipeline is not None and pipeline.checkpoint is not None:
+        pipeline.checkpoint.remove()
+
+    # The manifest is only updated once the vectors it describes are on disk
+    write_json_atomic(MANIFEST_FILE, {
+        "version": MANIFEST_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "files": manifest_files
+    })
+
+    # Large corpora also get an approximate nearest-neighbour index
+    ann_min_vectors = int(os.getenv("ANN_MIN_VECTORS", DEFAULT_MIN_VECTORS))
+    if stats["total_chunks"] >= ann_min_vectors:
+        log_status(f"Building ANN index for {stats['total_chunks']} vectors...")
+        ann = build_ann_index("vectors.json")
+        log_status(f"ANN index built with {ann.n_lists} lists")
+
+    return stats
+
+def main(full_rebuild=False):
     success = False  # Track if vector creation was successful
     try:
         log_status("Starting knowledge base ingestion...")
@@ -24,8 +449,8 @@ def main():
         if openai_key:
             log_status(f"Key preview: {openai_key[:20]}...{openai_key[-10:]}")
 
-        # 1. Load all .md and .txt files
-        data_paths = glob.glob("data/*.md") + glob.glob("data/*.txt")
+        # 1. Find all .md and .txt files anywhere under data/
+        data_paths = discover_files("data")
 
         if not data_paths:
             log_status("No markdown or text files found in data/ directory", "warning")
@@ -33,116 +458,76 @@ def main():
 
         log_status(f"Found {len(data_paths)} files to process")
 
-        all_docs = []
-        for path in data_paths:
-            try:
-                loader = TextLoader(path, encoding="utf-8")
-                docs = loader.load()
-                all_docs.extend(docs)
-                log_status(f"Loaded: {path}")
-            except Exception as e:
-                log_status(f"Failed to load {path}: {e}", "error")
-                continue
+        # 2. Compare against the last run: unchanged files and chunks reuse their embeddings
+        file_hashes = {path: file_hash(path) for path in data_paths}
+        previous = PreviousIndex.load(full_rebuild)
+        previous_files = previous.files if previous is not None else {}
 
-        if not all_docs:
-            log_status("No documents were successfully loaded", "error")
-            return
+        deleted_files = sorted(set(previous_files) - set(data_paths))
+        for path in deleted_files:
+            log_status(f"Removed: {path} (its vectors will be dropped)")
 
-        # 2. Chunk them
-        log_status("Splitting documents into chunks...")
-        splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = splitter.split_documents(all_docs)
-        log_status(f"Created {len(chunks)} chunks")
-
-        # 3. Convert chunks to JSON-serializable format
-        chunks_data = []
-        for i, chunk in enumerate(chunks):
-            chunk_data = {
-                "id": i,
-                "page_content": chunk.page_content,
-                "metadata": {
-                    **chunk.metadata,
-                    "chunk_index": i,
-                    "processed_at": datetime.now().isoformat()
-                }
-            }
-            chunks_data.append(chunk_data)
-
-        # 4. Save chunks to JSON
-        log_status("Saving chunks to chunks.json...")
-        with open("chunks.json", "w", encoding="utf-8") as f:
-            json.dump(chunks_data, f, indent=2, ensure_ascii=False)
-
-        # 5. Create embeddings and simple vector index (no pickle)
-        try:
-            from langchain_openai import OpenAIEmbeddings
-            import numpy as np
-
-            log_status("Creating embeddings...")
-
-            # Set environment variable explicitly to ensure it's not masked
-            os.environ["OPENAI_API_KEY"] = openai_key
-
-            # Create embeddings model without passing key (let it use env var)
-            embeddings_model = OpenAIEmbeddings(
-                model="text-embedding-ada-002"
-            )
-
-            log_status("Building vector index...")
-
-            # Get embeddings for all chunks
-            texts = [chunk.page_content for chunk in chunks]
-            embeddings = embeddings_model.embed_documents(texts)
-
-            # Save embeddings and metadata as JSON (no pickle)
-            vector_data = {
-                "embeddings": [emb for emb in embeddings],  # Convert to regular lists
-                "texts": texts,
-                "metadata": [chunk.metadata for chunk in chunks],
-                "created_at": datetime.now().isoformat(),
-                "embedding_model": "text-embedding-ada-002",
-                "dimensions": len(embeddings[0]) if embeddings else 0
-            }
-
-            # Save to JSON file
-            log_status("Saving vector index to vectors.json...")
-            with open("vectors.json", "w", encoding="utf-8") as f:
-                json.dump(vector_data, f, indent=2, ensure_ascii=False)
-
-            log_status("✅ Vector index created successfully!")
-            success = True  # Only set to True if we get here
-
-        except ImportError as e:
-            log_status(f"Import error: {e}", "error")
-            log_status("OpenAI embeddings not available, skipping vector index creation", "warning")
-            success = False
-        except Exception as e:
-            log_status(f"❌ Failed to create vector index: {e}", "error")
-            import traceback
-            log_status(f"Full traceback: {traceback.format_exc()}", "error")
-            success = False  # Explicitly set to False on error
+        # If building fails the previously published index stays in place
+        stats = {"total_chunks": 0, "files_changed": 0, "embeddings_reused": 0, "embeddings_created": 0,
+                 "index_version": previous.header.get("index_version") if previous is not None else None}
+        up_to_date = (
+            previous is not None
+            and not deleted_files
+            and all(previous.unchanged(path, sha256) for path, sha256 in file_hashes.items())
+            and previous.count == sum(len(previous.rows_by_source[path]) for path in data_paths)
+        )
+
+        # 3-5. Split, embed and write the index
+        if up_to_date:
+            log_status("✅ Vector index is already up to date, nothing to embed")
+            stats["total_chunks"] = previous.count
+            ensure_bm25_index(previous)
+            ensure_filter_index(previous)
+            ensure_ann_index(previous)
+            ensure_shards(previous)
+            success = True
+        else:
+            try:
+                stats = build_index(data_paths, file_hashes, previous, openai_key)
+                log_status("✅ Vector index created successfully!")
+                success = True  # Only set to True if we get here
+
+            except ImportError as e:
+                log_status(f"Import error: {e}", "error")
+                log_status("OpenAI embeddings not available, skipping vector index creation", "warning")
+                success = False
+            except Exception as e:
+                log_status(f"❌ Failed to create vector index: {e}", "error")
+                import traceback
+                log_status(f"Full traceback: {traceback.format_exc()}", "error")
+                success = False  # Explicitly set to False on error
 
         # 6. Create metadata file
         metadata = {
             "last_updated": datetime.now().isoformat(),
             "total_files": len(data_paths),
-            "total_chunks": len(chunks_data),
+            "total_chunks": stats["total_chunks"],
             "files_processed": [os.path.basename(path) for path in data_paths],
-            "chunk_size": 1000,
-            "chunk_overlap": 200,
-            "vector_index_created": success
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "vector_index_created": success,
+            "files_changed": stats["files_changed"],
+            "files_deleted": len(deleted_files),
+            "embeddings_reused": stats["embeddings_reused"],
+            "embeddings_created": stats["embeddings_created"],
+            # Running bots watch this to hot-reload a newly published index
+            "index_version": stats["index_version"]
         }
 
-        with open("index_info.json", "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=2)
+        write_json_atomic("index_info.json", metadata)
 
         # Final status based on whether vector index was created
         if success:
             log_status(f"✅ Ingestion completed successfully!")
-            log_status(f"📊 Processed {len(data_paths)} files into {len(chunks_data)} chunks with vector index")
+            log_status(f"📊 Processed {len(data_paths)} files into {stats['total_chunks']} chunks with vector index "
+                       f"({stats['embeddings_reused']} embeddings reused, {stats['embeddings_created']} created)")
         else:
             log_status(f"⚠️ Ingestion completed with errors (no vector index created)", "error")
-            log_status(f"📊 Processed {len(data_paths)} files into {len(chunks_data)} chunks (chunks only)")
             log_status("❌ Vector search will not be available until embedding creation succeeds", "error")
 
     except Exception as e:
@@ -150,4 +535,4 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main()
+    main(full_rebuild="--full" in sys.argv)
@@ -0,0 +1,128 @@
+"""
+Zero-downtime hot reload of the vector index
+
+ReloadingVectorStore holds the current SimpleVectorStore and polls index_info.json for
+a new index_version published by enhanced_ingest.py. A new index is loaded in the
+background and swapped in with a single reference assignment; requests that already
+grabbed the old store via current() finish on it, since its files stay on disk.
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+from vector_search import SimpleVectorStore
+
+DEFAULT_RELOAD_INTERVAL = 30.0
+# Seconds a replaced store is kept open (e.g. its shard workers) for in-flight requests
+RETIRE_DELAY = 120.0
+
+
+def published_version(info_file: str = "index_info.json", vectors_file: str = "vectors.json") -> Optional[str]:
+    """Version stamp of the published index: index_version from index_info.json, else the header's mtime"""
+    try:
+        with open(info_file, "r", encoding="utf-8") as f:
+            version = json.load(f).get("index_version")
+        if version:
+            return str(version)
+    except (OSError, ValueError):
+        pass
+    try:
+        return f"mtime:{os.stat(vectors_file).st_mtime_ns}"
+    except OSError:
+        return None
+
+
+class ReloadingVectorStore:
+    """A SimpleVectorStore that is atomically replaced when a new index is published"""
+
+    def __init__(self, vectors_file: str = "vectors.json", info_file: str = "index_info.json",
+                 poll_interval: float = None, store_factory: Callable[[str], SimpleVectorStore] = None):
+        self.vectors_file = vectors_file
+        self.info_file = info_file
+        self.poll_interval = poll_interval if poll_interval is not None else float(
+            os.environ.get("INDEX_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL)
+        )
+        self.store_factory = store_factory or SimpleVectorStore
+        self.reloads = 0
+        self.last_reload_error = None
+        # A published version that failed to load is not retried until another one is published
+        self.failed_version = None
+        self._stop = threading.Event()
+        self._reload_lock = threading.Lock()
+        self._thread = None
+
+        self.version = published_version(info_file, vectors_file)
+        self._store = self.store_factory(vectors_file)
+
+    def current(self) -> SimpleVectorStore:
+        """The store to use for one request; keep using the same object until the request is done"""
+        return self._store
+
+    def check(self) -> bool:
+        """Load and swap in a newly published index; returns True if a swap happened"""
+        version = published_version(self.info_file, self.vectors_file)
+        if version is None or version in (self.version, self.failed_version):
+            return False
+
+        with self._reload_lock:
+            if version in (self.version, self.failed_version):
+                return False
+
+            print(f"🔄 New vector index published ({version}), loading in the background...")
+            started = time.time()
+            previous = self._store
+            try:
+                store = self.store_factory(self.vectors_file)
+            except Exception:
+                self.failed_version = version
+                raise
+            # Keep query embeddings: they depend on the embedding model, not on the index
+            store.query_cache = previous.query_cache
+
+            if not store.is_ready:
+                store.close()
+                self.failed_version = version
+                self.last_reload_error = f"index {version} failed to load"
+                print(f"⚠️ Keeping the current index: {self.last_reload_error}")
+                return False
+
+            self._store = store
+            # Requests still running on the old store get RETIRE_DELAY seconds to finish
+            retire = threading.Timer(RETIRE_DELAY, previous.close)
+            retire.daemon = True
+            retire.start()
+            self.version = version
+            self.reloads += 1
+            self.last_reload_error = None
+            self.failed_version = None
+            print(f"✅ Swapped in vector index {version} in {time.time() - started:.2f}s")
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.last_reload_error = str(e)
+                print(f"⚠️ Index reload check failed: {e}")
+
+    def start(self):
+        """Start polling for new indexes in a daemon thread (no-op if the interval is 0)"""
+        if self.poll_interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="index-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> dict:
+        stats = self._store.get_stats()
+        stats.update({
+            "index_version": self.version,
+            "reloads": self.reloads,
+            "last_reload_error": self.last_reload_error,
+            "failed_version": self.failed_version,
+        })
+        return stats
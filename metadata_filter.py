@@ -0,0 +1,272 @@
+"""
+Metadata-filtered search: restrict a search to chunks from some documents
+
+A SearchFilter selects documents by source path, glob or tag. Tags come from the path:
+every folder under data/ and the file name, plus their words, so data/hr/health-benefits.md
+has tags hr, health-benefits, health and benefits.
+
+Ingestion writes each file's chunks as consecutive rows, so every source maps to a few row
+ranges. FilterIndex (vectors.filters.npz, built next to the vectors) stores those ranges.
+Search turns a filter into ranges and scores only the matching rows: a filter that
+matches 1% of the corpus scans 1% of it.
+
+Questions can scope themselves with in:<tag|glob>, e.g.
+  /ask-primr in:benefits how much parental leave do we get?
+  /ask-primr in:data/hr/* in:faqs who approves expenses?
+Several in: terms match chunks from any of them.
+"""
+import fnmatch
+import os
+import re
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+from vector_format import built_for, load_npz, save_npz
+
+FILTER_FORMAT_VERSION = 1
+DATA_ROOT = "data"
+# Resolved filters kept per index; scopes repeat, so resolving is usually a dict lookup
+RANGE_CACHE_SIZE = 256
+
+_SCOPE = re.compile(r"(?:^|\s)in:(\S+)", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9]+")
+_GLOB_CHARS = set("*?[")
+
+
+def filter_path(vectors_file: str) -> str:
+    return os.path.splitext(vectors_file)[0] + ".filters.npz"
+
+
+def source_tags(source: str) -> set:
+    """Tags of a source path: its folders under data/ and its file name, whole and split into words"""
+    parts = source.replace("\\", "/").lower().split("/")
+    if len(parts) > 1 and parts[0] == DATA_ROOT:
+        parts = parts[1:]
+    parts[-1] = os.path.splitext(parts[-1])[0]
+    tags = set()
+    for part in parts:
+        if part:
+            tags.add(part)
+            tags.update(_WORD.findall(part))
+    return tags
+
+
+class SearchFilter:
+    """Chunks whose source is one of sources, matches one of globs, or has one of tags"""
+
+    def __init__(self, sources: Iterable[str] = (), globs: Iterable[str] = (), tags: Iterable[str] = ()):
+        self.sources = tuple(sorted(set(sources)))
+        self.globs = tuple(sorted(set(globs)))
+        self.tags = tuple(sorted({tag.lower() for tag in tags}))
+        if not (self.sources or self.globs or self.tags):
+            raise ValueError("A search filter needs at least one source, glob or tag")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SearchFilter":
+        return cls(data.get("sources", ()), data.get("globs", ()), data.get("tags", ()))
+
+    def to_dict(self) -> dict:
+        return {"sources": list(self.sources), "globs": list(self.globs), "tags": list(self.tags)}
+
+    @property
+    def key(self) -> str:
+        """Stable text form, used in cache keys"""
+        return " ".join([f"source:{s}" for s in self.sources] + [f"glob:{g}" for g in self.globs] +
+                        [f"tag:{t}" for t in self.tags])
+
+    def matches(self, source: str) -> bool:
+        if source in self.sources:
+            return True
+        name = os.path.basename(source)
+        # Patterns without a folder (f1*.md) match file names anywhere under data/
+        if any(fnmatch.fnmatchcase(source if "/" in pattern else name, pattern) for pattern in self.globs):
+            return True
+        return bool(self.tags) and not source_tags(source).isdisjoint(self.tags)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SearchFilter) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"SearchFilter({self.key})"
+
+
+def parse_scope(query: str) -> Tuple[str, Optional[SearchFilter]]:
+    """Split in:<scope> terms off a question; returns (question, filter or None)"""
+    scopes = _SCOPE.findall(query)
+    if not scopes:
+        return query, None
+
+    globs, tags = [], []
+    for scope in scopes:
+        scope = scope.strip(".,;:!?")
+        if not scope:
+            continue
+        if _GLOB_CHARS & set(scope):
+            globs.append(scope)
+        elif "/" in scope:
+            # A path: that file, or anything under that folder
+            scope = scope.rstrip("/")
+            globs.extend([scope, f"{scope}/*", f"*/{scope}", f"*/{scope}/*"])
+        else:
+            tags.append(scope)
+    question = " ".join(_SCOPE.sub(" ", query).split())
+    if not (globs or tags):
+        return question or query, None
+    # A bare "in:benefits" still has something to search for
+    return question or " ".join(scopes), SearchFilter(globs=globs, tags=tags)
+
+
+def merge_ranges(ranges: np.ndarray) -> np.ndarray:
+    """Sort (n, 2) [start, end) row ranges and join the ones that touch or overlap"""
+    if not len(ranges):
+        return np.empty((0, 2), dtype=np.int64)
+    ranges = ranges[np.argsort(ranges[:, 0], kind="stable")]
+    merged = [list(ranges[0])]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return np.asarray(merged, dtype=np.int64)
+
+
+def range_rows(ranges: np.ndarray) -> np.ndarray:
+    """Row ids covered by [start, end) ranges, ascending"""
+    if not len(ranges):
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+
+
+def range_mask(ranges: np.ndarray, count: int) -> np.ndarray:
+    """Boolean row mask of [start, end) ranges"""
+    mask = np.zeros(count, dtype=bool)
+    for start, end in ranges:
+        mask[start:end] = True
+    return mask
+
+
+class FilterBuilder:
+    """Collects the row ranges of every source while rows are written in order"""
+
+    def __init__(self):
+        self.count = 0
+        self._ranges = {}   # source -> [[start, end), ...]
+
+    def add(self, metadatas: Iterable[dict]):
+        for metadata in metadatas:
+            source = str(metadata.get("source", ""))
+            ranges = self._ranges.setdefault(source, [])
+            if ranges and ranges[-1][1] == self.count:
+                ranges[-1][1] += 1
+            else:
+                ranges.append([self.count, self.count + 1])
+            self.count += 1
+
+    def build(self, created_at: str = "unknown") -> "FilterIndex":
+        sources = sorted(self._ranges)
+        ranges = [self._ranges[source] for source in sources]
+        offsets = np.zeros(len(sources) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(r) for r in ranges])
+        flat = np.asarray([pair for r in ranges for pair in r], dtype=np.int64).reshape(-1, 2)
+        return FilterIndex(np.asarray(sources, dtype=str), offsets, flat, self.count, created_at)
+
+
+class FilterIndex:
+    """Row ranges per source; the ranges of source i are ranges[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, sources: np.ndarray, offsets: np.ndarray, ranges: np.ndarray, count: int,
+                 created_at: str = "unknown"):
+        self.sources = sources
+        self.offsets = offsets
+        self.ranges = ranges
+        self.count = int(count)
+        self.created_at = created_at
+        self._resolved = OrderedDict()
+        self._lock = threading.Lock()
+
+    def source_ranges(self, i: int) -> np.ndarray:
+        return self.ranges[self.offsets[i]:self.offsets[i + 1]]
+
+    def resolve(self, search_filter: SearchFilter) -> np.ndarray:
+        """Merged (n, 2) [start, end) row ranges of the chunks search_filter selects"""
+        key = search_filter.key
+        with self._lock:
+            if key in self._resolved:
+                self._resolved.move_to_end(key)
+                return self._resolved[key]
+
+        matched = [self.source_ranges(i) for i, source in enumerate(self.sources.tolist())
+                   if search_filter.matches(source)]
+        ranges = merge_ranges(np.concatenate(matched)) if matched else np.empty((0, 2), dtype=np.int64)
+        with self._lock:
+            self._resolved[key] = ranges
+            if len(self._resolved) > RANGE_CACHE_SIZE:
+                self._resolved.popitem(last=False)
+        return ranges
+
+    def tags(self) -> List[str]:
+        """Every tag with at least one chunk, for help messages"""
+        return sorted(set().union(*(source_tags(source) for source in self.sources.tolist())))
+
+    def save(self, path: str):
+        save_npz(path, FILTER_FORMAT_VERSION, self.created_at, sources=self.sources, offsets=self.offsets,
+                 ranges=self.ranges, count=np.array(self.count))
+
+    @classmethod
+    def load(cls, path: str) -> "FilterIndex":
+        data = load_npz(path, FILTER_FORMAT_VERSION, "filter index")
+        return cls(data["sources"], data["offsets"], data["ranges"], int(data["count"]), data["created_at"])
+
+    def matches(self, header: dict, count: int) -> bool:
+        """True if this index was built for the given vectors"""
+        return built_for(self, header, count)
+
+
+def build_filter_index(vectors_file: str) -> Optional[FilterIndex]:
+    """Build and save the filter index for a vectors file; returns None if there are no records"""
+    from vector_format import iter_records, read_index
+
+    header, matrix = read_index(vectors_file, load_records=False)
+    if matrix is None:
+        return None
+
+    builder = FilterBuilder()
+    builder.add(metadata for _, metadata in iter_records(vectors_file, header))
+    index = builder.build(created_at=str(header.get("created_at", "unknown")))
+    index.save(filter_path(vectors_file))
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Metadata filter index tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build the filter index for an existing vectors file")
+    build.add_argument("vectors_file", nargs="?", default="vectors.json")
+    show = subparsers.add_parser("show", help="Print the rows an in: scope selects")
+    show.add_argument("scope", help='e.g. "in:benefits"')
+    show.add_argument("vectors_file", nargs="?", default="vectors.json")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = build_filter_index(args.vectors_file)
+        if index is None:
+            print(f"❌ No records in {args.vectors_file}")
+        else:
+            print(f"✅ Filter index for {len(index.sources)} sources saved to {filter_path(args.vectors_file)}")
+    else:
+        index = FilterIndex.load(filter_path(args.vectors_file))
+        _, search_filter = parse_scope(args.scope)
+        if search_filter is None:
+            raise SystemExit("❌ Expected a scope like in:benefits")
+        ranges = index.resolve(search_filter)
+        rows = int((ranges[:, 1] - ranges[:, 0]).sum()) if len(ranges) else 0
+        print(f"🔎 {search_filter.key}: {rows} of {index.count} rows in {len(ranges)} ranges")
+        for i, source in enumerate(index.sources.tolist()):
+            if search_filter.matches(source):
+                print(f"   {source}")
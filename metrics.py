@@ -0,0 +1,216 @@
+"""
+In-process metrics with Prometheus text exposition (no extra dependencies)
+
+Every stage of answering a question is timed into the primr_stage_seconds histogram:
+query_embedding, lexical_search, vector_scoring, context_assembly, llm, llm_first_token
+and slack_post. Counters track questions, cache hits/misses and errors, and a gauge
+reports the index size. status_api.py serves them at /metrics; the Slack bot serves its
+own at http://localhost:$METRICS_PORT/metrics when METRICS_PORT is set.
+
+Usage:
+  with metrics.stage("llm"):
+      answer = chain.run(...)
+  metrics.CACHE_LOOKUPS.inc(cache="answer", result="hit")
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], **extra) -> Dict[str, str]:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self._samples()])
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """A value that can go up and down"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values (seconds, for latencies)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block took"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels) -> dict:
+        """count, sum and mean of one series"""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return {"count": 0, "sum": 0.0, "mean": 0.0}
+            return {"count": series[-1], "sum": series[-2], "mean": series[-2] / series[-1]}
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(self._labels(key, le=_format_value(bound)))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self._labels(key))} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self._labels(key))} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """The set of metrics rendered at /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "primr_stage_seconds", "Time spent in each stage of answering a question", ["stage"]
+))
+QUESTION_SECONDS = REGISTRY.register(Histogram(
+    "primr_question_seconds", "End-to-end time to answer a question", ["source"]
+))
+QUESTIONS = REGISTRY.register(Counter(
+    "primr_questions_total", "Questions received", ["source"]
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "primr_cache_lookups_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"]
+))
+ERRORS = REGISTRY.register(Counter(
+    "primr_errors_total", "Errors by component", ["component"]
+))
+INDEX_VECTORS = REGISTRY.register(Gauge(
+    "primr_index_vectors", "Vectors in the most recently loaded index"
+))
+WARM_UP_SECONDS = REGISTRY.register(Gauge(
+    "primr_warm_up_seconds", "Time spent in each startup warm-up stage", ["stage"]
+))
+
+
+def stage(name: str):
+    """Time one stage of a question: `with metrics.stage("llm"): ...`"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread (for processes without a web server, like the bot)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,71 @@
+"""
+Compressed embedding storage for SimpleVectorStore
+
+Embeddings can be kept in RAM as float16 (2x smaller) or int8 codes with a
+per-dimension scale (4x smaller than float32). Search scores the compressed codes
+first, then re-scores only the best candidates against the full-precision
+float32 matrix, which stays memory-mapped on disk so only those rows are read.
+"""
+import numpy as np
+from typing import Optional, Tuple
+
+QUANTIZATION_TYPES = ("float16", "int8")
+# How many candidates per requested result are re-scored at full precision
+DEFAULT_RESCORE_FACTOR = 4
+_BLOCK_ROWS = 65536
+
+
+def _int8_scale(matrix: np.ndarray) -> np.ndarray:
+    """Per-dimension symmetric scale so the largest |value| of each dimension maps to 127"""
+    max_abs = np.zeros(matrix.shape[1], dtype=np.float32)
+    for start in range(0, matrix.shape[0], _BLOCK_ROWS):
+        block = np.abs(np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32))
+        np.maximum(max_abs, block.max(axis=0), out=max_abs)
+    max_abs[max_abs == 0] = 1.0
+    return max_abs / 127.0
+
+
+def quantize(matrix: np.ndarray, kind: str, out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compress a (possibly memory-mapped) float32 matrix block by block
+    out may be a preallocated (e.g. memory-mapped) array of the right dtype and shape.
+    Returns (codes, scale); scale is None for float16
+    """
+    if kind not in QUANTIZATION_TYPES:
+        raise ValueError(f"Unknown quantization {kind!r}, expected one of {QUANTIZATION_TYPES}")
+
+    if kind == "float16":
+        codes = out if out is not None else np.empty(matrix.shape, dtype=np.float16)
+        for start in range(0, matrix.shape[0], _BLOCK_ROWS):
+            codes[start:start + _BLOCK_ROWS] = matrix[start:start + _BLOCK_ROWS]
+        return codes, None
+
+    scale = _int8_scale(matrix)
+    codes = out if out is not None else np.empty(matrix.shape, dtype=np.int8)
+    for start in range(0, matrix.shape[0], _BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32) / scale
+        codes[start:start + len(block)] = np.clip(np.rint(block), -127, 127)
+    return codes, scale
+
+
+def approximate_scores(codes: np.ndarray, scale: Optional[np.ndarray], queries: np.ndarray) -> np.ndarray:
+    """
+    Approximate dot products between compressed rows and one (dims,) or many (n, dims) queries
+    Codes are widened to float32 one block at a time so the full matrix is never expanded
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if scale is not None:
+        # x ~= codes * scale, so x . q ~= codes . (scale * q)
+        queries = queries * scale
+
+    scores = np.empty(queries.shape[:-1] + (codes.shape[0],), dtype=np.float32)
+    for start in range(0, codes.shape[0], _BLOCK_ROWS):
+        block = codes[start:start + _BLOCK_ROWS].astype(np.float32)
+        scores[..., start:start + len(block)] = queries @ block.T
+    return scores
+
+
+def compression_ratio(codes: np.ndarray, scale: Optional[np.ndarray]) -> float:
+    """How much smaller the in-memory codes are than the same matrix in float32"""
+    stored = codes.nbytes + (scale.nbytes if scale is not None else 0)
+    return round(codes.size * 4 / stored, 2) if stored else 1.0
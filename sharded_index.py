@@ -0,0 +1,813 @@
+"""
+Sharded vector index: scatter a search over shard workers and merge their top-k
+
+With INDEX_SHARDS=N (N > 1), enhanced_ingest.py also partitions the index round-robin
+into N shards, each a regular index with its own BM25 (and ANN) index:
+  vectors.shards.json                          manifest: shard files, row counts, created_at
+  vectors.shards/<index_version>-xN/shard-000.json ...
+
+When the manifest matches the published index, the bot searches through a
+ShardedVectorStore instead of loading the whole corpus. Each shard is served by its own
+worker process holding one SimpleVectorStore. The query is embedded once, sent to
+every shard in parallel, and the per-shard top-k lists (cosine and BM25) are merged
+into the global top-k. Only the winning rows' texts travel back.
+
+Workers are local processes by default. To spread shards over machines, start one per
+shard elsewhere and point the bot at them:
+  SHARD_AUTHKEY=secret python sharded_index.py serve vectors.json --shard 0 --port 7000
+  SHARD_ADDRESSES=host-a:7000,host-b:7000 SHARD_AUTHKEY=secret python slack_bot.py
+Messages are JSON plus raw float32 bytes in one frame over multiprocessing.connection with
+HMAC authentication, so nothing is unpickled on either side.
+
+BM25 statistics (IDF, average length) are per shard, so lexical scores are only
+approximately comparable across shards; with round-robin partitioning the shards
+have near-identical statistics.
+
+Build shards for an existing index with:
+  python sharded_index.py build vectors.json --shards 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional, Tuple
+import metrics
+from bm25_index import LEXICAL_MAX_TERMS, BM25Builder, bm25_path, reciprocal_rank_fusion, tokenize
+from embedding_cache import QueryEmbeddingCache
+from embedding_providers import check_compatible, indexed_model
+from metadata_filter import FilterBuilder, SearchFilter, filter_path
+from vector_format import IndexWriter, iter_records, read_index
+from vector_search import RRF_CANDIDATE_FACTOR, RRF_K, SimpleVectorStore
+
+MANIFEST_VERSION = 1
+# Published shard sets kept on disk for stores still using them
+KEEP_SHARD_VERSIONS = 2
+DEFAULT_REQUEST_TIMEOUT = 10.0
+DEFAULT_START_TIMEOUT = 120.0
+BUILD_BLOCK_ROWS = 4096
+
+
+class ShardError(RuntimeError):
+    """Raised when a shard worker cannot be reached or fails a request"""
+
+
+def manifest_path(vectors_file: str) -> str:
+    return os.path.splitext(vectors_file)[0] + ".shards.json"
+
+
+def shards_root(vectors_file: str) -> str:
+    return os.path.splitext(vectors_file)[0] + ".shards"
+
+
+def read_manifest(vectors_file: str) -> Optional[dict]:
+    """The shard manifest for a vectors file, or None if there is none"""
+    try:
+        with open(manifest_path(vectors_file), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported shard manifest version {manifest.get('version')!r}")
+    return manifest
+
+
+def _header_created_at(vectors_file: str) -> Optional[str]:
+    try:
+        with open(vectors_file, "r", encoding="utf-8") as f:
+            return str(json.load(f).get("created_at", "unknown"))
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_matches(manifest: Optional[dict], vectors_file: str) -> bool:
+    """True if the shards were built from the index currently published at vectors_file"""
+    return manifest is not None and manifest.get("created_at") == _header_created_at(vectors_file)
+
+
+class ShardWriter:
+    """Streams rows round-robin into N shard indexes; close() publishes them with a manifest"""
+
+    def __init__(self, vectors_file: str, shards: int, embedding_model: str, created_at: str,
+                 index_version: str, quantization: Optional[str] = None):
+        if shards < 2:
+            raise ValueError("A sharded index needs at least 2 shards")
+        self.vectors_file = vectors_file
+        self.shards = shards
+        self.embedding_model = embedding_model
+        self.created_at = created_at
+        self.index_version = index_version
+        self.count = 0
+        self.directory = os.path.join(shards_root(vectors_file), f"{index_version}-x{shards}")
+        os.makedirs(self.directory, exist_ok=True)
+        self.files = [os.path.join(self.directory, f"shard-{i:03d}.json") for i in range(shards)]
+        # Shards carry the parent's created_at, so their BM25/ANN indexes and the manifest line up
+        self.writers = [IndexWriter(path, embedding_model, created_at=created_at, quantization=quantization)
+                        for path in self.files]
+        self.bm25 = [BM25Builder() for _ in range(shards)]
+        self.filters = [FilterBuilder() for _ in range(shards)]
+
+    def add(self, embeddings, texts: List[str], metadata: List[dict]):
+        """Append a block of rows; global row g goes to shard g % shards"""
+        if not len(texts):
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        owners = (self.count + np.arange(len(texts))) % self.shards
+        for shard in range(self.shards):
+            rows = np.flatnonzero(owners == shard)
+            if len(rows):
+                shard_texts = [texts[i] for i in rows]
+                self.writers[shard].add(embeddings[rows], shard_texts, [metadata[i] for i in rows])
+                self.bm25[shard].add(shard_texts)
+                self.filters[shard].add([metadata[i] for i in rows])
+        self.count += len(texts)
+
+    def close(self) -> dict:
+        """Publish every shard, then the manifest; returns the manifest"""
+        from ann_index import DEFAULT_MIN_VECTORS, build_ann_index
+
+        ann_min_vectors = int(os.getenv("ANN_MIN_VECTORS", DEFAULT_MIN_VECTORS))
+        entries = []
+        for path, writer, bm25, filters in zip(self.files, self.writers, self.bm25, self.filters):
+            bm25.build(created_at=self.created_at).save(bm25_path(path))
+            filters.build(created_at=self.created_at).save(filter_path(path))
+            rows = writer.close()["count"]
+            if rows >= ann_min_vectors:
+                build_ann_index(path)
+            entries.append({
+                "file": os.path.relpath(path, os.path.dirname(os.path.abspath(self.vectors_file))),
+                "rows": rows,
+            })
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "partition": "round_robin",
+            "created_at": self.created_at,
+            "index_version": self.index_version,
+            "embedding_model": self.embedding_model,
+            "dimensions": self.writers[0].dimensions or 0,
+            "count": self.count,
+            "shards": entries,
+        }
+        path = manifest_path(self.vectors_file)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+        remove_old_shard_versions(self.vectors_file)
+        return manifest
+
+    def abort(self):
+        for writer in self.writers:
+            writer.abort()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def remove_old_shard_versions(vectors_file: str, keep: int = KEEP_SHARD_VERSIONS):
+    """Delete all but the newest `keep` shard sets (never the one in the manifest)"""
+    root = shards_root(vectors_file)
+    if not os.path.isdir(root):
+        return
+    manifest = read_manifest(vectors_file) or {}
+    current = {os.path.basename(os.path.dirname(entry["file"])) for entry in manifest.get("shards", [])}
+    for name in sorted(os.listdir(root))[:-keep]:
+        if name not in current:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def remove_shards(vectors_file: str):
+    """Delete the manifest and every shard set, e.g. when sharding is turned off"""
+    path = manifest_path(vectors_file)
+    if os.path.exists(path):
+        os.remove(path)
+    shutil.rmtree(shards_root(vectors_file), ignore_errors=True)
+
+
+def build_shards(vectors_file: str, shards: int) -> dict:
+    """Partition an already published index into shards; returns the manifest"""
+    header, matrix = read_index(vectors_file, load_records=False)
+    if matrix is None:
+        raise ValueError(f"No vectors in {vectors_file}")
+
+    quantization = header.get("quantization", {}).get("type") or os.getenv("VECTOR_QUANTIZATION") or None
+    writer = ShardWriter(
+        vectors_file, shards, header.get("embedding_model", "unknown"), str(header.get("created_at", "unknown")),
+        header.get("index_version") or datetime.now().strftime("%Y%m%dT%H%M%S%f"), quantization,
+    )
+    try:
+        texts, metadata = [], []
+        for text, meta in iter_records(vectors_file, header):
+            texts.append(text)
+            metadata.append(meta)
+            if len(texts) == BUILD_BLOCK_ROWS:
+                writer.add(matrix[writer.count:writer.count + len(texts)], texts, metadata)
+                texts, metadata = [], []
+        writer.add(matrix[writer.count:writer.count + len(texts)], texts, metadata)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+# --- wire protocol -------------------------------------------------------------------
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _send(conn, message: dict, array: Optional[np.ndarray] = None):
+    """One frame: 4-byte JSON length, the JSON message, then the raw float32 array if any"""
+    if array is not None:
+        array = np.ascontiguousarray(array, dtype=np.float32)
+        message = {**message, "array_shape": list(array.shape)}
+    body = json.dumps(message, default=_json_default).encode("utf-8")
+    # A single send per message: a second small write would wait on delayed ACKs (Nagle)
+    conn.send_bytes(len(body).to_bytes(4, "little") + body + (array.tobytes() if array is not None else b""))
+
+
+def _recv(conn) -> Tuple[dict, Optional[np.ndarray]]:
+    frame = conn.recv_bytes()
+    size = int.from_bytes(frame[:4], "little")
+    message = json.loads(frame[4:4 + size])
+    shape = message.pop("array_shape", None)
+    array = None
+    if shape is not None:
+        array = np.frombuffer(frame, dtype=np.float32, offset=4 + size).reshape(shape)
+    return message, array
+
+
+# --- shard worker --------------------------------------------------------------------
+
+def _handle(store: SimpleVectorStore, message: dict, array: Optional[np.ndarray]) -> dict:
+    op = message.get("op")
+    if op == "search":
+        reply = {}
+        # A source's rows are consecutive in every shard too, so each shard resolves filters itself
+        ranges = store._filter_ranges(SearchFilter.from_dict(message["filter"])) if message.get("filter") else None
+        if message.get("k_dense") and array is not None:
+            reply["dense"] = [[ids.tolist(), scores.tolist()]
+                              for ids, scores in store._dense_search_batch(array, message["k_dense"], ranges)]
+        if message.get("k_lexical") and store.bm25_index is not None:
+            lexical = []
+            for query in message["queries"]:
+                ids, scores = store.bm25_index.search(query, message["k_lexical"], ranges)
+                # The fast path needs to know whether the best match contains every query term
+                has_all = bool(len(ids)) and store.bm25_index.contains_all(int(ids[0]), set(tokenize(query)))
+                lexical.append([ids.tolist(), scores.tolist(), has_all])
+            reply["lexical"] = lexical
+        return reply
+    if op == "scope":
+        tags = store.unmatched_scope_tags(SearchFilter.from_dict(message["filter"]))
+        return {"matched": tags is None, "tags": tags or []}
+    if op == "records":
+        return {"records": [list(store._result(row, 0.0)[:2]) for row in message["rows"]]}
+    if op == "ping":
+        return {"created_at": str(store.data.get("created_at", "unknown")), "rows": int(store.matrix.shape[0]),
+                "bm25": store.bm25_index is not None}
+    if op == "stats":
+        return {"stats": store.get_stats()}
+    raise ValueError(f"Unknown op {op!r}")
+
+
+def _serve_connection(store: SimpleVectorStore, conn):
+    with conn:
+        while True:
+            try:
+                message, array = _recv(conn)
+            except (EOFError, OSError):
+                return
+            try:
+                reply = _handle(store, message, array)
+            except Exception as e:
+                reply = {"error": f"{e.__class__.__name__}: {e}"}
+            try:
+                _send(conn, reply)
+            except OSError:
+                return
+
+
+class _PrecomputedQueries:
+    """Embeddings stand-in for shard workers: searches arrive with the query vectors already computed"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def embed_query(self, text: str):
+        raise RuntimeError("shard workers do not embed text")
+
+    def embed_documents(self, texts: List[str]):
+        raise RuntimeError("shard workers do not embed text")
+
+
+def serve_shard(vectors_file: str, address: Tuple[str, int], authkey: bytes, ready=None):
+    """Load one shard and answer search requests on address (one thread per connection)"""
+    # The shard never embeds text, so it needs no embeddings client (or API key), only the model name
+    try:
+        header, _ = read_index(vectors_file, load_records=False)
+        embeddings = _PrecomputedQueries(indexed_model(header))
+    except Exception as e:
+        if ready is not None:
+            ready.send_bytes(json.dumps({"error": f"could not load {vectors_file}: {e}"}).encode("utf-8"))
+        return
+    store = SimpleVectorStore(vectors_file, query_cache=QueryEmbeddingCache(max_size=0), retrieval_mode="hybrid",
+                              embeddings_model=embeddings)
+    if not store.is_ready:
+        if ready is not None:
+            ready.send_bytes(json.dumps({"error": f"could not load {vectors_file}"}).encode("utf-8"))
+        return
+
+    listener = Listener(address, authkey=authkey)
+    if ready is not None:
+        ready.send_bytes(json.dumps({"address": list(listener.address)}).encode("utf-8"))
+        ready.close()
+    print(f"🧩 Serving shard {vectors_file} on {listener.address[0]}:{listener.address[1]}")
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            # Failed handshakes (wrong authkey, port scanners) must not stop the worker
+            print(f"⚠️ Rejected shard connection: {e}")
+            continue
+        threading.Thread(target=_serve_connection, args=(store, conn), daemon=True).start()
+
+
+class ShardClient:
+    """Connection pool to one shard worker, with health counters; starts local workers itself"""
+
+    def __init__(self, index: int, rows: int, authkey: bytes, vectors_file: str = None,
+                 address: Tuple[str, int] = None, timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.index = index
+        self.rows = rows
+        self.authkey = authkey
+        self.vectors_file = vectors_file    # set for local workers
+        self.address = address              # set for remote workers
+        self.local = address is None
+        self.timeout = timeout
+        self.process = None
+        self.healthy = False
+        self.requests = 0
+        self.failures = 0
+        self.restarts = 0
+        self.last_error = None
+        self.last_latency_ms = None
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def start(self, timeout: float = DEFAULT_START_TIMEOUT):
+        """Spawn the local worker and wait until its shard is loaded"""
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(target=serve_shard, args=(self.vectors_file, ("127.0.0.1", 0), self.authkey, sender),
+                                       name=f"primr-shard-{self.index}", daemon=True)
+        self.process.start()
+        sender.close()
+        if not receiver.poll(timeout):
+            self.stop()
+            raise ShardError(f"shard {self.index} did not start within {timeout:.0f}s")
+        try:
+            reply = json.loads(receiver.recv_bytes())
+        except EOFError:
+            reply = {"error": "worker exited while loading"}
+        receiver.close()
+        if "error" in reply:
+            self.stop()
+            raise ShardError(f"shard {self.index}: {reply['error']}")
+        self.address = tuple(reply["address"])
+        self.healthy = True
+
+    def stop(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        if self.local and (self.process is None or not self.process.is_alive()):
+            with self._lock:
+                if self.process is None or not self.process.is_alive():
+                    print(f"♻️ Restarting shard worker {self.index}")
+                    self.restarts += 1
+                    self.start()
+        return Client(self.address, authkey=self.authkey)
+
+    def request(self, message: dict, array: Optional[np.ndarray] = None) -> dict:
+        """Send one request and wait for the reply; raises ShardError"""
+        try:
+            return self._request(message, array)
+        except ShardError:
+            if not self.local or self.process is None or self.process.is_alive():
+                raise
+        # A dead local worker only breaks its pooled connections: restart it and retry once
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        return self._request(message, array)
+
+    def _request(self, message: dict, array: Optional[np.ndarray] = None) -> dict:
+        started = time.perf_counter()
+        self.requests += 1
+        try:
+            conn = self._acquire()
+            try:
+                _send(conn, message, array)
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"no reply within {self.timeout:.0f}s")
+                reply, _ = _recv(conn)
+            except BaseException:
+                # The connection may still have a late reply in it; never reuse it
+                conn.close()
+                raise
+        except Exception as e:
+            self.failures += 1
+            self.healthy = False
+            self.last_error = f"{e.__class__.__name__}: {e}"
+            raise ShardError(f"shard {self.index}: {self.last_error}") from e
+
+        with self._lock:
+            self._idle.append(conn)
+        self.healthy = True
+        self.last_latency_ms = round((time.perf_counter() - started) * 1000, 3)
+        if "error" in reply:
+            raise ShardError(f"shard {self.index}: {reply['error']}")
+        return reply
+
+    def get_stats(self) -> dict:
+        alive = self.process.is_alive() if self.local and self.process is not None else None
+        return {
+            "shard": self.index,
+            "rows": self.rows,
+            "address": f"{self.address[0]}:{self.address[1]}" if self.address else None,
+            "local": self.local,
+            "healthy": self.healthy and alive is not False,
+            "requests": self.requests,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "last_latency_ms": self.last_latency_ms,
+            "last_error": self.last_error,
+        }
+
+
+def _addresses_from_env() -> Optional[List[Tuple[str, int]]]:
+    value = os.environ.get("SHARD_ADDRESSES", "").strip()
+    if not value:
+        return None
+    addresses = []
+    for item in value.split(","):
+        host, _, port = item.strip().rpartition(":")
+        addresses.append((host or "127.0.0.1", int(port)))
+    return addresses
+
+
+def _merge_top_k(lists: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Global (row ids, scores) best first from per-shard lists"""
+    if not lists:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    ids = np.concatenate([ids for ids, _ in lists])
+    scores = np.concatenate([scores for _, scores in lists])
+    order = np.argsort(-scores, kind="stable")[:k]
+    return ids[order], scores[order]
+
+
+class ShardedVectorStore(SimpleVectorStore):
+    """SimpleVectorStore over shard workers: queries fan out to every shard and the top-k are merged"""
+
+    def __init__(self, vectors_file: str = "vectors.json", addresses: List[Tuple[str, int]] = None,
+                 authkey: bytes = None, **kwargs):
+        self.addresses = addresses if addresses is not None else _addresses_from_env()
+        if self.addresses is not None:
+            authkey = authkey or os.environ.get("SHARD_AUTHKEY", "").encode("utf-8")
+            if not authkey:
+                raise ValueError("SHARD_AUTHKEY is required with SHARD_ADDRESSES")
+        # Local workers get a fresh random key; nothing else can talk to them
+        self.authkey = authkey or os.urandom(32)
+        self.timeout = float(os.environ.get("SHARD_TIMEOUT", DEFAULT_REQUEST_TIMEOUT))
+        self.manifest = None
+        self.shards: List[ShardClient] = []
+        self.has_bm25 = False
+        self.partial_results = 0
+        self._pool = None
+        super().__init__(vectors_file, **kwargs)
+
+    @property
+    def is_ready(self) -> bool:
+        return bool(self.data) and any(shard.rows for shard in self.shards)
+
+    def load(self):
+        """Read the manifest and start (or connect to) one worker per shard"""
+        try:
+            manifest = read_manifest(self.vectors_file)
+            if manifest is None:
+                raise FileNotFoundError(manifest_path(self.vectors_file))
+            check_compatible(manifest, self.embeddings_model)
+            directory = os.path.dirname(os.path.abspath(self.vectors_file))
+            entries = manifest["shards"]
+            if self.addresses is not None and len(self.addresses) != len(entries):
+                raise ValueError(f"SHARD_ADDRESSES lists {len(self.addresses)} workers for {len(entries)} shards")
+
+            self.shards = [
+                ShardClient(i, entry["rows"], self.authkey, timeout=self.timeout,
+                            vectors_file=os.path.join(directory, entry["file"]),
+                            address=self.addresses[i] if self.addresses is not None else None)
+                for i, entry in enumerate(entries)
+            ]
+            self._pool = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard-search")
+            live = [shard for shard in self.shards if shard.rows]
+            if self.addresses is None:
+                # Shards load in parallel; each start() waits for its own worker
+                list(self._pool.map(ShardClient.start, live))
+
+            # Every worker must serve the shard set this manifest describes
+            pings = list(self._pool.map(lambda shard: shard.request({"op": "ping"}), live))
+            for shard, ping in zip(live, pings):
+                if ping["created_at"] != manifest["created_at"] or ping["rows"] != shard.rows:
+                    raise ShardError(f"shard {shard.index} serves a different index ({ping['created_at']})")
+            self.has_bm25 = all(ping["bm25"] for ping in pings)
+
+            self.manifest = manifest
+            self.data = {key: manifest.get(key) for key in ("created_at", "index_version", "embedding_model",
+                                                             "dimensions", "count")}
+            metrics.INDEX_VECTORS.set(manifest["count"])
+            print(f"✅ Loaded {manifest['count']} vectors in {len(self.shards)} shards from {self.vectors_file}")
+        except Exception as e:
+            print(f"❌ Error loading sharded index: {e}")
+            self.close()
+            self.data = None
+
+    def close(self):
+        """Stop local shard workers and close connections"""
+        for shard in self.shards:
+            shard.stop()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def _global_rows(self, shard: ShardClient, rows) -> np.ndarray:
+        # Round-robin partition: local row r of shard s is global row r * shards + s
+        return np.asarray(rows, dtype=np.int64) * len(self.shards) + shard.index
+
+    def _scatter(self, message: dict, array: Optional[np.ndarray] = None) -> List[Tuple[ShardClient, dict]]:
+        """Send message to every non-empty shard at once; shards that fail are left out"""
+        live = [shard for shard in self.shards if shard.rows]
+        futures = [self._pool.submit(shard.request, message, array) for shard in live]
+        replies = []
+        for shard, future in zip(live, futures):
+            try:
+                replies.append((shard, future.result()))
+            except ShardError as e:
+                print(f"⚠️ {e}")
+        if not replies:
+            raise ShardError("no shard answered")
+        if len(replies) < len(live):
+            self.partial_results += 1
+        return replies
+
+    def _search(self, queries: List[str], query_matrix: Optional[np.ndarray], k_dense: int, k_lexical: int,
+                filter: SearchFilter = None):
+        """Per query: merged (ids, scores) dense candidates and (ids, scores, best has every term) lexical ones"""
+        message = {"op": "search", "queries": queries, "k_dense": k_dense if query_matrix is not None else 0,
+                   "k_lexical": k_lexical if self.has_bm25 else 0,
+                   "filter": filter.to_dict() if filter is not None else None}
+        with metrics.stage("shard_search"):
+            replies = self._scatter(message, query_matrix if message["k_dense"] else None)
+
+        dense, lexical = [], []
+        for q in range(len(queries)):
+            dense.append(_merge_top_k([
+                (self._global_rows(shard, reply["dense"][q][0]), np.asarray(reply["dense"][q][1], dtype=np.float32))
+                for shard, reply in replies if "dense" in reply
+            ], k_dense))
+
+            shard_lists, best, best_has_all = [], None, False
+            for shard, reply in replies:
+                if "lexical" not in reply:
+                    continue
+                ids, scores, has_all = reply["lexical"][q]
+                shard_lists.append((self._global_rows(shard, ids), np.asarray(scores, dtype=np.float32)))
+                if scores and (best is None or scores[0] > best):
+                    best, best_has_all = scores[0], has_all
+            ids, scores = _merge_top_k(shard_lists, k_lexical)
+            lexical.append((ids, scores, best_has_all))
+        return dense, lexical
+
+    def _results(self, hits: List[Tuple[np.ndarray, np.ndarray]]) -> List[List[Tuple[str, dict, float]]]:
+        """(text, metadata, score) lists for per-query (global ids, scores), fetching texts from the shards"""
+        n = len(self.shards)
+        wanted = sorted({int(row) for ids, _ in hits for row in ids})
+        by_shard = {}
+        for row in wanted:
+            by_shard.setdefault(row % n, []).append(row)
+
+        records = {}
+        futures = {
+            index: self._pool.submit(self.shards[index].request, {"op": "records", "rows": [row // n for row in rows]})
+            for index, rows in by_shard.items()
+        }
+        failed = 0
+        for index, future in futures.items():
+            try:
+                reply = future.result()
+            except ShardError as e:
+                # Like _scatter: the shard's rows are left out of the results
+                print(f"⚠️ {e}")
+                failed += 1
+                continue
+            for row, (text, metadata) in zip(by_shard[index], reply["records"]):
+                records[row] = (text, metadata)
+        if failed and failed == len(futures):
+            raise ShardError("no shard answered")
+        if failed:
+            self.partial_results += 1
+
+        return [[(*records[int(row)], float(score)) for row, score in zip(ids, scores) if int(row) in records]
+                for ids, scores in hits]
+
+    def unmatched_scope_tags(self, filter: SearchFilter) -> Optional[List[str]]:
+        if not self.is_ready:
+            return None
+        live = [shard for shard in self.shards if shard.rows]
+        try:
+            replies = self._scatter({"op": "scope", "filter": filter.to_dict()})
+        except ShardError as e:
+            print(f"⚠️ {e}")
+            return None
+        # A shard that did not answer may hold the matching chunks
+        if len(replies) < len(live) or any(reply["matched"] for _, reply in replies):
+            return None
+        return sorted(set().union(*(reply["tags"] for _, reply in replies)))
+
+    def lexical_search(self, query: str, k: int = 5, filter: SearchFilter = None) -> List[Tuple[str, dict, float]]:
+        if not self.is_ready or not self.has_bm25:
+            return []
+        _, lexical = self._search([query], None, 0, k, filter)
+        ids, scores, _ = lexical[0]
+        return self._results([(ids, scores)])[0]
+
+    def lexical_probe(self, query: str, k: int = 5,
+                      filter: SearchFilter = None) -> Tuple[Optional[List[Tuple[str, dict, float]]], Optional[np.ndarray]]:
+        if not self.is_ready or not self.has_bm25:
+            return None, None
+        if self.retrieval_mode == "lexical":
+            return self.lexical_search(query, k, filter), None
+        if self.retrieval_mode != "hybrid":
+            return None, None
+
+        _, lexical = self._search([query], None, 0, k * RRF_CANDIDATE_FACTOR, filter)
+        ids, scores, best_has_all = lexical[0]
+        if not self.lexical_fast_path_enabled or not self._is_confident(query, ids, scores, best_has_all):
+            return None, ids
+        self.lexical_fast_paths += 1
+        return self._results([(ids[:k], scores[:k])])[0], None
+
+    def _is_confident(self, query: str, ids: np.ndarray, scores: np.ndarray, best_has_all: bool) -> bool:
+        """Same rule as BM25Index.is_confident, applied to the merged ranking"""
+        terms = set(tokenize(query))
+        if not terms or len(terms) > LEXICAL_MAX_TERMS:
+            return False
+        if not len(ids) or not best_has_all:
+            return False
+        return len(scores) < 2 or scores[0] >= self.lexical_confidence_ratio * scores[1]
+
+    def lexical_fast_path(self, query: str, k: int = 5,
+                          filter: SearchFilter = None) -> Optional[List[Tuple[str, dict, float]]]:
+        return self.lexical_probe(query, k, filter)[0]
+
+    def hybrid_search_by_vector(self, query: str, query_vec: np.ndarray, k: int = 5, filter: SearchFilter = None,
+                                lexical_ids: Optional[np.ndarray] = None) -> List[Tuple[str, dict, float]]:
+        return self.hybrid_search_batch([query], np.asarray(query_vec, dtype=np.float32)[None, :], k, filter,
+                                        None if lexical_ids is None else [lexical_ids])[0]
+
+    def hybrid_search_batch(self, queries: List[str], query_matrix: np.ndarray, k: int = 5, filter: SearchFilter = None,
+                            lexical_ids: Optional[List[Optional[np.ndarray]]] = None) -> List[List[Tuple[str, dict, float]]]:
+        if not self.is_ready:
+            return [[] for _ in queries]
+        if not self.has_bm25 or self.retrieval_mode != "hybrid":
+            return self._dense_results(queries, query_matrix, k, filter)
+
+        candidates = k * RRF_CANDIDATE_FACTOR
+        # Rankings from lexical_probe are reused; the shards only run BM25 when one is missing
+        known = lexical_ids if lexical_ids is not None else [None] * len(queries)
+        missing = any(ids is None for ids in known)
+        dense, lexical = self._search(queries, query_matrix, candidates, candidates if missing else 0, filter)
+        fused = [reciprocal_rank_fusion([dense_ids, ranking if ranking is not None else ids], k, RRF_K)
+                 for (dense_ids, _), (ids, _, _), ranking in zip(dense, lexical, known)]
+        return self._results(fused)
+
+    def _dense_results(self, queries: List[str], query_matrix: np.ndarray, k: int,
+                       filter: SearchFilter = None) -> List[List[Tuple[str, dict, float]]]:
+        dense, _ = self._search(queries, query_matrix, k, 0, filter)
+        return self._results(dense)
+
+    def similarity_search_by_vector(self, query_vec: np.ndarray, k: int = 5,
+                                    filter: SearchFilter = None) -> List[Tuple[str, dict, float]]:
+        if not self.is_ready:
+            return []
+        return self._dense_results([""], np.asarray(query_vec, dtype=np.float32)[None, :], k, filter)[0]
+
+    def similarity_search_batch(self, queries: List[str], k: int = 5,
+                                filter: SearchFilter = None) -> List[List[Tuple[str, dict, float]]]:
+        if not queries or not self.is_ready:
+            return [[] for _ in queries]
+        try:
+            return self._dense_results(list(queries), self.embed_queries(list(queries)), k, filter)
+        except Exception as e:
+            print(f"❌ Error during batch search: {e}")
+            return [[] for _ in queries]
+
+    def get_all_texts(self) -> List[str]:
+        return []
+
+    def get_stats(self) -> dict:
+        if not self.data:
+            return {"status": "not_loaded"}
+
+        shards = [shard.get_stats() for shard in self.shards]
+        healthy = all(shard["healthy"] for shard in shards if shard["rows"])
+        return {
+            # "degraded": some shards are down and searches only cover the others
+            "status": "loaded" if healthy else "degraded",
+            "total_vectors": self.data.get("count", 0),
+            "embedding_model": self.data.get("embedding_model", "unknown"),
+            "query_embedding_model": self.embedding_model_name,
+            "dimensions": self.data.get("dimensions", 0),
+            "created_at": self.data.get("created_at", "unknown"),
+            "query_cache": self.query_cache.get_stats(),
+            "search_mode": "sharded",
+            "retrieval_mode": self.retrieval_mode if self.has_bm25 else "dense",
+            "lexical_fast_paths": self.lexical_fast_paths,
+            "partial_results": self.partial_results,
+            "shard_count": len(self.shards),
+            "shards": shards,
+        }
+
+
+def open_store(vectors_file: str = "vectors.json", **kwargs) -> SimpleVectorStore:
+    """A ShardedVectorStore if shards were built for the published index, else a SimpleVectorStore"""
+    try:
+        manifest = read_manifest(vectors_file)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable shard manifest: {e}")
+        manifest = None
+    if manifest_matches(manifest, vectors_file):
+        store = ShardedVectorStore(vectors_file, **kwargs)
+        if store.is_ready:
+            return store
+        print(f"⚠️ Shard workers unavailable, loading {vectors_file} in-process")
+    elif manifest is not None:
+        print(f"⚠️ Ignoring shard manifest built for another index, loading {vectors_file} in-process")
+    return SimpleVectorStore(vectors_file, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded vector index tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Partition a published index into shards")
+    build.add_argument("vectors_file", nargs="?", default="vectors.json")
+    build.add_argument("--shards", type=int, required=True)
+
+    serve = subparsers.add_parser("serve", help="Serve one shard to remote bots (needs SHARD_AUTHKEY)")
+    serve.add_argument("vectors_file", nargs="?", default="vectors.json")
+    serve.add_argument("--shard", type=int, required=True)
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, required=True)
+
+    stats = subparsers.add_parser("stats", help="Start the shard workers and print per-shard health")
+    stats.add_argument("vectors_file", nargs="?", default="vectors.json")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.time()
+        manifest = build_shards(args.vectors_file, args.shards)
+        print(f"✅ Split {manifest['count']} vectors into {len(manifest['shards'])} shards "
+              f"in {time.time() - started:.1f}s -> {manifest_path(args.vectors_file)}")
+
+    elif args.command == "serve":
+        authkey = os.environ.get("SHARD_AUTHKEY", "").encode("utf-8")
+        if not authkey:
+            raise SystemExit("❌ Set SHARD_AUTHKEY (the same value on the bot) before serving a shard")
+        manifest = read_manifest(args.vectors_file)
+        if manifest is None:
+            raise SystemExit(f"❌ No shard manifest for {args.vectors_file}; run: python sharded_index.py build")
+        directory = os.path.dirname(os.path.abspath(args.vectors_file))
+        serve_shard(os.path.join(directory, manifest["shards"][args.shard]["file"]), (args.host, args.port), authkey)
+
+    elif args.command == "stats":
+        store = ShardedVectorStore(args.vectors_file)
+        try:
+            print(json.dumps(store.get_stats(), indent=2, default=_json_default))
+        finally:
+            store.close()
@@ -0,0 +1,130 @@
+"""
+Single-flight coalescing of identical concurrent calls
+
+When many callers ask for the same key at once (everyone asking the bot about the same
+announcement), only the first one - the leader - runs the work. The others wait for the
+leader's result (or exception) instead of each making their own OpenAI calls.
+`coalesced` counts the calls saved this way.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+
+
+class _Call:
+    """One in-flight computation and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+    def wait(self) -> Any:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key across threads"""
+
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable) -> Tuple[_Call, bool]:
+        """Attach to the in-flight call for key, or start one; returns (call, is_leader)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.coalesced += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.executed += 1
+            return call, True
+
+    def complete(self, key: Hashable, call: _Call, result: Any = None, error: BaseException = None):
+        """Publish the leader's outcome to every follower"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers with the same key"""
+        call, leader = self.join(key)
+        if not leader:
+            return call.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.complete(key, call, error=e if isinstance(e, Exception) else RuntimeError("Leader call was interrupted"))
+            raise
+        self.complete(key, call, result=result)
+        return result
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total = self.executed + self.coalesced
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0,
+            }
+
+
+class _AsyncCall:
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+    async def wait(self) -> Any:
+        # shield: a follower giving up must not cancel the leader's result for the others
+        return await asyncio.shield(self.future)
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines running on one event loop"""
+
+    def join(self, key: Hashable) -> Tuple[_AsyncCall, bool]:
+        call = self._calls.get(key)
+        if call is not None:
+            call.followers += 1
+            self.coalesced += 1
+            return call, False
+        call = self._calls[key] = _AsyncCall()
+        self.executed += 1
+        return call, True
+
+    def complete(self, key: Hashable, call: _AsyncCall, result: Any = None, error: BaseException = None):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if call.future.done():
+            return
+        if error is not None:
+            call.future.set_exception(error)
+            # Nobody may be waiting; don't log "exception was never retrieved"
+            call.future.exception()
+        else:
+            call.future.set_result(result)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() once for all concurrent callers with the same key"""
+        call, leader = self.join(key)
+        if not leader:
+            return await call.wait()
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.complete(key, call, error=e if isinstance(e, Exception) else RuntimeError("Leader call was cancelled"))
+            raise
+        self.complete(key, call, result=result)
+        return result
@@ -1,80 +1,31 @@
 import os
 import subprocess
+import time
 from dotenv import load_dotenv
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from vector_search import SimpleVectorStore
-from typing import List
+from slack_streaming import stream_answers_enabled, stream_to_message
+from warmup import warm_up
+import metrics
 
 load_dotenv()
 
 # Initialize Slack app
 app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
 
-# Initialize AI components (lazy loading for better startup time)
-qa_chain = None
+# AI components are loaded lazily (normally by the warm-up) for better startup time
+def get_engine():
+    """The shared answer engine; answer_engine (and LangChain) are only imported here, normally by the warm-up"""
+    from answer_engine import get_engine as load_engine
+    return load_engine()
 
-def get_qa_chain():
-    """Lazy load the QA chain to improve startup time"""
-    global qa_chain
-    if qa_chain is None:
-        print("🔄 Loading AI components...")
+def post(send, text):
+    """Send a Slack message, timed as the slack_post stage"""
+    with metrics.stage("slack_post"):
+        return send(text)
 
-        try:
-            # Check if vector index exists
-            if not os.path.exists("vectors.json"):
-                raise FileNotFoundError("Vector index not found. Please add documents to data/ folder and restart the bot.")
-
-            # Load our custom vector store (no pickle)
-            vs = SimpleVectorStore("vectors.json")
-
-            # Create simple QA function
-            def answer_question(query: str) -> str:
-                # Get relevant documents
-                results = vs.similarity_search(query, k=5)
-
-                if not results:
-                    return "I don't have information to answer that question."
-
-                # Format context from results
-                context = "\n\n".join([f"Document {i+1}:\n{text}" for i, (text, _, _) in enumerate(results)])
-
-                # Create prompt
-                prompt_template = """Use the following context to answer the question. If you cannot answer based on the context, say so.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
-
-                prompt = PromptTemplate(
-                    template=prompt_template,
-                    input_variables=["context", "question"]
-                )
-
-                # Create LLM chain
-                llm = ChatOpenAI(model="gpt-4", temperature=0)
-                chain = LLMChain(llm=llm, prompt=prompt)
-
-                # Get answer
-                response = chain.run(context=context, question=query)
-                return response
-
-            # Store the QA function
-            qa_chain = answer_question
-
-            print("✅ AI components loaded!")
-
-        except Exception as e:
-            print(f"❌ Failed to load AI components: {e}")
-            raise
-
-    return qa_chain
+def question_answered(started):
+    metrics.QUESTION_SECONDS.observe(time.perf_counter() - started, source="slack")
 
 # Message handler for DMs only (not mentions)
 @app.message(".*")
@@ -91,20 +42,30 @@ def handle_message(message, say):
             say("👋 Hi! I'm Primr Assistant. Ask me anything about our company documents!")
             return
 
+        metrics.QUESTIONS.inc(source="slack")
+        started = time.perf_counter()
+
         # Show typing indicator
-        say("🔍 Searching our knowledge base...")
+        placeholder = post(say, "🔍 Searching our knowledge base...")
+
+        if stream_answers_enabled():
+            # Edit the placeholder in place as the answer is generated
+            stream_to_message(app.client, placeholder["channel"], placeholder["ts"], get_engine().stream(user_query))
+            question_answered(started)
+            return
 
         # Get AI response
-        qa = get_qa_chain()
-        answer = qa(user_query)
+        answer = get_engine().answer(user_query)
 
         # Send response
-        say(f"💡 {answer}")
+        post(say, f"💡 {answer}")
+        question_answered(started)
 
     except FileNotFoundError as e:
         say("📁 I don't have any documents to search yet. Please ask an admin to add some company documents!")
     except Exception as e:
         print(f"Error handling message: {e}")
+        metrics.ERRORS.inc(component="slack_bot")
         say("😅 I'm having some technical difficulties. Please try again in a moment!")
 
 # Slash command handler
@@ -117,26 +78,42 @@ def handle_ask_command(ack, respond, command):
         user_query = command['text'].strip()
 
         if not user_query:
-            respond("Please provide a question! Example: `/ask-primr What is our vacation policy?`")
+            respond("Please provide a question! Example: `/ask-primr What is our vacation policy?` "
+                    "(add `in:benefits` to search only matching documents)")
             return
 
+        metrics.QUESTIONS.inc(source="slack")
+        started = time.perf_counter()
+
         # Show immediate response so user knows bot is working
-        respond("🔍 Searching our knowledge base...")
+        post(respond, "🔍 Searching our knowledge base...")
+
+        if stream_answers_enabled():
+            # Post the answer message right away and fill it in as it is generated
+            prefix = f"💡 **Answer to:** {user_query}\n\n"
+            placeholder = post(lambda text: app.client.chat_postMessage(channel=command['channel_id'], text=text),
+                               f"{prefix}🔍 ...")
+            stream_to_message(app.client, placeholder["channel"], placeholder["ts"],
+                              get_engine().stream(user_query), prefix=prefix)
+            question_answered(started)
+            return
 
         # Get AI response
-        qa = get_qa_chain()
-        answer = qa(user_query)
+        answer = get_engine().answer(user_query)
 
         # Send follow-up with the answer
-        app.client.chat_postMessage(
-            channel=command['channel_id'],
-            text=f"💡 **Answer to:** {user_query}\n\n{answer}"
-        )
+        with metrics.stage("slack_post"):
+            app.client.chat_postMessage(
+                channel=command['channel_id'],
+                text=f"💡 **Answer to:** {user_query}\n\n{answer}"
+            )
+        question_answered(started)
 
     except FileNotFoundError as e:
         respond("📁 I don't have any documents to search yet. Please ask an admin to add some company documents!")
     except Exception as e:
         print(f"Error handling slash command: {e}")
+        metrics.ERRORS.inc(component="slack_bot")
         respond("😅 Sorry, I encountered an error. Please try again!")
 
 # App mention handler (when someone @mentions the bot)
@@ -154,19 +131,28 @@ def handle_app_mention(event, say):
             say("👋 Hi! I'm Primr Assistant. Ask me anything about our company documents!")
             return
 
+        metrics.QUESTIONS.inc(source="slack")
+        started = time.perf_counter()
+
         # Show typing indicator
-        say("🔍 Searching our knowledge base...")
+        placeholder = post(say, "🔍 Searching our knowledge base...")
+
+        if stream_answers_enabled():
+            stream_to_message(app.client, placeholder["channel"], placeholder["ts"], get_engine().stream(user_query))
+            question_answered(started)
+            return
 
         # Get AI response
-        qa = get_qa_chain()
-        answer = qa(user_query)
+        answer = get_engine().answer(user_query)
 
-        say(f"💡 {answer}")
+        post(say, f"💡 {answer}")
+        question_answered(started)
 
     except FileNotFoundError as e:
         say("📁 I don't have any documents to search yet. Please ask an admin to add some company documents!")
     except Exception as e:
         print(f"Error handling mention: {e}")
+        metrics.ERRORS.inc(component="slack_bot")
         say("😅 I'm having some technical difficulties. Please try again in a moment!")
 
 # Health check command
@@ -176,11 +162,8 @@ def handle_status_command(ack, respond):
     ack()
 
     try:
-        # Check if AI components are loaded
-        if qa_chain is None:
-            respond("🟡 Bot is running but AI components not loaded yet. Send a message to initialize!")
-        else:
-            respond("🟢 Bot is running and ready to answer questions!")
+        # Warm-up progress, or whether a question has already loaded the AI components
+        respond(warm_up.describe())
 
     except Exception as e:
         respond(f"🔴 Bot error: {e}")
@@ -223,6 +206,14 @@ if __name__ == "__main__":
             print("❌ No documents found in data/ folder. Please add some .md files and try again")
             exit(1)
 
+    metrics_port = os.environ.get("METRICS_PORT")
+    if metrics_port:
+        metrics.start_http_server(int(metrics_port))
+        print(f"📈 Metrics at http://localhost:{metrics_port}/metrics")
+
+    # Load the index and clients while Socket Mode connects, not on the first question
+    warm_up.start()
+
     print("✅ All systems ready!")
     print("🤖 Bot will respond to:")
     print("   • Direct messages")
@@ -0,0 +1,240 @@
+"""
+Stream LLM answers into Slack by editing a placeholder message
+
+The placeholder ("🔍 Searching our knowledge base...") is rewritten with chat_update as
+tokens arrive, at most once every SLACK_STREAM_INTERVAL seconds per message. Slack's
+chat.update limit (~50/minute) is per workspace, though, and the bot streams several
+answers at once, so every edit also takes a token from one process-wide bucket
+(SLACK_UPDATES_PER_MINUTE). Interim edits are skipped when the bucket is empty or Slack
+answers "ratelimited", and all streams pause for its Retry-After. The final text always
+lands in place.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncIterator, Iterator, Optional
+from slack_sdk.errors import SlackApiError
+import metrics
+
+DEFAULT_STREAM_INTERVAL = 1.0
+DEFAULT_UPDATES_PER_MINUTE = 50
+# Edits that can go out back to back before the per-minute rate applies
+DEFAULT_UPDATE_BURST = 5
+CURSOR = " ▌"
+# Shown if the model streamed nothing at all
+EMPTY_ANSWER = "I don't have information to answer that question."
+
+
+def stream_answers_enabled() -> bool:
+    """True if SLACK_STREAM_ANSWERS asks for streamed answers"""
+    return os.environ.get("SLACK_STREAM_ANSWERS", "").lower() in ("1", "true", "yes")
+
+
+def _retry_after(error: SlackApiError) -> Optional[float]:
+    """Seconds Slack asked us to back off for, if the error was a rate limit"""
+    response = error.response
+    error_code = response.get("error") if hasattr(response, "get") else None
+    if getattr(response, "status_code", None) != 429 and error_code != "ratelimited":
+        return None
+    try:
+        return float((getattr(response, "headers", None) or {}).get("Retry-After", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class UpdateLimiter:
+    """Token bucket for chat_update calls, shared by every stream in the process (one workspace)"""
+
+    def __init__(self, per_minute: float = DEFAULT_UPDATES_PER_MINUTE, burst: int = DEFAULT_UPDATE_BURST):
+        self.rate = per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "UpdateLimiter":
+        """Build from SLACK_UPDATES_PER_MINUTE and SLACK_UPDATE_BURST"""
+        return cls(
+            per_minute=float(os.environ.get("SLACK_UPDATES_PER_MINUTE", DEFAULT_UPDATES_PER_MINUTE)),
+            burst=int(os.environ.get("SLACK_UPDATE_BURST", DEFAULT_UPDATE_BURST)),
+        )
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def try_acquire(self) -> bool:
+        """Take a token for an interim edit if one is free right now"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until or self.tokens < 1:
+                self.skipped += 1
+                return False
+            self.tokens -= 1
+            return True
+
+    def reserve(self) -> float:
+        """Take a token for an edit that must happen; returns the seconds to wait before sending it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, delay: float):
+        """Slack said to back off: no stream edits anything for delay seconds"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+
+# Slack's limit is per workspace, so every message streamed by this process shares one bucket
+update_limiter = UpdateLimiter.from_env()
+
+
+class _StreamState:
+    """Accumulated text and update throttling shared by the sync and async streamers"""
+
+    def __init__(self, prefix: str, min_interval: Optional[float], limiter: Optional[UpdateLimiter] = None):
+        self.prefix = prefix
+        self.min_interval = min_interval if min_interval is not None else float(
+            os.environ.get("SLACK_STREAM_INTERVAL", DEFAULT_STREAM_INTERVAL)
+        )
+        self.limiter = limiter if limiter is not None else update_limiter
+        self.parts = []
+        self.shown = None
+        self.next_update = 0.0
+        self.updates = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def due(self) -> bool:
+        return time.monotonic() >= self.next_update and self.text.strip() != ""
+
+    def render(self, final: bool) -> str:
+        return f"{self.prefix}{self.text}" + ("" if final else CURSOR)
+
+    def sent(self, text: str):
+        self.shown = text
+        self.updates += 1
+        self.next_update = time.monotonic() + self.min_interval
+
+    def rate_limited(self, delay: float):
+        self.next_update = time.monotonic() + delay
+        self.limiter.pause(delay)
+
+    def admit(self, final: bool) -> Optional[float]:
+        """None to skip this interim edit, else the seconds to wait before sending it"""
+        if final:
+            return self.limiter.reserve()
+        return 0.0 if self.limiter.try_acquire() else None
+
+
+class SlackMessageStreamer:
+    """Progressively edits one Slack message with streamed text"""
+
+    def __init__(self, client, channel: str, ts: str, prefix: str = "💡 ", min_interval: float = None,
+                 limiter: UpdateLimiter = None):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.state = _StreamState(prefix, min_interval, limiter)
+
+    def append(self, text: str):
+        self.state.parts.append(text)
+        if self.state.due():
+            self._update(final=False)
+
+    def finish(self, fallback: str = "") -> str:
+        """Write the complete answer in place and return it"""
+        if not self.state.text.strip():
+            self.state.parts = [fallback]
+        self._update(final=True)
+        return self.state.text
+
+    def _update(self, final: bool):
+        text = self.state.render(final)
+        if text == self.state.shown:
+            return
+        wait = self.state.admit(final)
+        if wait is None:
+            return
+        if wait:
+            time.sleep(wait)
+        while True:
+            try:
+                with metrics.stage("slack_post"):
+                    self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+                self.state.sent(text)
+                return
+            except SlackApiError as e:
+                delay = _retry_after(e)
+                if delay is None:
+                    raise
+                self.state.rate_limited(delay)
+                # Intermediate updates are simply skipped; the final one must land
+                if not final:
+                    return
+                time.sleep(delay)
+
+
+class AsyncSlackMessageStreamer(SlackMessageStreamer):
+    """SlackMessageStreamer for slack_bolt's AsyncWebClient"""
+
+    async def append(self, text: str):
+        self.state.parts.append(text)
+        if self.state.due():
+            await self._update(final=False)
+
+    async def finish(self, fallback: str = "") -> str:
+        if not self.state.text.strip():
+            self.state.parts = [fallback]
+        await self._update(final=True)
+        return self.state.text
+
+    async def _update(self, final: bool):
+        text = self.state.render(final)
+        if text == self.state.shown:
+            return
+        wait = self.state.admit(final)
+        if wait is None:
+            return
+        if wait:
+            await asyncio.sleep(wait)
+        while True:
+            try:
+                with metrics.stage("slack_post"):
+                    await self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+                self.state.sent(text)
+                return
+            except SlackApiError as e:
+                delay = _retry_after(e)
+                if delay is None:
+                    raise
+                self.state.rate_limited(delay)
+                if not final:
+                    return
+                await asyncio.sleep(delay)
+
+
+def stream_to_message(client, channel: str, ts: str, chunks: Iterator[str], prefix: str = "💡 ") -> str:
+    """Stream chunks into an existing message; returns the full answer"""
+    streamer = SlackMessageStreamer(client, channel, ts, prefix)
+    for chunk in chunks:
+        streamer.append(chunk)
+    return streamer.finish(fallback=EMPTY_ANSWER)
+
+
+async def astream_to_message(client, channel: str, ts: str, chunks: AsyncIterator[str], prefix: str = "💡 ") -> str:
+    """Async stream_to_message"""
+    streamer = AsyncSlackMessageStreamer(client, channel, ts, prefix)
+    async for chunk in chunks:
+        await streamer.append(chunk)
+    return await streamer.finish(fallback=EMPTY_ANSWER)
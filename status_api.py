@@ -3,12 +3,17 @@ Simple status API for the Slack bot
 Provides health checks and query interface for the admin UI
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import json
 import os
+import sys
+import threading
 from datetime import datetime
 import logging
+import metrics
+from vector_format import read_index
+from warmup import warm_up
 
 app = Flask(__name__)
 CORS(app)
@@ -17,37 +22,158 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@app.route('/status', methods=['GET'])
-def get_status():
+# Most questions accepted by one /query/batch request
+MAX_BATCH_QUERIES = int(os.environ.get('BATCH_MAX_QUERIES', 500))
+
+def _file_signature(path):
+    """(mtime, size) of a file, or None if it doesn't exist; changes whenever the file is replaced"""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def _loaded_engine():
+    """The answer engine if /query has already loaded it in this process (never loads it)"""
+    engine_module = sys.modules.get('answer_engine')
+    if engine_module is not None and engine_module.is_loaded():
+        return engine_module.get_engine()
+    return None
+
+
+class StatusSnapshot:
     """
-    Returns the current status of the bot
+    Index status kept in memory and rebuilt only when vectors.json, index_info.json or
+    chunks.json change (by mtime/size), so a health check costs a few stat() calls
+    however large the corpus is. While one request rebuilds it, others get the
+    previous snapshot instead of waiting.
     """
-    try:
-        # Check if required files exist
-        chunks_exist = os.path.exists('chunks.json')
-        vectors_exist = os.path.exists('vectors.json')
 
-        # Check if we can load the data
-        chunks_loaded = False
-        vector_count = 0
+    def __init__(self, vectors_file='vectors.json', info_file='index_info.json', chunks_file='chunks.json'):
+        self.files = (vectors_file, info_file, chunks_file)
+        self.vectors_file, self.info_file, self.chunks_file = self.files
+        self.rebuilds = 0
+        self._signature = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        signature = tuple(_file_signature(path) for path in self.files)
+        if signature == self._signature:
+            return self._snapshot
+
+        if not self._lock.acquire(blocking=self._snapshot is None):
+            return self._snapshot
+        try:
+            if signature != self._signature:
+                self._snapshot = self._build(signature)
+                self._signature = signature
+                self.rebuilds += 1
+            return self._snapshot
+        finally:
+            self._lock.release()
 
-        if chunks_exist:
+    def _build(self, signature):
+        vectors_sig, info_sig, chunks_sig = signature
+        snapshot = {
+            'vectors_exist': vectors_sig is not None,
+            'chunks_exist': chunks_sig is not None,
+            'index': {'status': 'not_found'},
+            'index_info': {},
+            'checked_at': datetime.now().isoformat(),
+        }
+
+        if info_sig is not None:
+            try:
+                with open(self.info_file, 'r') as f:
+                    info = json.load(f)
+                snapshot['index_info'] = {
+                    key: info.get(key)
+                    for key in ('index_version', 'last_updated', 'total_files', 'total_chunks')
+                }
+            except Exception as e:
+                logger.error(f"Error reading {self.info_file}: {e}")
+
+        if vectors_sig is not None:
             try:
-                with open('chunks.json', 'r') as f:
-                    chunks = json.load(f)
-                    chunks_loaded = True
-                    vector_count = len(chunks)
+                # Header and memory-mapped matrix only: validates the index without reading its records
+                header, matrix = read_index(self.vectors_file, load_records=False)
+                snapshot['index'] = {
+                    'status': 'loaded' if matrix is not None else 'empty',
+                    'total_vectors': 0 if matrix is None else int(matrix.shape[0]),
+                    'embedding_model': header.get('embedding_model', 'unknown'),
+                    'dimensions': header.get('dimensions', 0),
+                    'created_at': header.get('created_at', 'unknown'),
+                    'format_version': header.get('format_version', 1),
+                }
             except Exception as e:
-                logger.error(f"Error loading chunks: {e}")
+                logger.error(f"Error reading {self.vectors_file}: {e}")
+                snapshot['index'] = {'status': 'error', 'error': str(e)}
+
+        return snapshot
+
 
+status_snapshot = StatusSnapshot()
+
+
+def current_status():
+    """The cached on-disk status plus, once loaded, live stats from the serving vector store"""
+    status = dict(status_snapshot.get())
+    engine = _loaded_engine()
+    if engine is not None:
+        # SimpleVectorStore.get_stats() of the index actually answering queries
+        status['index'] = engine.get_stats()
+    status['warm_up'] = warm_up.get_stats()
+    index_ready = status['index'].get('status') == 'loaded' and status['index'].get('total_vectors', 0) > 0
+    # Once a warm-up has started, traffic should wait for it rather than pay for it. A failed
+    # warm-up does not block readiness: the first /query retries loading (the error stays in /status)
+    status['ready'] = index_ready and (warm_up.state in ('pending', 'failed') or warm_up.ready)
+    return status
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness: the process is up and serving requests
+    """
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: a valid, non-empty index is available to answer queries and any startup
+    warm-up has finished
+    """
+    status = current_status()
+    return jsonify({
+        'ready': status['ready'],
+        'index_status': status['index'].get('status'),
+        'index_version': status['index_info'].get('index_version'),
+        'warm_up': status['warm_up']['state'],
+    }), 200 if status['ready'] else 503
+
+
+@app.route('/status', methods=['GET'])
+def get_status():
+    """
+    Returns the current status of the bot
+    """
+    try:
+        status = current_status()
         return jsonify({
             'status': 'ok',
             'timestamp': datetime.now().isoformat(),
-            'chunks_exist': chunks_exist,
-            'vectors_exist': vectors_exist,
-            'chunks_loaded': chunks_loaded,
-            'vector_count': vector_count,
-            'ready': chunks_loaded and vectors_exist
+            'chunks_exist': status['chunks_exist'],
+            'vectors_exist': status['vectors_exist'],
+            'chunks_loaded': status['index'].get('status') == 'loaded',
+            'vector_count': status['index'].get('total_vectors', 0),
+            'ready': status['ready'],
+            'index': status['index'],
+            'index_info': status['index_info'],
+            'warm_up': status['warm_up'],
+            'checked_at': status['checked_at'],
         })
 
     except Exception as e:
@@ -70,12 +196,14 @@ def handle_query():
         if not query:
             return jsonify({'error': 'Query is required'}), 400
 
-        # Import here to avoid circular imports
-        from query import answer_question
+        # Import here so the status endpoint works without the AI stack loaded
+        from answer_engine import answer_question
 
+        metrics.QUESTIONS.inc(source="api")
         start_time = datetime.now()
         answer = answer_question(query)
         end_time = datetime.now()
+        metrics.QUESTION_SECONDS.observe((end_time - start_time).total_seconds(), source="api")
 
         response_time = (end_time - start_time).total_seconds() * 1000  # ms
 
@@ -88,10 +216,69 @@ def handle_query():
 
     except Exception as e:
         logger.error(f"Query processing error: {e}")
+        metrics.ERRORS.inc(component="status_api")
         return jsonify({
             'error': str(e),
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/query/batch', methods=['POST'])
+def handle_query_batch():
+    """
+    Answers many queries at once, streaming one NDJSON line per query as each completes
+    Body: {"queries": ["...", ...]}; lines carry the query's index in the request
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+        return jsonify({'error': 'queries must be a non-empty list of strings'}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({'error': f'At most {MAX_BATCH_QUERIES} queries per batch'}), 400
+
+    # Import here so the status endpoint works without the AI stack loaded
+    from answer_engine import get_engine
+
+    def generate():
+        start_time = datetime.now()
+        positions = []
+        for i, query in enumerate(queries):
+            if query.strip():
+                positions.append(i)
+            else:
+                yield json.dumps({'index': i, 'query': query, 'error': 'Query is required'}) + '\n'
+
+        metrics.QUESTIONS.inc(len(positions), source="api_batch")
+        try:
+            for position, answer, error in get_engine().answer_batch([queries[i].strip() for i in positions]):
+                i = positions[position]
+                line = {
+                    'index': i,
+                    'query': queries[i],
+                    'response_time': (datetime.now() - start_time).total_seconds() * 1000,  # ms since the batch started
+                }
+                if error is None:
+                    line['answer'] = answer
+                else:
+                    logger.error(f"Batch query processing error: {error}")
+                    metrics.ERRORS.inc(component="status_api")
+                    line['error'] = str(error)
+                yield json.dumps(line) + '\n'
+        except Exception as e:
+            logger.error(f"Batch query processing error: {e}")
+            metrics.ERRORS.inc(component="status_api")
+            yield json.dumps({'error': str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, question/cache/error counters
+    """
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
+    # The debug reloader runs this file twice; only the serving child should load the engine
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_up.start()
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,68 @@
+"""
+Semantic answer cache: paraphrase hits, scope isolation, expiry and invalidation when
+the index changes
+"""
+import numpy as np
+import pytest
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+
+def unit(*values) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_paraphrase_hits_and_unrelated_misses():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.put(unit(1, 0, 0), "how many PTO days?", "25 days", "v1")
+    assert cache.get(unit(1, 0.05, 0), "v1") == ("how many PTO days?", "25 days", pytest.approx(0.9988, abs=1e-3))
+    assert cache.get(unit(0, 1, 0), "v1") is None
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_new_index_version_drops_every_answer():
+    cache = SemanticAnswerCache()
+    cache.put(unit(1, 0), "q", "old answer", "v1")
+    assert cache.get(unit(1, 0), "v2") is None
+    stats = cache.get_stats()
+    assert stats["size"] == 0
+    assert stats["invalidations"] == 1
+    # ...and answers for the new index are cached as usual
+    cache.put(unit(1, 0), "q", "new answer", "v2")
+    assert cache.get(unit(1, 0), "v2")[1] == "new answer"
+
+
+def test_scoped_answers_stay_in_their_scope():
+    cache = SemanticAnswerCache()
+    cache.put(unit(1, 0), "leave?", "16 weeks", "v1", scope="tag:benefits")
+    assert cache.get(unit(1, 0), "v1") is None
+    assert cache.get(unit(1, 0), "v1", scope="tag:it") is None
+    assert cache.get(unit(1, 0), "v1", scope="tag:benefits")[1] == "16 weeks"
+
+
+def test_expired_near_duplicate_does_not_hide_a_live_entry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(ttl=60, threshold=0.9)
+    cache.put(unit(1, 0, 0), "exact match, old", "stale", "v1")
+    now[0] += 50
+    cache.put(unit(1, 0.2, 0), "close match, fresh", "fresh", "v1")
+    now[0] += 20
+
+    # The first entry is the better match but has expired; the second is still above the threshold
+    hit = cache.get(unit(1, 0, 0), "v1")
+    assert hit is not None and hit[1] == "fresh"
+    assert cache.get_stats()["size"] == 1
+
+
+def test_full_cache_evicts_least_recently_used():
+    cache = SemanticAnswerCache(max_size=2)
+    cache.put(unit(1, 0, 0), "a", "A", "v1")
+    cache.put(unit(0, 1, 0), "b", "B", "v1")
+    assert cache.get(unit(1, 0, 0), "v1")[1] == "A"
+    cache.put(unit(0, 0, 1), "c", "C", "v1")
+    assert cache.get(unit(0, 1, 0), "v1") is None
+    assert cache.get(unit(1, 0, 0), "v1")[1] == "A"
+    assert cache.get_stats()["evictions"] == 1
+
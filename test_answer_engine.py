@@ -0,0 +1,72 @@
+"""
+AnswerEngine: the sync, async and streaming paths share one retrieval step, so they see
+the same context and the same cached answers
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+
+class FakeLLM:
+    """Stands in for the chain and the chat model; records the context of every call"""
+
+    def __init__(self):
+        self.contexts = []
+
+    def run(self, context, question):
+        self.contexts.append(context)
+        return f"{context.count('Document ')} documents about {question}"
+
+    async def arun(self, context, question):
+        return self.run(context, question)
+
+    def stream(self, prompt):
+        context, question = prompt.split("Context:\n", 1)[1].split("\n\nQuestion: ", 1)
+        for part in self.run(context.strip(), question.split("\n", 1)[0]).split(" "):
+            yield SimpleNamespace(content=part + " ")
+
+    async def astream(self, prompt):
+        for chunk in self.stream(prompt):
+            yield chunk
+
+
+@pytest.fixture
+def engine(index, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from answer_engine import AnswerEngine
+
+    engine = AnswerEngine(hot_reload=False)
+    engine.llm = engine.chain = FakeLLM()
+    yield engine
+    engine.close()
+
+
+def collect(stream) -> str:
+    return "".join(stream).strip()
+
+
+def test_every_path_builds_the_same_context(engine):
+    from answer_cache import SemanticAnswerCache
+
+    # Every path must call the LLM, not reuse the answer of the previous one
+    engine.answer_cache = SemanticAnswerCache(max_size=0)
+    question = "how do I set up the vpn client"
+
+    async def run_async():
+        return await engine.aanswer(question), "".join([chunk async for chunk in engine.astream(question)]).strip()
+
+    answers = [engine.answer(question), collect(engine.stream(question)), *asyncio.run(run_async())]
+    assert len(set(answers)) == 1
+    assert len(engine.llm.contexts) == 4 and len(set(engine.llm.contexts)) == 1
+
+
+def test_cached_answer_skips_the_llm_on_every_path(engine):
+    question = "who approves expenses over 500 dollars"
+    first = engine.answer(question)
+    calls = len(engine.llm.contexts)
+
+    async def run_async():
+        return await engine.aanswer(question), "".join([chunk async for chunk in engine.astream(question)])
+
+    assert [collect(engine.stream(question)), *asyncio.run(run_async())] == [first] * 3
+    assert len(engine.llm.contexts) == calls
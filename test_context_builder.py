@@ -0,0 +1,45 @@
+"""
+Context assembly: the built context, headers and separators included, never exceeds the
+token budget, even when the last passage has to be cut
+"""
+import random
+import pytest
+from context_builder import ContextBuilder
+
+
+class ByteEncoding:
+    """Byte-level stand-in for tiktoken: decoding a cut multi-byte character gives U+FFFD, as tiktoken does"""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="replace")
+
+
+def random_results(rng: random.Random, words):
+    return [(" ".join(rng.choice(words) for _ in range(rng.randint(5, 120))), {"source": f"doc{i}.md"}, rng.random())
+            for i in range(5)]
+
+
+@pytest.mark.parametrize("encoding, words", [
+    (False, ["alpha", "be", "c", "delta"]),
+    (ByteEncoding(), ["café", "naïve", "über", "日本語", "a"]),
+])
+def test_context_fits_the_budget(encoding, words):
+    rng = random.Random(0)
+    builder = ContextBuilder(token_budget=100)
+    builder._encoding = encoding
+    for _ in range(300):
+        builder.token_budget = rng.randint(80, 600)
+        context = builder.build(random_results(rng, words))
+        assert context and builder.count_tokens(context) <= builder.token_budget
+
+
+def test_everything_fits_without_truncation():
+    builder = ContextBuilder(token_budget=1000)
+    builder._encoding = ByteEncoding()
+    results = [("Parental leave is sixteen weeks.", {"source": "a.md"}, 0.9),
+               ("Expenses over 500 dollars need finance approval.", {"source": "b.md"}, 0.5)]
+    assert builder.build(results) == ("Document 1:\nParental leave is sixteen weeks.\n\n"
+                                      "Document 2:\nExpenses over 500 dollars need finance approval.")
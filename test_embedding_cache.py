@@ -0,0 +1,46 @@
+"""
+Query embedding cache: the SQLite tier is bounded by the same size and TTL as the LRU
+"""
+import sqlite3
+import numpy as np
+import embedding_cache
+from embedding_cache import QueryEmbeddingCache
+
+
+def disk_rows(path) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+def test_disk_tier_keeps_only_the_newest_rows(tmp_path):
+    path = str(tmp_path / "queries.db")
+    cache = QueryEmbeddingCache(max_size=3, persist_path=path)
+    for i in range(10):
+        cache.put("model", f"question {i}", np.full(4, i, dtype=np.float32))
+    assert disk_rows(path) == 3
+
+    # A restarted process still finds the newest rows on disk
+    restarted = QueryEmbeddingCache(max_size=3, persist_path=path)
+    assert restarted.get("model", "question 9")[0] == 9
+    assert restarted.get("model", "question 0") is None
+
+
+def test_disk_tier_drops_expired_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "queries.db")
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    cache = QueryEmbeddingCache(max_size=100, ttl=60, persist_path=path)
+    cache.put("model", "old question", np.ones(4, dtype=np.float32))
+    now[0] += 120
+    cache.put("model", "new question", np.ones(4, dtype=np.float32))
+    assert disk_rows(path) == 1
+    assert cache.get("model", "old question") is None
+
+
+def test_smaller_size_prunes_an_existing_file_on_open(tmp_path):
+    path = str(tmp_path / "queries.db")
+    cache = QueryEmbeddingCache(max_size=10, persist_path=path)
+    for i in range(10):
+        cache.put("model", f"question {i}", np.zeros(4, dtype=np.float32))
+    QueryEmbeddingCache(max_size=2, persist_path=path)
+    assert disk_rows(path) == 2
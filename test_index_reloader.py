@@ -0,0 +1,64 @@
+"""
+Hot reload: a newly published index is swapped in, and a version that fails to load is
+not reloaded on every poll
+"""
+import json
+import pytest
+from index_reloader import ReloadingVectorStore
+
+
+class FakeStore:
+    def __init__(self, ready: bool):
+        self.is_ready = ready
+        self.query_cache = None
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def publish(version: str):
+    with open("index_info.json", "w", encoding="utf-8") as f:
+        json.dump({"index_version": version}, f)
+
+
+def test_failed_version_is_not_retried_until_a_new_one_is_published(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    publish("v1")
+    loads = []
+
+    def factory(path):
+        loads.append(path)
+        # v2 is broken, everything else loads
+        return FakeStore(ready=len(loads) != 2)
+
+    reloader = ReloadingVectorStore(poll_interval=0, store_factory=factory)
+    publish("v2")
+    assert not reloader.check()
+    assert not reloader.check()
+    assert len(loads) == 2
+    assert reloader.failed_version == "v2"
+    assert reloader.version == "v1"
+
+    publish("v3")
+    assert reloader.check()
+    assert (reloader.version, reloader.failed_version, len(loads)) == ("v3", None, 3)
+
+
+def test_factory_error_marks_the_version_failed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    publish("v1")
+    calls = []
+
+    def factory(path):
+        calls.append(path)
+        if len(calls) > 1:
+            raise MemoryError("cannot map index")
+        return FakeStore(ready=True)
+
+    reloader = ReloadingVectorStore(poll_interval=0, store_factory=factory)
+    publish("v2")
+    with pytest.raises(MemoryError):
+        reloader.check()
+    assert not reloader.check()
+    assert len(calls) == 2 and reloader.failed_version == "v2"
@@ -0,0 +1,147 @@
+"""
+Incremental ingestion: unchanged chunks reuse their embeddings, deleted files drop their
+vectors, and a run that fails part-way resumes from the embedding checkpoint
+"""
+import json
+import os
+import numpy as np
+import pytest
+import enhanced_ingest
+from ann_index import IVFIndex, ann_path
+from bm25_index import BM25Index, bm25_path
+from embedding_providers import LocalHashingEmbeddings
+from metadata_filter import FilterIndex, filter_path
+from vector_format import iter_records, read_index
+
+
+def index_info() -> dict:
+    with open("index_info.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def rows_by_text() -> dict:
+    header, matrix = read_index("vectors.json", load_records=False)
+    return {text: (metadata, np.array(matrix[row])) for row, (text, metadata) in
+            enumerate(iter_records("vectors.json", header))}
+
+
+class CountingEmbeddings(LocalHashingEmbeddings):
+    """Local embeddings that count the texts they embed and can fail after some requests"""
+
+    def __init__(self, fail_after: int = None):
+        super().__init__()
+        self.embedded = 0
+        self.requests = 0
+        self.fail_after = fail_after
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and self.requests >= self.fail_after:
+            raise ValueError("embeddings API is down")
+        self.requests += 1
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_first_run_embeds_every_chunk(index):
+    info = index_info()
+    assert info["vector_index_created"]
+    assert info["total_chunks"] == info["embeddings_created"] > 4
+    assert info["embeddings_reused"] == 0
+    assert os.path.exists("ingest_manifest.json")
+    assert not os.path.exists(enhanced_ingest.CHECKPOINT_FILE)
+
+
+def test_rerun_without_changes_embeds_nothing(index):
+    before = index_info()
+    enhanced_ingest.main()
+    after = index_info()
+    assert after["embeddings_created"] == 0
+    assert after["index_version"] == before["index_version"]
+    assert after["total_chunks"] == before["total_chunks"]
+
+
+def test_changed_file_only_embeds_new_chunks(index):
+    before = rows_by_text()
+    with open("data/faq.txt", "a", encoding="utf-8") as f:
+        f.write("\n\nThe office closes early on the Friday before every public holiday.")
+
+    enhanced_ingest.main()
+    info = index_info()
+    after = rows_by_text()
+    assert 0 < info["embeddings_created"] < info["total_chunks"]
+    assert info["embeddings_reused"] + info["embeddings_created"] == info["total_chunks"]
+    assert any("closes early" in text for text in after)
+    # Reused rows carry exactly the vectors they had before
+    for text, (metadata, vector) in after.items():
+        if text in before:
+            np.testing.assert_array_equal(vector, before[text][1])
+            assert metadata["content_hash"] == before[text][0]["content_hash"]
+
+
+def test_deleted_file_drops_its_vectors(index):
+    total = index_info()["total_chunks"]
+    os.remove("data/it/vpn-setup.md")
+
+    enhanced_ingest.main()
+    info = index_info()
+    header, matrix = read_index("vectors.json", load_records=False)
+    sources = {metadata["source"] for _, metadata in iter_records("vectors.json", header)}
+    assert info["files_deleted"] == 1
+    assert info["embeddings_created"] == 0
+    assert "data/it/vpn-setup.md" not in sources
+    assert matrix.shape[0] == info["total_chunks"] < total
+
+    with open("ingest_manifest.json", "r", encoding="utf-8") as f:
+        assert "data/it/vpn-setup.md" not in json.load(f)["files"]
+    # Derived indexes are rebuilt for the new rows too
+    bm25 = BM25Index.load(bm25_path("vectors.json"))
+    assert bm25.matches(header, matrix.shape[0])
+    assert len(bm25.search("wireguard", 5)[0]) == 0
+    filters = FilterIndex.load(filter_path("vectors.json"))
+    assert filters.matches(header, matrix.shape[0])
+    assert "data/it/vpn-setup.md" not in filters.sources.tolist()
+
+
+def test_failed_run_resumes_from_checkpoint(workdir, monkeypatch):
+    monkeypatch.setenv("EMBED_BATCH_SIZE", "2")
+    monkeypatch.setenv("EMBED_CONCURRENCY", "1")
+    monkeypatch.setenv("EMBED_MAX_RETRIES", "0")
+
+    failing = CountingEmbeddings(fail_after=2)
+    monkeypatch.setattr(enhanced_ingest, "get_embeddings", lambda: failing)
+    enhanced_ingest.main()
+    assert not index_info()["vector_index_created"]
+    assert not os.path.exists("vectors.json")
+    assert os.path.exists(enhanced_ingest.CHECKPOINT_FILE)
+    assert failing.embedded == 4
+
+    working = CountingEmbeddings()
+    monkeypatch.setattr(enhanced_ingest, "get_embeddings", lambda: working)
+    enhanced_ingest.main()
+    info = index_info()
+    assert info["vector_index_created"]
+    # The 4 checkpointed chunks are not sent again, and the checkpoint is gone once published
+    assert working.embedded == info["total_chunks"] - 4
+    assert not os.path.exists(enhanced_ingest.CHECKPOINT_FILE)
+
+
+@pytest.mark.parametrize("window", ["1", "3"])
+def test_window_size_does_not_change_the_index(workdir, monkeypatch, window):
+    enhanced_ingest.main()
+    expected = rows_by_text()
+
+    monkeypatch.setenv("INGEST_WINDOW", window)
+    enhanced_ingest.main(full_rebuild=True)
+    actual = rows_by_text()
+    assert list(actual) == list(expected)
+    for text, (_, vector) in actual.items():
+        np.testing.assert_allclose(vector, expected[text][1], atol=1e-6)
+
+
+def test_rerun_builds_a_missing_ann_index(index, monkeypatch):
+    assert not os.path.exists(ann_path("vectors.json"))
+    monkeypatch.setenv("ANN_MIN_VECTORS", "2")
+    enhanced_ingest.main()
+    assert index_info()["embeddings_created"] == 0
+    header, matrix = read_index("vectors.json", load_records=False)
+    assert IVFIndex.load(ann_path("vectors.json")).matches(header, matrix)
@@ -0,0 +1,87 @@
+"""
+in: scopes: parsing questions, resolving filters to row ranges, and replying when a
+scope matches no documents
+"""
+import numpy as np
+import pytest
+from metadata_filter import FilterBuilder, SearchFilter, parse_scope, source_tags
+from vector_search import SimpleVectorStore
+
+SOURCES = ["data/hr/health-benefits.md", "data/hr/health-benefits.md", "data/hr/expenses.md",
+           "data/it/vpn-setup.md", "data/it/vpn-setup.md", "data/faq.txt", "data/hr/health-benefits.md"]
+
+
+def filter_index():
+    builder = FilterBuilder()
+    builder.add({"source": source} for source in SOURCES)
+    return builder.build()
+
+
+def test_source_tags_are_folders_and_file_name_words():
+    assert source_tags("data/hr/health-benefits.md") == {"hr", "health-benefits", "health", "benefits"}
+
+
+@pytest.mark.parametrize("query, question, search_filter", [
+    ("how much parental leave?", "how much parental leave?", None),
+    ("in:benefits how much parental leave?", "how much parental leave?", SearchFilter(tags=["benefits"])),
+    ("who approves expenses in:HR in:faq*.txt", "who approves expenses",
+     SearchFilter(globs=["faq*.txt"], tags=["hr"])),
+    ("in:data/it how do I connect?", "how do I connect?",
+     SearchFilter(globs=["data/it", "data/it/*", "*/data/it", "*/data/it/*"])),
+    ("in:benefits", "benefits", SearchFilter(tags=["benefits"])),
+    ("is it in:, or not", "is it or not", None),
+])
+def test_parse_scope(query, question, search_filter):
+    assert parse_scope(query) == (question, search_filter)
+
+
+def test_resolve_merges_each_sources_rows():
+    index = filter_index()
+    np.testing.assert_array_equal(index.resolve(SearchFilter(tags=["hr"])), [[0, 3], [6, 7]])
+    np.testing.assert_array_equal(index.resolve(SearchFilter(globs=["data/it/*"], tags=["faq"])), [[3, 6]])
+    np.testing.assert_array_equal(index.resolve(SearchFilter(sources=["data/hr/expenses.md"])), [[2, 3]])
+    assert index.resolve(SearchFilter(tags=["payroll"])).shape == (0, 2)
+
+
+def test_resolve_is_cached_per_filter():
+    index = filter_index()
+    first = index.resolve(SearchFilter(tags=["benefits"]))
+    assert index.resolve(SearchFilter(tags=["benefits"])) is first
+
+
+def test_tags_lists_every_tag_with_chunks():
+    assert filter_index().tags() == ["benefits", "expenses", "faq", "health", "health-benefits", "hr", "it",
+                                     "setup", "vpn", "vpn-setup"]
+
+
+def test_store_suggests_tags_only_for_scopes_that_match_nothing(index):
+    store = SimpleVectorStore("vectors.json")
+    assert store.unmatched_scope_tags(SearchFilter(tags=["benefits"])) is None
+    assert "vpn" in store.unmatched_scope_tags(SearchFilter(tags=["payroll"]))
+    # The scope really does select nothing
+    assert store.similarity_search("payroll dates", 3, SearchFilter(tags=["payroll"])) == []
+
+
+def test_engine_replies_with_tags_when_scope_matches_nothing(index, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from answer_engine import AnswerEngine
+
+    engine = AnswerEngine(hot_reload=False)
+    try:
+        # Answered without an embeddings or LLM call
+        reply = engine.answer("in:payroll when do we get paid?")
+        assert reply.startswith("No documents match that in: scope.")
+        assert "in:benefits" in reply and "in:vpn" in reply
+        assert list(engine.answer_batch(["in:payroll when do we get paid?"])) == [(0, reply, None)]
+        assert "".join(engine.stream("in:payroll when do we get paid?")) == reply
+    finally:
+        engine.close()
+
+
+def test_unmatched_scope_answer_shortens_long_tag_lists():
+    from answer_engine import SCOPE_TAGS_SHOWN, unmatched_scope_answer
+
+    tags = [f"team{i:03d}" for i in range(SCOPE_TAGS_SHOWN + 5)]
+    reply = unmatched_scope_answer(tags)
+    assert f"in:team{SCOPE_TAGS_SHOWN - 1:03d}" in reply and f"in:team{SCOPE_TAGS_SHOWN:03d}" not in reply
+    assert reply.endswith("(and 5 more)")
@@ -0,0 +1,122 @@
+"""
+Sharded search: merged shard results match the in-process index, a failing shard only
+drops its own rows, and a slow shard does not stall the event loop
+"""
+import asyncio
+import time
+import numpy as np
+import pytest
+from embedding_providers import LocalHashingEmbeddings
+from metadata_filter import SearchFilter
+from sharded_index import ShardError, ShardedVectorStore, build_shards
+from vector_search import SimpleVectorStore
+
+QUERIES = [
+    "how many weeks of parental leave do new parents get",
+    "who approves expenses over 500 dollars",
+    "the vpn handshake fails",
+    "when is the all-hands meeting",
+]
+
+
+@pytest.fixture
+def sharded(index, monkeypatch):
+    """(in-process store, ShardedVectorStore over 2 local workers) for the same index"""
+    # Workers never embed text, so they must start without OpenAI credentials
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "openai")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    build_shards("vectors.json", 2)
+    embeddings = LocalHashingEmbeddings()
+    store = ShardedVectorStore("vectors.json", embeddings_model=embeddings, retrieval_mode="hybrid")
+    try:
+        assert store.is_ready
+        yield SimpleVectorStore("vectors.json", embeddings_model=embeddings, retrieval_mode="hybrid"), store
+    finally:
+        store.close()
+
+
+def record_requests(monkeypatch, shard, before=None):
+    """Log every message sent to shard; before(message) runs first and may sleep or raise"""
+    sent, request = [], shard.request
+
+    def logged(message, array=None):
+        sent.append(message)
+        if before is not None:
+            before(message)
+        return request(message, array)
+
+    monkeypatch.setattr(shard, "request", logged)
+    return sent
+
+
+def assert_same_ranking(actual, expected):
+    """Same scores in the same order; rows tied at zero (no shared words) may come in any order"""
+    assert [score for _, _, score in actual] == pytest.approx([score for _, _, score in expected], abs=1e-6)
+    assert [text for text, _, score in actual if score > 0] == [text for text, _, score in expected if score > 0]
+
+
+def test_dense_merge_matches_in_process_search(sharded):
+    local, store = sharded
+    for query in QUERIES:
+        query_vec = local.embed_query(query)
+        assert_same_ranking(store.similarity_search_by_vector(query_vec, 4),
+                            local.similarity_search_by_vector(query_vec, 4))
+
+
+def test_batch_search_matches_in_process_search(sharded):
+    local, store = sharded
+    for actual, expected in zip(store.similarity_search_batch(QUERIES, 3), local.similarity_search_batch(QUERIES, 3)):
+        assert_same_ranking(actual, expected)
+
+
+def test_hybrid_search_asks_shards_for_bm25_once(sharded, monkeypatch):
+    _, store = sharded
+    sent = record_requests(monkeypatch, store.shards[0])
+    assert store.similarity_search("who approves large expenses and receipts", 3)
+    searches = [message for message in sent if message["op"] == "search"]
+    assert [bool(message["k_lexical"]) for message in searches] == [True, False]
+
+
+def test_failed_records_fetch_drops_only_that_shards_rows(sharded, monkeypatch):
+    local, store = sharded
+
+    def fail_records(message):
+        if message["op"] == "records":
+            raise ShardError("shard 1: connection reset")
+
+    record_requests(monkeypatch, store.shards[1], fail_records)
+    results = store.similarity_search_by_vector(local.embed_query(QUERIES[0]), len(local.data["texts"]))
+    # Round-robin: shard 0 holds the even global rows, and only those come back
+    rows = {text: row for row, text in enumerate(local.data["texts"])}
+    assert sorted(rows[text] for text, _, _ in results) == list(range(0, len(rows), 2))
+    assert store.partial_results == 1
+
+
+def test_slow_shard_does_not_block_other_coroutines(sharded, monkeypatch):
+    _, store = sharded
+    record_requests(monkeypatch, store.shards[0], lambda message: time.sleep(0.2))
+
+    async def main():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        results = await store.asimilarity_search(QUERIES[1], 3)
+        task.cancel()
+        return results, np.diff(ticks)
+
+    results, gaps = asyncio.run(main())
+    assert results
+    # Every shard round trip takes 0.2s; the loop kept running throughout
+    assert len(gaps) > 20 and gaps.max() < 0.1
+
+
+def test_scope_that_matches_nothing_lists_every_shards_tags(sharded):
+    local, store = sharded
+    assert store.unmatched_scope_tags(SearchFilter(tags=["vpn"])) is None
+    assert store.unmatched_scope_tags(SearchFilter(tags=["payroll"])) == local.unmatched_scope_tags(
+        SearchFilter(tags=["payroll"]))
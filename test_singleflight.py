@@ -0,0 +1,128 @@
+"""
+Single-flight coalescing: identical concurrent calls share one computation, its result
+and its exception, and nothing is cached once the call completes
+"""
+import asyncio
+import threading
+import time
+import pytest
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def wait_for_followers(flights: SingleFlight, key, followers: int):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        call = flights._calls.get(key)
+        if call is not None and call.followers == followers:
+            return
+        time.sleep(0.001)
+    raise AssertionError(f"{followers} followers never joined")
+
+
+def run_concurrently(flights: SingleFlight, key, fn, callers: int):
+    """Call flights.do(key, fn) from several threads; returns (results, errors)"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_identical_calls_run_once():
+    flights = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def answer():
+        runs.append(1)
+        release.wait(5)
+        return "16 weeks"
+
+    threading.Thread(target=lambda: (wait_for_followers(flights, "leave", 4), release.set())).start()
+    results, errors = run_concurrently(flights, "leave", answer, callers=5)
+    assert (results, errors, len(runs)) == (["16 weeks"] * 5, [], 1)
+    stats = flights.get_stats()
+    assert (stats["executed"], stats["coalesced"], stats["in_flight"]) == (1, 4, 0)
+
+
+def test_different_keys_do_not_coalesce():
+    flights = SingleFlight()
+    assert [flights.do(key, lambda key=key: key.upper()) for key in ("a", "b")] == ["A", "B"]
+    assert flights.get_stats()["coalesced"] == 0
+
+
+def test_leader_error_reaches_every_follower_and_is_not_cached():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("OpenAI is down")
+
+    threading.Thread(target=lambda: (wait_for_followers(flights, "q", 2), release.set())).start()
+    results, errors = run_concurrently(flights, "q", fail, callers=3)
+    assert results == []
+    assert [str(e) for e in errors] == ["OpenAI is down"] * 3
+    # The next call after a failure runs again
+    assert flights.do("q", lambda: "recovered") == "recovered"
+
+
+def test_async_identical_calls_run_once():
+    flights = AsyncSingleFlight()
+    runs = []
+
+    async def answer():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "use WireGuard"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("vpn", answer) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["use WireGuard"] * 5
+    assert len(runs) == 1
+    assert flights.get_stats()["coalesced"] == 4
+
+
+def test_async_cancelled_follower_does_not_cancel_the_leader():
+    flights = AsyncSingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flights.do("q", answer))
+        await asyncio.sleep(0)
+        impatient = asyncio.create_task(flights.do("q", answer))
+        patient = asyncio.create_task(flights.do("q", answer))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await leader, await patient
+
+    assert asyncio.run(main()) == ("done", "done")
+
+
+def test_async_leader_error_reaches_followers():
+    flights = AsyncSingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("q", fail) for _ in range(3)), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(main())] == ["boom"] * 3
+    assert flights.get_stats()["in_flight"] == 0
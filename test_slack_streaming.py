@@ -0,0 +1,106 @@
+"""
+Streaming answers into Slack: concurrent streams share one chat_update budget, and rate
+limits skip interim edits without losing the final answer
+"""
+import asyncio
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.slack_response import SlackResponse
+import slack_streaming
+from slack_streaming import (AsyncSlackMessageStreamer, SlackMessageStreamer, UpdateLimiter, astream_to_message,
+                             stream_to_message)
+
+
+def slack_error(error: str, status: int) -> SlackApiError:
+    response = SlackResponse(client=None, http_verb="POST", api_url="chat.update", req_args={},
+                             data={"ok": False, "error": error}, headers={"Retry-After": "0"}, status_code=status)
+    return SlackApiError(error, response)
+
+
+class FakeClient:
+    def __init__(self, fail_with=None, failures: int = 0):
+        self.updates = []
+        self.fail_with = fail_with
+        self.failures = failures
+
+    def chat_update(self, channel, ts, text):
+        if self.failures:
+            self.failures -= 1
+            raise self.fail_with
+        self.updates.append((ts, text))
+
+
+class AsyncFakeClient(FakeClient):
+    async def chat_update(self, channel, ts, text):
+        FakeClient.chat_update(self, channel, ts, text)
+
+
+def test_streams_share_the_update_budget():
+    limiter = UpdateLimiter(per_minute=60, burst=3)
+    client = FakeClient()
+    streamers = [SlackMessageStreamer(client, "C1", f"ts{i}", min_interval=0, limiter=limiter) for i in range(4)]
+    for token in range(10):
+        for streamer in streamers:
+            streamer.append(f"word{token} ")
+
+    # 40 chunks across 4 messages, but only the burst of 3 interim edits fits the shared budget
+    assert len(client.updates) == 3
+    assert limiter.skipped > 0
+
+
+def test_final_edit_always_lands(monkeypatch):
+    monkeypatch.setattr(slack_streaming, "update_limiter", UpdateLimiter(per_minute=6000, burst=1))
+    client = FakeClient()
+    answers = [stream_to_message(client, "C1", f"ts{i}", iter(["Parental ", "leave ", "is 16 weeks."]))
+               for i in range(3)]
+    assert answers == ["Parental leave is 16 weeks."] * 3
+    finals = {ts: text for ts, text in client.updates}
+    assert finals == {f"ts{i}": "💡 Parental leave is 16 weeks." for i in range(3)}
+
+
+def test_ratelimited_error_skips_interim_edit():
+    limiter = UpdateLimiter(per_minute=6000, burst=10)
+    client = FakeClient(fail_with=slack_error("ratelimited", 200), failures=1)
+    streamer = SlackMessageStreamer(client, "C1", "ts", min_interval=0, limiter=limiter)
+    streamer.append("Managers ")
+    assert client.updates == []
+    assert streamer.finish() == "Managers "
+    assert client.updates == [("ts", "💡 Managers ")]
+
+
+def test_other_slack_errors_still_raise():
+    client = FakeClient(fail_with=slack_error("message_not_found", 200), failures=1)
+    streamer = SlackMessageStreamer(client, "C1", "ts", min_interval=0, limiter=UpdateLimiter(burst=10))
+    try:
+        streamer.append("text")
+    except SlackApiError as e:
+        assert e.response["error"] == "message_not_found"
+    else:
+        raise AssertionError("expected SlackApiError")
+
+
+def test_async_streams_share_the_update_budget():
+    limiter = UpdateLimiter(per_minute=60, burst=2)
+    client = AsyncFakeClient()
+
+    async def stream(ts: str):
+        streamer = AsyncSlackMessageStreamer(client, "C1", ts, min_interval=0, limiter=limiter)
+        for token in range(5):
+            await streamer.append(f"word{token} ")
+            await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(*(stream(f"ts{i}") for i in range(3)))
+
+    asyncio.run(main())
+    assert len(client.updates) == 2
+
+
+def test_async_stream_to_message(monkeypatch):
+    monkeypatch.setattr(slack_streaming, "update_limiter", UpdateLimiter(per_minute=6000))
+    async def chunks():
+        for chunk in ["Use ", "WireGuard."]:
+            yield chunk
+
+    client = AsyncFakeClient()
+    assert asyncio.run(astream_to_message(client, "C1", "ts", chunks())) == "Use WireGuard."
+    assert client.updates[-1] == ("ts", "💡 Use WireGuard.")
@@ -0,0 +1,32 @@
+"""
+Readiness: /readyz waits for a running warm-up, but a failed one must not hold the
+bot out of rotation forever
+"""
+import pytest
+import status_api
+from warmup import WarmUp
+
+
+@pytest.fixture
+def client(index, monkeypatch):
+    monkeypatch.setattr(status_api, "status_snapshot", status_api.StatusSnapshot())
+    return status_api.app.test_client()
+
+
+@pytest.mark.parametrize("state, code", [("pending", 200), ("warming", 503), ("ready", 200), ("failed", 200)])
+def test_readyz_follows_the_warm_up(client, monkeypatch, state, code):
+    warm_up = WarmUp()
+    warm_up.state = state
+    if state == "failed":
+        warm_up.error = "OpenAIError: Missing credentials"
+    monkeypatch.setattr(status_api, "warm_up", warm_up)
+    response = client.get("/readyz")
+    assert response.status_code == code
+    assert response.get_json()["warm_up"] == state
+
+
+def test_failed_warm_up_is_still_reported(client, monkeypatch):
+    warm_up = WarmUp()
+    warm_up.state, warm_up.error = "failed", "OpenAIError: Missing credentials"
+    monkeypatch.setattr(status_api, "warm_up", warm_up)
+    assert status_api.current_status()["warm_up"]["error"] == "OpenAIError: Missing credentials"
@@ -0,0 +1,37 @@
+"""
+Quantizing a published index republishes it as a new version that running bots pick up,
+with its derived indexes still valid
+"""
+import json
+from index_reloader import ReloadingVectorStore, published_version
+from vector_format import quantize_index, read_index
+from vector_search import SimpleVectorStore
+
+
+def test_quantize_publishes_a_new_version(index):
+    old_header, _ = read_index("vectors.json", load_records=False)
+    old_version = published_version()
+    reloader = ReloadingVectorStore(poll_interval=0)
+
+    header = quantize_index("vectors.json", "int8")
+    assert header["quantization"]["type"] == "int8"
+    assert header["index_version"] != old_header["index_version"]
+    assert header["created_at"] != old_header["created_at"]
+    assert header["count"] == old_header["count"]
+    with open("index_info.json", "r", encoding="utf-8") as f:
+        assert json.load(f)["index_version"] == header["index_version"] == published_version() != old_version
+
+    # Running bots swap it in, with BM25 and filters re-stamped rather than ignored as stale
+    assert reloader.check()
+    store = reloader.current()
+    assert store.codes is not None
+    assert store.bm25_index is not None and store.filter_index.created_at == header["created_at"]
+    assert store.similarity_search("parental leave", 2)
+
+
+def test_quantize_keeps_the_rows(index):
+    before = SimpleVectorStore("vectors.json")
+    quantize_index("vectors.json", "float16")
+    after = SimpleVectorStore("vectors.json")
+    assert after.data["texts"] == before.data["texts"]
+    assert after.data["metadata"] == before.data["metadata"]
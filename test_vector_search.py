@@ -0,0 +1,68 @@
+"""
+Hybrid retrieval: BM25 runs once per query, its ranking feeds the fusion, and the async
+search keeps BM25 off the event loop
+"""
+import asyncio
+import time
+import metrics
+from vector_search import SimpleVectorStore
+
+
+def lexical_calls() -> int:
+    return metrics.STAGE_SECONDS.snapshot(stage="lexical_search")["count"]
+
+
+def test_hybrid_search_runs_bm25_once(index):
+    store = SimpleVectorStore("vectors.json", retrieval_mode="hybrid")
+    before = lexical_calls()
+    assert store.similarity_search("who approves large expenses and receipts", 3)
+    assert lexical_calls() - before == 1
+    assert store.lexical_fast_paths == 0
+
+
+def test_probe_ranking_matches_a_fresh_bm25_pass(index):
+    store = SimpleVectorStore("vectors.json", retrieval_mode="hybrid")
+    query = "how do I get on the vpn from home"
+    results, lexical_ids = store.lexical_probe(query, 3)
+    assert results is None and len(lexical_ids)
+    query_vec = store.embed_query(query)
+    assert store.hybrid_search_by_vector(query, query_vec, 3, None, lexical_ids) == \
+        store.hybrid_search_by_vector(query, query_vec, 3)
+
+
+def test_confident_match_is_the_top_of_the_probe_ranking(index, monkeypatch):
+    store = SimpleVectorStore("vectors.json", retrieval_mode="hybrid")
+    _, lexical_ids = store.lexical_probe("wireguard vpn", 1)
+    monkeypatch.setattr(store.bm25_index, "is_confident", lambda *args: True)
+    results, ranking = store.lexical_probe("wireguard vpn", 1)
+    assert ranking is None
+    assert [text for text, _, _ in results] == [store._result(lexical_ids[0], 0.0)[0]]
+    assert store.lexical_fast_paths == 1
+
+
+def test_async_search_does_not_block_the_event_loop(index, monkeypatch):
+    store = SimpleVectorStore("vectors.json", retrieval_mode="hybrid")
+    probe = store.lexical_probe
+
+    def slow_probe(*args):
+        time.sleep(0.3)
+        return probe(*args)
+
+    monkeypatch.setattr(store, "lexical_probe", slow_probe)
+
+    async def main():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        results = await store.asimilarity_search("parental leave", 3)
+        task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+    assert results
+    assert len(ticks) > 10
@@ -0,0 +1,480 @@
+"""
+Binary on-disk format for the vector index (no pickle)
+
+The index is split in files that live next to each other:
+  vectors.json                     small JSON header: format version, dimensions, file names
+  vectors-<version>.npy            float32 embedding matrix, rows L2-normalized, opened with mmap
+  vectors-<version>.records.jsonl  one {"text", "metadata"} record per row
+
+Optionally a compressed copy of the matrix (vectors-<version>.int8.npy or .float16.npy,
+see quantization.py) is written alongside and referenced from the header.
+
+IndexWriter appends rows in blocks, so an index of any size is written with memory
+bounded by the block size. Data files carry the index version in their name and the
+header is renamed into place last, so publishing a new index is a single atomic
+os.replace: a reader sees either the old index or the new one, never a mix, and
+processes still using the previous version keep working on its files.
+
+Older indexes (texts inline in the header, or embeddings inline as JSON lists) are
+still readable and can be converted in place with:
+  python vector_format.py convert vectors.json
+Compressed codes are added by republishing the index as a new version with:
+  python vector_format.py quantize vectors.json --type int8
+"""
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+FORMAT_VERSION = 3
+EMBEDDINGS_DTYPE = "float32"
+# Published versions whose data files are kept on disk for readers still using them
+KEEP_VERSIONS = 2
+_COPY_BYTES = 1 << 24
+
+
+class IndexFormatError(ValueError):
+    """Raised when an index on disk is corrupt or was written by an incompatible version"""
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place so cosine similarity becomes a dot product"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _sibling(vectors_file: str, name: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(vectors_file)), name)
+
+
+def embeddings_path(vectors_file: str, header: dict) -> str:
+    """Resolve the matrix file referenced by a header, relative to the header itself"""
+    return _sibling(vectors_file, header["embeddings_file"])
+
+
+class IndexWriter:
+    """
+    Streams an index to disk block by block
+    Rows go to a temporary raw file and records to a temporary JSONL file; close()
+    assembles the .npy and header and moves every file into place with os.replace,
+    so readers never see a half-written index. Use as a context manager to clean up
+    the temporary files if writing fails.
+    """
+
+    def __init__(self, vectors_file: str, embedding_model: str, created_at: Optional[str] = None,
+                 quantization: Optional[str] = None, extra: Optional[dict] = None):
+        self.vectors_file = vectors_file
+        self.embedding_model = embedding_model
+        now = datetime.now()
+        self.created_at = created_at or now.isoformat()
+        self.version = now.strftime("%Y%m%dT%H%M%S%f")
+        self.quantization = quantization
+        self.extra = extra or {}
+        self.count = 0
+        self.dimensions = None
+
+        self.stem = os.path.splitext(os.path.basename(vectors_file))[0]
+        self.data_prefix = f"{self.stem}-{self.version}"
+        self.embeddings_file = f"{self.data_prefix}.npy"
+        self.records_file = f"{self.data_prefix}.records.jsonl"
+        self._rows_tmp = _sibling(vectors_file, f"{self.embeddings_file}.rows.tmp")
+        self._records_tmp = _sibling(vectors_file, f"{self.records_file}.tmp")
+        self._rows = open(self._rows_tmp, "wb")
+        self._records = open(self._records_tmp, "w", encoding="utf-8")
+        self._pending = []  # temp files waiting for os.replace on close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+    def add(self, embeddings, texts: List[str], metadata: List[dict]):
+        """Append a block of rows"""
+        if len(texts) == 0:
+            return
+        matrix = np.array(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(texts) or len(metadata) != len(texts):
+            raise IndexFormatError(f"Got {matrix.shape} embeddings for {len(texts)} texts and {len(metadata)} metadata")
+        if self.dimensions is None:
+            self.dimensions = int(matrix.shape[1])
+        elif matrix.shape[1] != self.dimensions:
+            raise IndexFormatError(f"Got {matrix.shape[1]}-dim embeddings in a {self.dimensions}-dim index")
+
+        normalize_rows(matrix)
+        self._rows.write(matrix.tobytes())
+        for text, meta in zip(texts, metadata):
+            self._records.write(json.dumps({"text": text, "metadata": meta}, ensure_ascii=False))
+            self._records.write("\n")
+        self.count += len(texts)
+
+    def _write_matrix(self) -> str:
+        """Prefix the raw rows with an .npy header, copying in bounded chunks"""
+        self._rows.close()
+        matrix_tmp = _sibling(self.vectors_file, f"{self.embeddings_file}.tmp")
+        shape = (self.count, self.dimensions or 0)
+        with open(matrix_tmp, "wb") as out, open(self._rows_tmp, "rb") as rows:
+            np.lib.format.write_array_header_1_0(
+                out, {"descr": np.dtype(np.float32).str, "fortran_order": False, "shape": shape}
+            )
+            shutil.copyfileobj(rows, out, _COPY_BYTES)
+        os.remove(self._rows_tmp)
+        return matrix_tmp
+
+    def close(self) -> dict:
+        """Finish writing and publish the index; returns the header"""
+        self._records.close()
+        matrix_tmp = self._write_matrix()
+        self._pending = [(matrix_tmp, _sibling(self.vectors_file, self.embeddings_file)),
+                         (self._records_tmp, _sibling(self.vectors_file, self.records_file))]
+
+        header = {
+            "format_version": FORMAT_VERSION,
+            "index_version": self.version,
+            "embeddings_file": self.embeddings_file,
+            "records_file": self.records_file,
+            "dtype": EMBEDDINGS_DTYPE,
+            "normalized": True,
+            "count": self.count,
+            "dimensions": self.dimensions or 0,
+            "created_at": self.created_at,
+            "embedding_model": self.embedding_model,
+            **self.extra,
+        }
+
+        if self.quantization and self.count:
+            matrix = np.load(matrix_tmp, mmap_mode="r", allow_pickle=False)
+            header["quantization"], codes_tmp = write_quantized(
+                self.vectors_file, matrix, self.quantization, self.data_prefix, suffix=".tmp"
+            )
+            del matrix
+            self._pending.append((codes_tmp, _sibling(self.vectors_file, header["quantization"]["codes_file"])))
+
+        header_tmp = f"{self.vectors_file}.tmp"
+        with open(header_tmp, "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False)
+        # The header goes last so it never points at files that are not in place yet
+        self._pending.append((header_tmp, self.vectors_file))
+
+        for tmp, final in self._pending:
+            os.replace(tmp, final)
+        self._pending = []
+
+        remove_old_versions(self.vectors_file)
+        return header
+
+    def abort(self):
+        """Discard everything written so far"""
+        for f in (self._rows, self._records):
+            if not f.closed:
+                f.close()
+        for path in [self._rows_tmp, self._records_tmp] + [tmp for tmp, _ in self._pending]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._pending = []
+
+
+def save_npz(path: str, format_version: int, created_at: str, **arrays):
+    """
+    Save a derived index (ANN, BM25, filters) to an .npz file next to the vectors
+    Plain arrays only, no pickle; any old file is replaced atomically.
+    """
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(f, version=np.array(format_version), created_at=np.array(created_at), **arrays)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_npz(path: str, format_version: int, kind: str) -> dict:
+    """Read a file written by save_npz into memory; raises IndexFormatError on another format version"""
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data["version"])
+        if version != format_version:
+            raise IndexFormatError(f"Unsupported {kind} version {version}")
+        arrays = {name: data[name] for name in data.files if name != "version"}
+    arrays["created_at"] = str(arrays["created_at"])
+    return arrays
+
+
+def built_for(index, header: dict, count: int) -> bool:
+    """True if a derived index (with .count and .created_at) was built for the vectors described by header"""
+    return index.count == count and index.created_at == str(header.get("created_at", "unknown"))
+
+
+def write_index(vectors_file: str, embeddings, texts: List[str], metadata: List[dict],
+                embedding_model: str, created_at: str, extra: Optional[dict] = None,
+                quantization: Optional[str] = None) -> dict:
+    """
+    Write a complete index in one call, plus compressed codes if quantization is
+    "int8" or "float16". Returns the header that was written.
+    """
+    with IndexWriter(vectors_file, embedding_model, created_at, quantization, extra) as writer:
+        writer.add(embeddings, texts, metadata)
+        return writer.close()
+
+
+def remove_old_versions(vectors_file: str, keep: int = KEEP_VERSIONS):
+    """Delete data files of all but the newest `keep` published versions"""
+    stem = os.path.splitext(os.path.basename(vectors_file))[0]
+    directory = os.path.dirname(os.path.abspath(vectors_file))
+    files_by_version = {}
+    for name in os.listdir(directory):
+        if name.startswith(f"{stem}-") and not name.endswith(".tmp"):
+            version = name[len(stem) + 1:].split(".", 1)[0]
+            files_by_version.setdefault(version, []).append(name)
+
+    for version in sorted(files_by_version)[:-keep]:
+        for name in files_by_version[version]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def write_quantized(vectors_file: str, matrix: np.ndarray, kind: str, data_prefix: str,
+                    suffix: str = "") -> Tuple[dict, str]:
+    """
+    Write compressed codes for matrix next to vectors_file, block by block
+    Returns (header entry, path written)
+    """
+    from quantization import quantize
+
+    entry = {"type": kind, "codes_file": f"{data_prefix}.{kind}.npy"}
+    path = _sibling(vectors_file, entry["codes_file"]) + suffix
+
+    codes = np.lib.format.open_memmap(path, mode="w+", dtype=np.dtype(kind), shape=matrix.shape)
+    _, scale = quantize(matrix, kind, out=codes)
+    codes.flush()
+    del codes
+
+    if scale is not None:
+        entry["scale"] = [float(x) for x in scale]
+    return entry, path
+
+
+def read_quantized(vectors_file: str, header: dict) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """Load the compressed codes referenced by a header into memory; (None, None) if there are none"""
+    entry = header.get("quantization")
+    if not entry:
+        return None, None
+
+    codes = np.load(_sibling(vectors_file, entry["codes_file"]), allow_pickle=False)
+    if codes.shape != (header.get("count"), header.get("dimensions")):
+        raise IndexFormatError(f"Quantized codes have shape {codes.shape}, expected ({header.get('count')}, {header.get('dimensions')})")
+
+    scale = np.asarray(entry["scale"], dtype=np.float32) if "scale" in entry else None
+    return codes, scale
+
+
+def iter_records(vectors_file: str, header: dict) -> Iterator[Tuple[str, dict]]:
+    """Yield (text, metadata) for every row without holding them all in memory"""
+    if "records_file" not in header:
+        metadata = header.get("metadata", [])
+        for i, text in enumerate(header.get("texts", [])):
+            yield text, metadata[i] if i < len(metadata) else {}
+        return
+
+    with open(_sibling(vectors_file, header["records_file"]), "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            yield record["text"], record.get("metadata", {})
+
+
+class RecordReader:
+    """Random access to the records of a JSONL index by row, holding only line offsets in memory"""
+
+    def __init__(self, vectors_file: str, header: dict):
+        self._file = open(_sibling(vectors_file, header["records_file"]), "rb")
+        self._offsets = np.fromiter(self._scan(), dtype=np.int64)
+
+    def _scan(self):
+        offset = 0
+        for line in self._file:
+            yield offset
+            offset += len(line)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, row: int) -> Tuple[str, dict]:
+        self._file.seek(int(self._offsets[row]))
+        record = json.loads(self._file.readline())
+        return record["text"], record.get("metadata", {})
+
+    def close(self):
+        self._file.close()
+
+
+def read_index(vectors_file: str, mmap: bool = True, load_records: bool = True) -> Tuple[dict, Optional[np.ndarray]]:
+    """
+    Read an index and return (header, matrix)
+    For binary indexes the matrix is memory-mapped read-only, so loading is near-instant
+    and several processes share the same pages. Legacy JSON indexes are parsed and
+    normalized into memory. With load_records the header gets "texts" and "metadata" lists.
+    """
+    with open(vectors_file, "r", encoding="utf-8") as f:
+        header = json.load(f)
+
+    # Legacy format: embeddings inline as JSON lists
+    if "embeddings" in header:
+        embeddings = header.pop("embeddings") or []
+        header["format_version"] = 1
+        header["count"] = len(header.get("texts", []))
+        if not embeddings:
+            return header, None
+        matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        return header, matrix
+
+    version = header.get("format_version")
+    if not isinstance(version, int) or version > FORMAT_VERSION:
+        raise IndexFormatError(f"Unsupported index format version {version!r} (this code reads up to {FORMAT_VERSION})")
+    if header.get("dtype") != EMBEDDINGS_DTYPE:
+        raise IndexFormatError(f"Unsupported embeddings dtype {header.get('dtype')!r}")
+
+    if load_records and "records_file" in header:
+        texts, metadata = [], []
+        for text, meta in iter_records(vectors_file, header):
+            texts.append(text)
+            metadata.append(meta)
+        header["texts"], header["metadata"] = texts, metadata
+        if len(texts) != header.get("count"):
+            raise IndexFormatError(f"Records file has {len(texts)} rows but the header says {header.get('count')}")
+
+    matrix = np.load(embeddings_path(vectors_file, header), mmap_mode="r" if mmap else None, allow_pickle=False)
+    if matrix.dtype != np.float32 or matrix.ndim != 2:
+        raise IndexFormatError(f"Embeddings file has dtype {matrix.dtype} and shape {matrix.shape}, expected 2-D float32")
+    if matrix.shape[0] != header.get("count"):
+        raise IndexFormatError(f"Embeddings file has {matrix.shape[0]} rows but the header says {header.get('count')}")
+    if "texts" in header and matrix.shape[0] != len(header["texts"]):
+        raise IndexFormatError(f"Embeddings file has {matrix.shape[0]} rows but the header lists {len(header['texts'])} texts")
+    if matrix.shape[0] and matrix.shape[1] != header.get("dimensions"):
+        raise IndexFormatError(f"Embeddings file has {matrix.shape[1]} dimensions but the header says {header.get('dimensions')}")
+
+    if not header.get("normalized", False):
+        matrix = normalize_rows(np.array(matrix, dtype=np.float32))
+
+    return header, (matrix if matrix.shape[0] else None)
+
+
+def convert_json_index(src: str, dest: Optional[str] = None) -> dict:
+    """Convert an older vectors.json (inline embeddings or inline texts) to the current format"""
+    dest = dest or src
+    header, matrix = read_index(src, mmap=False)
+    if header["format_version"] == FORMAT_VERSION:
+        raise IndexFormatError(f"{src} is already in the current format (version {FORMAT_VERSION})")
+
+    texts = header.pop("texts", [])
+    metadata = header.pop("metadata", [{} for _ in texts])
+    for key in ("format_version", "embeddings_file", "dtype", "normalized", "count", "dimensions", "quantization"):
+        header.pop(key, None)
+
+    return write_index(
+        dest,
+        matrix if matrix is not None else np.empty((0, 0), dtype=np.float32),
+        texts,
+        metadata,
+        embedding_model=header.pop("embedding_model", "unknown"),
+        created_at=header.pop("created_at", "unknown"),
+        extra=header,
+    )
+
+
+# Header fields IndexWriter writes itself; everything else is carried over on republish
+_WRITER_FIELDS = {"format_version", "index_version", "embeddings_file", "records_file", "dtype", "normalized",
+                  "count", "dimensions", "created_at", "embedding_model", "quantization"}
+REPUBLISH_BLOCK_ROWS = 4096
+
+
+def quantize_index(vectors_file: str, kind: str, info_file: str = "index_info.json") -> dict:
+    """
+    Republish a binary index with kind ("int8" or "float16") codes as a new index version
+    The rows do not change, so derived indexes (BM25, filters, ANN) built for the old version
+    are re-stamped for the new one before it is published, and shards are rebuilt after.
+    index_info.json gets the new index_version, so running bots hot-reload it. Returns the header.
+    """
+    from ann_index import IVFIndex, ann_path
+    from bm25_index import BM25Index, bm25_path
+    from metadata_filter import FilterIndex, filter_path
+    from sharded_index import build_shards, manifest_matches, read_manifest
+
+    header, matrix = read_index(vectors_file, load_records=False)
+    if header["format_version"] < FORMAT_VERSION or matrix is None:
+        raise IndexFormatError(f"{vectors_file} is not in the current binary format, "
+                               f"run 'python vector_format.py convert' first")
+    count = matrix.shape[0]
+    manifest = read_manifest(vectors_file)
+    shards = len(manifest["shards"]) if manifest_matches(manifest, vectors_file) else 0
+
+    derived = []
+    for path, load, matches in [
+        (bm25_path(vectors_file), BM25Index.load, lambda index: index.matches(header, count)),
+        (filter_path(vectors_file), FilterIndex.load, lambda index: index.matches(header, count)),
+        (ann_path(vectors_file), IVFIndex.load, lambda index: index.matches(header, matrix)),
+    ]:
+        try:
+            index = load(path)
+        except (OSError, ValueError, KeyError):
+            continue
+        if matches(index):
+            derived.append((index, path))
+
+    extra = {key: value for key, value in header.items() if key not in _WRITER_FIELDS}
+    with IndexWriter(vectors_file, header.get("embedding_model", "unknown"), None, kind, extra) as writer:
+        texts, metadata = [], []
+        for text, meta in iter_records(vectors_file, header):
+            texts.append(text)
+            metadata.append(meta)
+            if len(texts) == REPUBLISH_BLOCK_ROWS:
+                writer.add(matrix[writer.count:writer.count + len(texts)], texts, metadata)
+                texts, metadata = [], []
+        writer.add(matrix[writer.count:writer.count + len(texts)], texts, metadata)
+        # Saved before the header is published, so a reader never pairs new vectors with a stale index
+        for index, path in derived:
+            index.created_at = writer.created_at
+            index.save(path)
+        new_header = writer.close()
+
+    if shards:
+        build_shards(vectors_file, shards)
+
+    if os.path.exists(info_file):
+        with open(info_file, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        info["index_version"] = new_header["index_version"]
+        info["last_updated"] = datetime.now().isoformat()
+        with open(f"{info_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+        os.replace(f"{info_file}.tmp", info_file)
+    return new_header
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector index format tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert an older vectors file to the current binary format")
+    convert.add_argument("src", nargs="?", default="vectors.json")
+    convert.add_argument("--dest", help="Header path to write (defaults to overwriting src)")
+
+    quantize = subparsers.add_parser("quantize", help="Add compressed codes to a binary index")
+    quantize.add_argument("src", nargs="?", default="vectors.json")
+    quantize.add_argument("--type", choices=["int8", "float16"], default="int8")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        header = convert_json_index(args.src, args.dest)
+        print(f"✅ Converted {header['count']} vectors ({header['dimensions']} dims) to {header['embeddings_file']}")
+
+    elif args.command == "quantize":
+        try:
+            header = quantize_index(args.src, args.type)
+        except IndexFormatError as e:
+            raise SystemExit(f"❌ {e}")
+        print(f"✅ Published index {header['index_version']} with {args.type} codes for {header['count']} vectors "
+              f"({header['quantization']['codes_file']})")
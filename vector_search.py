@@ -1,75 +1,447 @@
 """
-Simple vector search utility that works with JSON-based embeddings (no pickle)
+Simple vector search utility that works with JSON/NumPy embeddings (no pickle)
 """
-import json
+import asyncio
+import os
 import numpy as np
-from typing import List, Tuple
-from langchain_openai import OpenAIEmbeddings
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
+import metrics
+from vector_format import normalize_rows, read_index, read_quantized
+from quantization import DEFAULT_RESCORE_FACTOR, approximate_scores, compression_ratio
+from embedding_cache import QueryEmbeddingCache
+from embedding_providers import check_compatible, embeddings_name, get_embeddings
+from ann_index import DEFAULT_MIN_VECTORS, DEFAULT_NPROBE, IVFIndex, ann_path
+from bm25_index import DEFAULT_CONFIDENCE_RATIO, BM25Index, bm25_path, reciprocal_rank_fusion
+from metadata_filter import FilterBuilder, FilterIndex, SearchFilter, filter_path, range_rows
 
 # Load environment variables
 load_dotenv()
 
+# Candidates per requested result taken from each ranking before reciprocal-rank fusion
+RRF_CANDIDATE_FACTOR = 4
+RRF_K = 60
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array"""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < scores.shape[-1]:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1)
+    return np.take_along_axis(candidates, order, axis=-1)
+
 
 class SimpleVectorStore:
-    """Simple vector store using JSON storage (no pickle dependencies)"""
+    """Simple vector store using JSON + memory-mapped NumPy storage (no pickle dependencies)"""
 
-    def __init__(self, vectors_file="vectors.json"):
+    def __init__(self, vectors_file="vectors.json", query_cache: QueryEmbeddingCache = None,
+                 search_mode: str = None, nprobe: int = None, embeddings_model=None, retrieval_mode: str = None):
         self.vectors_file = vectors_file
-        self.embeddings_model = OpenAIEmbeddings()
+        # Pass a shared embeddings client to reuse its HTTP connections across stores;
+        # by default the EMBEDDING_PROVIDER one (it must be the provider that built the index)
+        self.embeddings_model = embeddings_model if embeddings_model is not None else get_embeddings()
+        self.query_cache = query_cache if query_cache is not None else QueryEmbeddingCache.from_env()
+        # "exact" always scans every row, "ann" uses the IVF index when one is available,
+        # "auto" uses it only once the corpus is larger than ANN_MIN_VECTORS
+        self.search_mode = search_mode or os.environ.get("VECTOR_SEARCH_MODE", "auto")
+        self.nprobe = nprobe or int(os.environ.get("ANN_NPROBE", DEFAULT_NPROBE))
+        self.ann_min_vectors = int(os.environ.get("ANN_MIN_VECTORS", DEFAULT_MIN_VECTORS))
+        self.rescore_factor = int(os.environ.get("RESCORE_FACTOR", DEFAULT_RESCORE_FACTOR))
+        # "dense" is embeddings only, "lexical" is BM25 only, "hybrid" fuses both with
+        # reciprocal-rank fusion and answers confident keyword queries lexically
+        self.retrieval_mode = retrieval_mode or os.environ.get("RETRIEVAL_MODE", "hybrid")
+        self.lexical_fast_path_enabled = os.environ.get("LEXICAL_FAST_PATH", "true").lower() in ("1", "true", "yes")
+        self.lexical_confidence_ratio = float(os.environ.get("LEXICAL_CONFIDENCE_RATIO", DEFAULT_CONFIDENCE_RATIO))
+        self.lexical_fast_paths = 0
         self.data = None
+        self.matrix = None
+        self.codes = None
+        self.code_scale = None
+        self.ann_index = None
+        self.bm25_index = None
+        self.filter_index = None
         self.load()
 
     def load(self):
-        """Load vectors from JSON file"""
+        """Load the index header and its normalized float32 matrix (memory-mapped when binary)"""
         try:
-            with open(self.vectors_file, "r", encoding="utf-8") as f:
-                self.data = json.load(f)
+            # Embeddings live in one contiguous matrix, normalized once, instead of
+            # per-row Python lists that have to be converted on every search
+            self.data, self.matrix = read_index(self.vectors_file)
+            # Refuse to compare query vectors with document vectors from another model
+            check_compatible(self.data, self.embeddings_model)
+            # With compressed codes in RAM the float32 matrix is only read for re-scoring
+            self.codes, self.code_scale = read_quantized(self.vectors_file, self.data)
+            self.ann_index = self._load_ann_index()
+            self.bm25_index = self._load_bm25_index()
+            self.filter_index = self._load_filter_index()
+            metrics.INDEX_VECTORS.set(0 if self.matrix is None else self.matrix.shape[0])
+
             print(f"✅ Loaded {len(self.data.get('texts', []))} vectors from {self.vectors_file}")
         except FileNotFoundError:
             print(f"❌ Vector file {self.vectors_file} not found")
             self.data = None
+            self.matrix = None
+            self.codes = None
+            self.code_scale = None
+            self.ann_index = None
+            self.bm25_index = None
+            self.filter_index = None
         except Exception as e:
             print(f"❌ Error loading vectors: {e}")
             self.data = None
+            self.matrix = None
+            self.codes = None
+            self.code_scale = None
+            self.ann_index = None
+            self.bm25_index = None
+            self.filter_index = None
+
+    @property
+    def is_ready(self) -> bool:
+        """True once an index with at least one vector is loaded"""
+        return bool(self.data) and self.matrix is not None
+
+    def close(self):
+        """Release resources held by the store (nothing to do for a single-process store)"""
+
+    def _load_ann_index(self):
+        """Load the IVF index next to the vectors file if it was built for these vectors"""
+        path = ann_path(self.vectors_file)
+        if self.search_mode == "exact" or self.matrix is None or not os.path.exists(path):
+            return None
+        try:
+            index = IVFIndex.load(path)
+        except Exception as e:
+            print(f"⚠️ Ignoring ANN index {path}: {e}")
+            return None
+        if not index.matches(self.data, self.matrix):
+            print(f"⚠️ Ignoring stale ANN index {path}, falling back to exact search")
+            return None
+        return index
+
+    def _load_bm25_index(self):
+        """Load the BM25 index next to the vectors file if it was built for these vectors"""
+        path = bm25_path(self.vectors_file)
+        if self.retrieval_mode == "dense" or self.matrix is None or not os.path.exists(path):
+            return None
+        try:
+            index = BM25Index.load(path)
+        except Exception as e:
+            print(f"⚠️ Ignoring BM25 index {path}: {e}")
+            return None
+        if not index.matches(self.data, self.matrix.shape[0]):
+            print(f"⚠️ Ignoring stale BM25 index {path}, falling back to dense search")
+            return None
+        return index
+
+    def _load_filter_index(self):
+        """Load the per-source row ranges next to the vectors file, or collect them from the loaded metadata"""
+        if self.matrix is None:
+            return None
+        path = filter_path(self.vectors_file)
+        if os.path.exists(path):
+            try:
+                index = FilterIndex.load(path)
+                if index.matches(self.data, self.matrix.shape[0]):
+                    return index
+                print(f"⚠️ Ignoring stale filter index {path}")
+            except Exception as e:
+                print(f"⚠️ Ignoring filter index {path}: {e}")
+        # Indexes built before filters existed: the metadata is in memory, so one pass finds the ranges
+        builder = FilterBuilder()
+        builder.add(self.data.get("metadata", []))
+        if builder.count != self.matrix.shape[0]:
+            return None
+        return builder.build(created_at=str(self.data.get("created_at", "unknown")))
+
+    def _filter_ranges(self, filter: Optional[SearchFilter]) -> Optional[np.ndarray]:
+        """[start, end) row ranges a filter selects, or None to search every row"""
+        if filter is None:
+            return None
+        if self.filter_index is None:
+            raise ValueError("This index has no source metadata to filter on; re-run enhanced_ingest.py")
+        return self.filter_index.resolve(filter)
+
+    def unmatched_scope_tags(self, filter: SearchFilter) -> Optional[List[str]]:
+        """Every tag in the index if filter selects no chunks (to suggest scopes that exist), else None"""
+        if self.filter_index is None or len(self._filter_ranges(filter)):
+            return None
+        return self.filter_index.tags()
+
+    def _use_ann(self) -> bool:
+        if self.ann_index is None or self.search_mode == "exact":
+            return False
+        return self.search_mode == "ann" or self.matrix.shape[0] >= self.ann_min_vectors
+
+    def _rescore(self, scores: np.ndarray, query_vec: np.ndarray, k: int,
+                 rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score the best approximate candidates against the full-precision matrix (scores[i] is row rows[i] if given)"""
+        candidates = _top_k(scores, max(k * self.rescore_factor, k))
+        candidates = np.sort(rows[candidates] if rows is not None else candidates)
+        exact = np.asarray(self.matrix[candidates], dtype=np.float32) @ query_vec
+        top = _top_k(exact, k)
+        return candidates[top], exact[top]
 
-    def similarity_search(self, query: str, k: int = 5) -> List[Tuple[str, dict, float]]:
+    def _result(self, i: int, score: float) -> Tuple[str, dict, float]:
+        """Build a (text, metadata, score) tuple for row i"""
+        metadata = self.data.get("metadata", [])
+        return (self.data["texts"][i], metadata[i] if i < len(metadata) else {}, float(score))
+
+    @property
+    def embedding_model_name(self) -> str:
+        """Name of the model used to embed queries (part of the query cache key)"""
+        return embeddings_name(self.embeddings_model)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query as a normalized float32 vector, using the query cache"""
+        model = self.embedding_model_name
+        cached = self.query_cache.get(model, query)
+        metrics.CACHE_LOOKUPS.inc(cache="query_embedding", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+        with metrics.stage("query_embedding"):
+            query_embedding = self.embeddings_model.embed_query(query)
+        query_vec = normalize_rows(np.asarray([query_embedding], dtype=np.float32))[0]
+        self.query_cache.put(model, query, query_vec)
+        return query_vec
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """Async embed_query: the embeddings request does not block the event loop"""
+        model = self.embedding_model_name
+        cached = self.query_cache.get(model, query)
+        metrics.CACHE_LOOKUPS.inc(cache="query_embedding", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+        with metrics.stage("query_embedding"):
+            query_embedding = await self.embeddings_model.aembed_query(query)
+        query_vec = normalize_rows(np.asarray([query_embedding], dtype=np.float32))[0]
+        self.query_cache.put(model, query, query_vec)
+        return query_vec
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed many queries as a normalized (n, dims) matrix; cache misses go out in one request"""
+        model = self.embedding_model_name
+        vectors = [self.query_cache.get(model, query) for query in queries]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+
+        if missing:
+            with metrics.stage("query_embedding"):
+                embeddings = self.embeddings_model.embed_documents([queries[i] for i in missing])
+            fresh = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+            for i, vec in zip(missing, fresh):
+                self.query_cache.put(model, queries[i], vec)
+                vectors[i] = vec
+
+        return np.vstack(vectors)
+
+    def lexical_search(self, query: str, k: int = 5, filter: SearchFilter = None) -> List[Tuple[str, dict, float]]:
+        """BM25-only search; returns (text, metadata, bm25_score) tuples"""
+        if not self.data or self.bm25_index is None:
+            return []
+        with metrics.stage("lexical_search"):
+            ids, scores = self.bm25_index.search(query, k, self._filter_ranges(filter))
+        return [self._result(i, score) for i, score in zip(ids, scores)]
+
+    def lexical_probe(self, query: str, k: int = 5,
+                      filter: SearchFilter = None) -> Tuple[Optional[List[Tuple[str, dict, float]]], Optional[np.ndarray]]:
+        """
+        The one BM25 pass of a query: (results if it can be answered without embedding it, else None;
+        BM25 ranking to pass to hybrid_search_by_vector, else None)
+        In "lexical" mode every query is answered lexically. In "hybrid" mode the ranking is fetched
+        as deep as fusion needs, and confident keyword matches are answered from its top k.
+        """
+        if not self.data or self.bm25_index is None:
+            return None, None
+        if self.retrieval_mode == "lexical":
+            return self.lexical_search(query, k, filter), None
+        if self.retrieval_mode != "hybrid":
+            return None, None
+
+        with metrics.stage("lexical_search"):
+            ids, scores = self.bm25_index.search(query, k * RRF_CANDIDATE_FACTOR, self._filter_ranges(filter))
+        if not self.lexical_fast_path_enabled or not self.bm25_index.is_confident(
+                query, ids, scores, self.lexical_confidence_ratio):
+            return None, ids
+        self.lexical_fast_paths += 1
+        return [self._result(i, score) for i, score in zip(ids[:k], scores[:k])], None
+
+    def lexical_fast_path(self, query: str, k: int = 5,
+                          filter: SearchFilter = None) -> Optional[List[Tuple[str, dict, float]]]:
+        """Results for a query that can be answered without embedding it, else None"""
+        return self.lexical_probe(query, k, filter)[0]
+
+    def hybrid_search_by_vector(self, query: str, query_vec: np.ndarray, k: int = 5, filter: SearchFilter = None,
+                                lexical_ids: Optional[np.ndarray] = None) -> List[Tuple[str, dict, float]]:
+        """
+        Fuse dense and BM25 rankings with reciprocal-rank fusion
+        Pass the ranking from lexical_probe as lexical_ids so BM25 does not run twice. Scores
+        are RRF scores; falls back to dense search without a BM25 index
         """
-        Search for similar texts to the query
+        if self.bm25_index is None or self.retrieval_mode != "hybrid":
+            return self.similarity_search_by_vector(query_vec, k, filter)
+        if not self.is_ready:
+            return []
+
+        candidates = k * RRF_CANDIDATE_FACTOR
+        ranges = self._filter_ranges(filter)
+        dense_ids, _ = self._dense_search(query_vec, candidates, ranges)
+        if lexical_ids is None:
+            with metrics.stage("lexical_search"):
+                lexical_ids, _ = self.bm25_index.search(query, candidates, ranges)
+        ids, scores = reciprocal_rank_fusion([dense_ids, lexical_ids], k, RRF_K)
+        return [self._result(i, score) for i, score in zip(ids, scores)]
+
+    def hybrid_search_batch(self, queries: List[str], query_matrix: np.ndarray, k: int = 5, filter: SearchFilter = None,
+                            lexical_ids: Optional[List[Optional[np.ndarray]]] = None) -> List[List[Tuple[str, dict, float]]]:
+        """hybrid_search_by_vector for many queries, with the dense scoring done in one matrix-matrix product"""
+        if not self.is_ready:
+            return [[] for _ in queries]
+
+        hybrid = self.bm25_index is not None and self.retrieval_mode == "hybrid"
+        candidates = k * RRF_CANDIDATE_FACTOR if hybrid else k
+        ranges = self._filter_ranges(filter)
+        dense = self._dense_search_batch(query_matrix, candidates, ranges)
+        if not hybrid:
+            return [[self._result(i, score) for i, score in zip(ids, scores)] for ids, scores in dense]
+
+        results = []
+        for q, (query, (dense_ids, _)) in enumerate(zip(queries, dense)):
+            lexical = lexical_ids[q] if lexical_ids is not None else None
+            if lexical is None:
+                with metrics.stage("lexical_search"):
+                    lexical, _ = self.bm25_index.search(query, candidates, ranges)
+            ids, scores = reciprocal_rank_fusion([dense_ids, lexical], k, RRF_K)
+            results.append([self._result(i, score) for i, score in zip(ids, scores)])
+        return results
+
+    def similarity_search(self, query: str, k: int = 5, filter: SearchFilter = None) -> List[Tuple[str, dict, float]]:
+        """
+        Search for similar texts to the query, only among chunks filter selects if given
         Returns list of (text, metadata, similarity_score) tuples
         """
-        if not self.data or not self.data.get("embeddings"):
+        if not self.is_ready:
             return []
 
         try:
-            # Get query embedding
-            query_embedding = self.embeddings_model.embed_query(query)
-            query_vec = np.array(query_embedding)
-
-            # Calculate similarities
-            similarities = []
-            for i, doc_embedding in enumerate(self.data["embeddings"]):
-                doc_vec = np.array(doc_embedding)
-                # Cosine similarity
-                similarity = np.dot(query_vec, doc_vec) / (np.linalg.norm(query_vec) * np.linalg.norm(doc_vec))
-                similarities.append((i, similarity))
+            results, lexical_ids = self.lexical_probe(query, k, filter)
+            if results is not None:
+                return results
+            return self.hybrid_search_by_vector(query, self.embed_query(query), k, filter, lexical_ids)
 
-            # Sort by similarity (highest first)
-            similarities.sort(key=lambda x: x[1], reverse=True)
+        except Exception as e:
+            print(f"❌ Error during search: {e}")
+            return []
 
-            # Return top k results
-            results = []
-            for i, score in similarities[:k]:
-                text = self.data["texts"][i]
-                metadata = self.data.get("metadata", [{}])[i] if i < len(self.data.get("metadata", [])) else {}
-                results.append((text, metadata, score))
+    async def asimilarity_search(self, query: str, k: int = 5, filter: SearchFilter = None) -> List[Tuple[str, dict, float]]:
+        """Async similarity_search; BM25 and vector scoring run in worker threads so the event loop stays responsive"""
+        if not self.is_ready:
+            return []
 
-            return results
+        try:
+            results, lexical_ids = await asyncio.to_thread(self.lexical_probe, query, k, filter)
+            if results is not None:
+                return results
+            query_vec = await self.aembed_query(query)
+            return await asyncio.to_thread(self.hybrid_search_by_vector, query, query_vec, k, filter, lexical_ids)
 
         except Exception as e:
             print(f"❌ Error during search: {e}")
             return []
 
+    def _dense_search(self, query_vec: np.ndarray, k: int,
+                      ranges: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(row ids, cosine scores) of the top-k rows (only rows inside ranges if given), best first"""
+        with metrics.stage("vector_scoring"):
+            if ranges is not None:
+                return self._score_ranges(query_vec[None, :], ranges, k)[0]
+            return self._score_rows(query_vec, k)
+
+    def _score_rows(self, query_vec: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._use_ann():
+            return self.ann_index.search(self.matrix, query_vec, k, self.nprobe)
+
+        if self.codes is not None:
+            return self._rescore(approximate_scores(self.codes, self.code_scale, query_vec), query_vec, k)
+
+        # Cosine similarity against every row in one matrix-vector product
+        scores = self.matrix @ query_vec
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+    def _score_ranges(self, query_matrix: np.ndarray, ranges: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Exact top-k per query over only the rows inside ranges, e.g. the chunks a filter selects"""
+        rows = range_rows(ranges)
+        if not len(rows):
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in query_matrix]
+
+        # Ranges are contiguous slices, so the selected rows are scored in place without copying them
+        if self.codes is not None:
+            approximate = np.concatenate([approximate_scores(self.codes[start:end], self.code_scale, query_matrix)
+                                          for start, end in ranges], axis=-1)
+            return [self._rescore(approximate[q], query_vec, k, rows) for q, query_vec in enumerate(query_matrix)]
+
+        scores = np.concatenate([query_matrix @ self.matrix[start:end].T for start, end in ranges], axis=-1)
+        top = _top_k(scores, k)
+        return [(rows[top[q]], scores[q, top[q]]) for q in range(len(query_matrix))]
+
+    def _dense_search_batch(self, query_matrix: np.ndarray, k: int,
+                            ranges: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """_dense_search for every row of query_matrix"""
+        with metrics.stage("vector_scoring"):
+            if ranges is not None:
+                return self._score_ranges(query_matrix, ranges, k)
+            if self._use_ann():
+                return [self._score_rows(query_vec, k) for query_vec in query_matrix]
+
+            if self.codes is not None:
+                approximate = approximate_scores(self.codes, self.code_scale, query_matrix)
+                return [self._rescore(approximate[row], query_vec, k) for row, query_vec in enumerate(query_matrix)]
+
+            # (n_queries, dims) x (dims, n_vectors) -> (n_queries, n_vectors)
+            scores = query_matrix @ self.matrix.T
+            top = _top_k(scores, k)
+            return [(top[row], scores[row, top[row]]) for row in range(len(query_matrix))]
+
+    def similarity_search_by_vector(self, query_vec: np.ndarray, k: int = 5,
+                                    filter: SearchFilter = None) -> List[Tuple[str, dict, float]]:
+        """Search with an already embedded, normalized query vector"""
+        if not self.is_ready:
+            return []
+
+        ids, scores = self._dense_search(query_vec, k, self._filter_ranges(filter))
+        return [self._result(i, score) for i, score in zip(ids, scores)]
+
+    def similarity_search_batch(self, queries: List[str], k: int = 5,
+                                filter: SearchFilter = None) -> List[List[Tuple[str, dict, float]]]:
+        """
+        Search for many queries at once
+        Embeds all queries in one request and scores them in one matrix-matrix product.
+        Returns one list of (text, metadata, similarity_score) tuples per query
+        """
+        if not queries:
+            return []
+        if not self.is_ready:
+            return [[] for _ in queries]
+
+        try:
+            query_matrix = self.embed_queries(list(queries))
+            return [
+                [self._result(i, score) for i, score in zip(ids, scores)]
+                for ids, scores in self._dense_search_batch(query_matrix, k, self._filter_ranges(filter))
+            ]
+
+        except Exception as e:
+            print(f"❌ Error during batch search: {e}")
+            return [[] for _ in queries]
+
     def get_all_texts(self) -> List[str]:
         """Get all stored texts"""
         if not self.data:
@@ -85,8 +457,20 @@ class SimpleVectorStore:
             "status": "loaded",
             "total_vectors": len(self.data.get("texts", [])),
             "embedding_model": self.data.get("embedding_model", "unknown"),
+            "query_embedding_model": self.embedding_model_name,
             "dimensions": self.data.get("dimensions", 0),
-            "created_at": self.data.get("created_at", "unknown")
+            "created_at": self.data.get("created_at", "unknown"),
+            "format_version": self.data.get("format_version", 1),
+            "query_cache": self.query_cache.get_stats(),
+            "search_mode": "ann" if self._use_ann() else "exact",
+            "ann_lists": self.ann_index.n_lists if self.ann_index is not None else 0,
+            "ann_nprobe": self.nprobe,
+            "quantization": self.data.get("quantization", {}).get("type", "none"),
+            "compression_ratio": compression_ratio(self.codes, self.code_scale) if self.codes is not None else 1.0,
+            "retrieval_mode": self.retrieval_mode if self.bm25_index is not None else "dense",
+            "bm25_terms": len(self.bm25_index.vocab) if self.bm25_index is not None else 0,
+            "lexical_fast_paths": self.lexical_fast_paths,
+            "filter_sources": len(self.filter_index.sources) if self.filter_index is not None else 0
         }
 
 
@@ -0,0 +1,201 @@
+"""
+Background warm-up, so the first question after a deploy is as fast as any other
+
+Importing LangChain/OpenAI, loading the vector index and building the pooled clients
+takes seconds. Without a warm-up the first user after every restart waits for all of
+it. WarmUp does that work in a daemon thread as soon as the bot starts:
+  1. imports the heavy modules, timing each one (the import-time profile)
+  2. builds the shared answer engine: index, embeddings and GPT-4 clients
+  3. optionally embeds a dummy query, which also opens a pooled HTTPS connection
+Questions that arrive meanwhile wait for the same engine (get_engine() is locked) rather
+than loading a second copy. /primr-status and status_api.py (/status, /readyz) report
+progress.
+
+Profile what importing a module costs from a cold interpreter with:
+  python warmup.py profile slack_bot
+"""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+import metrics
+
+# Imported one by one during warm-up so their cost shows up separately in the profile
+HEAVY_MODULES = ("numpy", "httpx", "langchain_openai", "langchain.prompts", "langchain.chains", "answer_engine")
+PROBE_QUERY = "warm-up"
+
+
+def _enabled(name: str, default: str = "true") -> bool:
+    return os.environ.get(name, default).lower() in ("1", "true", "yes")
+
+
+class WarmUp:
+    """Loads the answer engine in the background and records how long each step took"""
+
+    def __init__(self, enabled: bool = True, probe_embedding: bool = True):
+        self.enabled = enabled
+        self.probe_embedding = probe_embedding
+        self.state = "pending"      # pending -> warming -> ready | failed
+        self.stage = None
+        self.error = None
+        self.started_at = None
+        self.seconds = None
+        self.stages = {}            # stage -> seconds, in order
+        self.imports = {}           # module -> seconds to import it (0 if it was already imported)
+        self._started = time.perf_counter()
+        self._done = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "WarmUp":
+        """Build from WARM_UP and WARM_UP_EMBEDDING"""
+        return cls(enabled=_enabled("WARM_UP"), probe_embedding=_enabled("WARM_UP_EMBEDDING"))
+
+    def start(self) -> bool:
+        """Start warming up in a daemon thread; returns False if disabled or already started"""
+        with self._lock:
+            if not self.enabled or self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+            self._thread.start()
+            return True
+
+    def _timed(self, stage: str, func):
+        self.stage = stage
+        started = time.perf_counter()
+        result = func()
+        self.stages[stage] = round(time.perf_counter() - started, 3)
+        metrics.WARM_UP_SECONDS.set(self.stages[stage], stage=stage)
+        return result
+
+    def _import(self, name: str):
+        already = name in sys.modules
+        started = time.perf_counter()
+        importlib.import_module(name)
+        self.imports[name] = 0.0 if already else round(time.perf_counter() - started, 3)
+
+    def run(self):
+        """Warm up in the calling thread (start() runs this in the background)"""
+        self.state = "warming"
+        self.started_at = datetime.now().isoformat()
+        self._started = time.perf_counter()
+        print("🔥 Warming up AI components...")
+        try:
+            self._timed("imports", lambda: [self._import(name) for name in HEAVY_MODULES])
+            from answer_engine import get_engine
+
+            engine = self._timed("engine", get_engine)
+            if self.probe_embedding:
+                store = engine.store.current()
+                if store.is_ready:
+                    self._timed("embedding_probe", lambda: store.embed_query(PROBE_QUERY))
+            self.state = "ready"
+            print(f"✅ Warm-up finished in {time.perf_counter() - self._started:.1f}s "
+                  f"({', '.join(f'{stage} {seconds:.1f}s' for stage, seconds in self.stages.items())})")
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{e.__class__.__name__}: {e}"
+            metrics.ERRORS.inc(component="warm_up")
+            print(f"⚠️ Warm-up failed, components will load on the first question instead: {e}")
+        finally:
+            self.seconds = round(time.perf_counter() - self._started, 3)
+            self.stage = None
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the warm-up has finished; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        """True once the answer engine is loaded, whether by the warm-up or by a question"""
+        if self.state == "ready":
+            return True
+        engine_module = sys.modules.get("answer_engine")
+        return engine_module is not None and engine_module.is_loaded()
+
+    def get_stats(self) -> dict:
+        elapsed = self.seconds
+        if elapsed is None and self.state == "warming":
+            elapsed = round(time.perf_counter() - self._started, 3)
+        slowest = sorted(self.imports.items(), key=lambda item: -item[1])
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "ready": self.ready,
+            "stage": self.stage,
+            "started_at": self.started_at,
+            "seconds": elapsed,
+            "stages": dict(self.stages),
+            "import_seconds": dict(slowest),
+            "embedding_probe": self.probe_embedding,
+            "error": self.error,
+        }
+
+    def describe(self) -> str:
+        """One-line status for /primr-status"""
+        stats = self.get_stats()
+        if self.state == "warming":
+            return (f"🟡 Bot is starting up ({stats['stage'] or 'loading'}, {stats['seconds']:.0f}s so far). "
+                    f"Questions asked now will be answered as soon as it's done.")
+        if self.state == "failed":
+            return f"🔴 Warm-up failed ({self.error}). The next question will retry loading."
+        if self.ready:
+            took = f" (warmed up in {self.seconds:.1f}s)" if self.seconds is not None else ""
+            return f"🟢 Bot is running and ready to answer questions!{took}"
+        return "🟡 Bot is running; AI components will load on the first question."
+
+
+# Shared by the bot, status_api.py and query.py in the same process
+warm_up = WarmUp.from_env()
+
+
+def profile_imports(module: str, top: int = 15) -> Tuple[float, List[Tuple[str, float, float]]]:
+    """
+    Import module in a fresh interpreter with -X importtime
+    Returns (total seconds, [(module, self seconds, cumulative seconds)] slowest cumulative first)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6, len(name) - len(name.lstrip())))
+    if result.returncode != 0:
+        # Keep the partial profile, but say why it stopped
+        print(f"⚠️ import {module} failed: {result.stderr.strip().splitlines()[-1]}")
+    # Top-level imports (least indented) add up to the total
+    depth = min((indent for *_, indent in rows), default=0)
+    total = sum(cumulative for _, _, cumulative, indent in rows if indent == depth)
+    slowest = sorted(rows, key=lambda row: -row[2])[:top]
+    return total, [(name, own, cumulative) for name, own, cumulative, _ in slowest]
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Startup warm-up and import-time profiling")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    profile = subparsers.add_parser("profile", help="Show the slowest imports of a module from a cold start")
+    profile.add_argument("module", nargs="?", default="slack_bot")
+    profile.add_argument("--top", type=int, default=15)
+    subparsers.add_parser("run", help="Warm up in the foreground and print the timings")
+    args = parser.parse_args()
+
+    if args.command == "profile":
+        total, slowest = profile_imports(args.module, args.top)
+        print(f"⏱️ import {args.module}: {total:.2f}s")
+        print(f"{'cumulative':>11} {'self':>8}  module")
+        for name, own, cumulative in slowest:
+            print(f"{cumulative:>10.3f}s {own:>7.3f}s  {name}")
+    else:
+        warm_up.run()
+        print(json.dumps(warm_up.get_stats(), indent=2))